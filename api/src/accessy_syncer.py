@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 
@@ -6,6 +6,7 @@ import schedule
 from rocky.process import log_exception, stoppable
 from sqlalchemy.orm import sessionmaker
 
+from membership.membership import roll_membership_summaries, prune_member_changes
 from multiaccessy.sync import sync
 from service.config import get_mysql_config
 from service.db import create_mysql_engine, db_session
@@ -44,6 +45,19 @@ def scheduled_sync():
         db_session.remove()
 
 
+def scheduled_roll_membership_summaries():
+    logger.info("rolling membership summaries forward")
+    try:
+        count = roll_membership_summaries()
+        prune_member_changes(datetime.utcnow() - timedelta(days=2))
+        db_session.commit()
+        logger.info(f"rolled {count} membership summaries forward")
+    except Exception as e:
+        logger.exception(f"failed to roll membership summaries: {e}")
+    finally:
+        db_session.remove()
+
+
 friday = 4
 def daily_job():
     if datetime.today().weekday() is friday:
@@ -78,6 +92,7 @@ def main():
                 return
         
             case x if x == COMMAND_SCHEDULED:
+                schedule.every().day.at("00:01").do(scheduled_roll_membership_summaries)
                 schedule.every().day.at("04:00").do(daily_job)
 
                 while True:
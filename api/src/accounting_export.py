@@ -0,0 +1,38 @@
+import sys
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+
+from rocky.process import log_exception
+
+from service.api_definition import iso_date
+from service.config import get_mysql_config
+from service.db import create_mysql_engine, db_session
+from shop.accounting_export import accounting_export, FORMATS, CSV, GZIP
+
+
+if __name__ == '__main__':
+
+    with log_exception(status=1):
+        parser = ArgumentParser(description="Export completed transactions with contents and product names for"
+                                            " bookkeeping, the export is written to stdout.",
+                                formatter_class=ArgumentDefaultsHelpFormatter)
+
+        parser.add_argument('--start', required=True, type=iso_date, help='First date to export.')
+        parser.add_argument('--end', required=True, type=iso_date, help='Last date to export.')
+        parser.add_argument('--format', default=CSV, choices=FORMATS, help='Output format.')
+        parser.add_argument('--gzip', action='store_true', help='Compress output with gzip.')
+        parser.add_argument('--legacy', action='store_true',
+                            help='Use the columns of the old mysql export, created_at, id, amount and name, with'
+                                 ' transactions without contents included.')
+
+        args = parser.parse_args()
+
+        create_mysql_engine(**get_mysql_config())
+
+        chunks, _ = accounting_export(args.start, args.end, args.format, GZIP if args.gzip else None,
+                                      legacy=args.legacy)
+        try:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+            sys.stdout.buffer.flush()
+        finally:
+            db_session.remove()
@@ -0,0 +1,31 @@
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+
+from rocky.process import log_exception
+
+from service.api_definition import iso_date
+from service.config import get_mysql_config
+from service.db import create_mysql_engine, db_session
+from service.logging import logger
+from shop.daily_sales import backfill_daily_sales
+
+
+if __name__ == '__main__':
+
+    with log_exception(status=1):
+        parser = ArgumentParser(description="Rebuild the daily sales rollup used for statistics from completed"
+                                            " transactions.",
+                                formatter_class=ArgumentDefaultsHelpFormatter)
+
+        parser.add_argument('--start', type=iso_date, help='First date to rebuild, default is from the beginning.')
+        parser.add_argument('--end', type=iso_date, help='Last date to rebuild, default is until today.')
+
+        args = parser.parse_args()
+
+        create_mysql_engine(**get_mysql_config())
+
+        try:
+            count = backfill_daily_sales(args.start, args.end)
+            db_session.commit()
+            logger.info(f"rebuilt {count} daily sales rows")
+        finally:
+            db_session.remove()
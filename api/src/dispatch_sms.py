@@ -1,9 +1,10 @@
 from logging import getLogger
 
-import requests
-
 from service.config import get_46elks_auth
 from service.error import InternalServerError
+from service.util import lazy_import
+
+requests = lazy_import("requests")
 
 logger = getLogger('makeradmin')
 
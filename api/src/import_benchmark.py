@@ -0,0 +1,102 @@
+#!python
+
+import json
+import re
+import subprocess
+import sys
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from collections import defaultdict
+from os.path import dirname, abspath
+
+from rocky.process import log_exception
+
+
+# Importing api also connects to the db, services imports all blueprints and models without doing that.
+DEFAULT_MODULES = ["services"]
+
+
+importtime_regex = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def median(values):
+    # Can't use statistics.median, the statistics package in this repo shadows it.
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def measure_import(module):
+    """ Import module in a fresh interpreter and return a dict from imported module name to (self, cumulative) import
+    time in microseconds. """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=dirname(abspath(__file__)), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"failed to import {module}: {result.stderr}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        m = importtime_regex.match(line)
+        if m:
+            times[m.group(4)] = (int(m.group(1)), int(m.group(2)))
+    return times
+
+
+def benchmark(modules, repeat):
+    """ Return a dict from top level package to median self time in ms, summed over all modules in that package. """
+    samples = defaultdict(list)
+    for _ in range(repeat):
+        package_times = defaultdict(int)
+        for module in modules:
+            for name, (self_us, _) in measure_import(module).items():
+                package_times[name.split('.')[0]] += self_us
+        for package, us in package_times.items():
+            samples[package].append(us / 1000)
+
+    return {package: median(values) for package, values in samples.items()}
+
+
+def print_report(result, baseline, top):
+    total = sum(result.values())
+    print(f"{'package':<32} {'ms':>8} {'baseline':>9} {'diff':>8}")
+    for package, ms in sorted(result.items(), key=lambda i: -i[1])[:top]:
+        if baseline is None:
+            print(f"{package:<32} {ms:8.1f}")
+        else:
+            before = baseline.get(package, 0.0)
+            print(f"{package:<32} {ms:8.1f} {before:9.1f} {ms - before:+8.1f}")
+    print(f"{'total':<32} {total:8.1f}" + ("" if baseline is None else f" {sum(baseline.values()):9.1f}"))
+
+
+if __name__ == '__main__':
+
+    with log_exception(status=1):
+        parser = ArgumentParser(description="Measure import time per package when starting the api, use to track"
+                                            " startup cost.",
+                                formatter_class=ArgumentDefaultsHelpFormatter)
+        parser.add_argument("modules", nargs='*', default=DEFAULT_MODULES, help="Modules to import.")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of runs, median time is reported.")
+        parser.add_argument("--top", type=int, default=30, help="Number of packages to show.")
+        parser.add_argument("--save", help="Save result as json to this file, to be used as baseline later.")
+        parser.add_argument("--baseline", help="Compare with result saved with --save.")
+        parser.add_argument("--max-regression", type=float, default=None,
+                            help="Exit with status 1 if total import time increased more than this many ms compared"
+                                 " to baseline.")
+        args = parser.parse_args()
+
+        result = benchmark(args.modules, args.repeat)
+
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+        print_report(result, baseline, args.top)
+
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(result, f, indent=2, sort_keys=True)
+
+        if baseline is not None and args.max_regression is not None:
+            regression = sum(result.values()) - sum(baseline.values())
+            if regression > args.max_regression:
+                print(f"import time regressed {regression:.1f} ms, max allowed is {args.max_regression} ms")
+                sys.exit(1)
@@ -12,7 +12,7 @@ from core.auth import generate_token
 from core.service_users import SERVICE_USERS
 from core.models import AccessToken
 from service.config import get_mysql_config
-from service.db import create_mysql_engine
+from service.db import create_mysql_engine, populate_fields_by_index
 from migrate import ensure_migrations_table, run_migrations
 
 
@@ -65,6 +65,9 @@ def init_db():
     clear_permission_cache(session_factory)
     
     refresh_service_access_tokens(session_factory)
+    
+    # Write the index snapshot once here so the api workers don't have to inspect the db.
+    populate_fields_by_index(engine)
 
 
 if __name__ == '__main__':
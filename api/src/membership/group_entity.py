@@ -0,0 +1,53 @@
+from sqlalchemy import func
+
+from membership.models import member_group
+from service.api_definition import Arg, symbol, Enum, natural0, natural1
+from service.db import db_session
+from service.entity import Entity, ASC, DESC
+
+
+class GroupEntity(Entity):
+    """
+    Special handling of Group, requires subclassing entity:
+    
+    * Group.num_members is deferred and hidden, the number of members is instead counted with one grouped query for all
+    groups in the response, a sub select per group row would be executed by every group query.
+    """
+    
+    def add_num_members(self, objs):
+        group_ids = [obj['group_id'] for obj in objs]
+        if not group_ids:
+            return
+        
+        counts = dict(
+            db_session
+            .query(member_group.c.group_id, func.count(member_group.c.member_id))
+            .filter(member_group.c.group_id.in_(group_ids))
+            .group_by(member_group.c.group_id)
+        )
+        for obj in objs:
+            obj['num_members'] = counts.get(obj['group_id'], 0)
+    
+    def list(self, sort_by=Arg(symbol, required=False), sort_order=Arg(Enum(DESC, ASC), required=False),
+             search: str=Arg(str, required=False), page_size=Arg(natural0, required=False),
+             page=Arg(natural1, required=False), expand=Arg(symbol, required=False), relation=None,
+             related_entity_id=None):
+        result = super().list(sort_by=sort_by, sort_order=sort_order, search=search, page_size=page_size, page=page,
+                              expand=expand, relation=relation, related_entity_id=related_entity_id)
+        self.add_num_members(result['data'])
+        return result
+    
+    def create(self, data=None, commit=True):
+        obj = super().create(data, commit=commit)
+        self.add_num_members([obj])
+        return obj
+    
+    def read(self, entity_id):
+        obj = super().read(entity_id)
+        self.add_num_members([obj])
+        return obj
+    
+    def update(self, entity_id, commit=True):
+        obj = super().update(entity_id, commit=commit)
+        self.add_num_members([obj])
+        return obj
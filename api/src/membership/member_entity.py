@@ -1,9 +1,8 @@
 from flask import request
 
 from membership.member_auth import check_and_hash_password
-from service.db import db_session
+from membership.member_number import member_numbers
 from service.entity import Entity
-from service.error import InternalServerError
 from logging import getLogger
 
 
@@ -21,8 +20,8 @@ class MemberEntity(Entity):
     """
     Special handling of Member, requires subclassing entity:
     
-    * Member member_number should be auto increment but mysql only supports one auto increment per table,
-    can solve it with a trigger or like this using an explicit mysql lock.
+    * Member member_number should be auto increment but mysql only supports one auto increment per table, numbers are
+    allocated from a sequence table instead, see membership.member_number.
     
     * Unhashed password should be hashed on save.
     """
@@ -33,24 +32,13 @@ class MemberEntity(Entity):
             
         handle_password(data)
         
-        status, = db_session.execute("SELECT GET_LOCK('member_number', 20)").fetchone()
-        if not status:
-            raise InternalServerError("Failed to create member, try again later.",
-                                      log="failed to aquire member_number lock")
-        try:
-            if data.get('member_number') is None:
-                sql = "SELECT COALESCE(MAX(member_number), 999) FROM membership_members"
-                max_member_number, = db_session.execute(sql).fetchone()
-                data['member_number'] = max_member_number + 1
-            obj = self.to_obj(self._create_internal(data, commit=commit))
-            logger.info(f"created member with number {data['member_number']}")
-            return obj
-        except Exception:
-            # Rollback session if anything went wrong or we can't release the lock.
-            db_session.rollback()
-            raise
-        finally:
-            db_session.execute("DO RELEASE_LOCK('member_number')")
+        if data.get('member_number') is None:
+            data['member_number'] = member_numbers.allocate()
+        else:
+            member_numbers.skip_past(data['member_number'])
+        obj = self.to_obj(self._create_internal(data, commit=commit))
+        logger.info(f"created member with number {data['member_number']}")
+        return obj
 
     def update(self, entity_id, commit=True):
         data = request.json or {}
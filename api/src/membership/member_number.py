@@ -0,0 +1,71 @@
+from threading import Lock
+
+from sqlalchemy import select, insert, update, func, case
+
+from membership.models import Member, MemberNumberSequence
+from service.db import db_session
+
+
+# Member numbers reserved from the sequence at a time by each process, numbers of a batch that are not used before the
+# process exits are skipped.
+BATCH_SIZE = 10
+
+FIRST_MEMBER_NUMBER = 1000
+
+sequence = MemberNumberSequence.__table__
+
+
+def reserve_member_numbers(connection, count):
+    """ Reserve count numbers from the sequence, returns the first. The sequence row is only locked until connection
+    commits. """
+    next_number = connection.execute(
+        select(sequence.c.next_number).where(sequence.c.id == 1).with_for_update()
+    ).scalar()
+
+    if next_number is None:
+        max_number = connection.execute(select(func.max(Member.member_number))).scalar()
+        next_number = max(max_number or 0, FIRST_MEMBER_NUMBER - 1) + 1
+        connection.execute(insert(sequence).values(id=1, next_number=next_number + count))
+    else:
+        connection.execute(update(sequence).where(sequence.c.id == 1).values(next_number=next_number + count))
+
+    return next_number
+
+
+class MemberNumberAllocator:
+    """ Hands out member numbers from a batch reserved from the sequence table. Reservations are committed in their own
+    transaction so processes never get the same number, and the sequence is only locked once per batch. """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.lock = Lock()
+        self.batch_size = batch_size
+        self.next = 0
+        self.end = 0
+
+    def allocate(self, session=db_session):
+        with self.lock:
+            while True:
+                if self.next >= self.end:
+                    with session.get_bind().begin() as connection:
+                        self.next = reserve_member_numbers(connection, self.batch_size)
+                    self.end = self.next + self.batch_size
+
+                number = self.next
+                self.next += 1
+
+                # Numbers can be taken by members created with an explicit member number.
+                if session.query(Member.member_id).filter(Member.member_number == number).first() is None:
+                    return number
+
+    def skip_past(self, number, session=db_session):
+        """ Make sure the sequence does not reserve number, used when a member is created with an explicit number. """
+        with session.get_bind().begin() as connection:
+            connection.execute(
+                update(sequence)
+                .where(sequence.c.id == 1)
+                .values(next_number=case((sequence.c.next_number <= number, number + 1),
+                                         else_=sequence.c.next_number))
+            )
+
+
+member_numbers = MemberNumberAllocator()
@@ -0,0 +1,194 @@
+import re
+import unicodedata
+from collections import defaultdict
+from heapq import nlargest
+from threading import RLock
+
+from membership.membership import MemberChangeTracker
+from membership.models import Member
+from service.db import db_session
+
+
+# Columns indexed for suggestions, same as the search columns of member_entity.
+SUGGEST_COLUMNS = ('firstname', 'lastname', 'email', 'address_street', 'address_extra', 'address_zipcode',
+                   'address_city', 'phone', 'civicregno', 'member_number')
+
+# Columns returned for each suggestion.
+RESULT_COLUMNS = ('member_id', 'member_number', 'firstname', 'lastname', 'email', 'phone')
+
+# Fraction of the trigrams of a query term that must be found for a member to match the term, below 1 to allow typos.
+MIN_TERM_SIMILARITY = 0.6
+
+# Score bonus for a term that is a prefix of a token and for a term that is an exact token.
+PREFIX_BONUS = 0.5
+EXACT_BONUS = 1.0
+
+
+non_alnum_regex = re.compile(r'[^0-9a-z@.+]+')
+
+
+def normalize(value):
+    """ Lower case without accents, so å matches a and é matches e. """
+    value = unicodedata.normalize('NFKD', str(value).lower())
+    return ''.join(c for c in value if not unicodedata.combining(c))
+
+
+def phone_tokens(phone):
+    digits = ''.join(c for c in phone if c.isdigit())
+    if not digits:
+        return []
+    tokens = [digits]
+    if digits.startswith('46'):
+        # Normalized numbers are stored as +46..., but people type the local number.
+        tokens.append('0' + digits[2:])
+    return tokens
+
+
+def member_tokens(row):
+    """ Tokens to index for a member, row has the SUGGEST_COLUMNS. """
+    tokens = set()
+    for column, value in zip(SUGGEST_COLUMNS, row):
+        if value is None or value == '':
+            continue
+        if column == 'phone':
+            tokens.update(phone_tokens(value))
+        elif column == 'civicregno':
+            tokens.add(''.join(c for c in str(value) if c.isdigit()))
+        else:
+            value = normalize(value)
+            tokens.update(t for t in non_alnum_regex.split(value) if t)
+            if column == 'email':
+                tokens.add(value)
+                tokens.update(t for t in re.split(r'[@.+]', value) if t)
+    tokens.discard('')
+    return tokens
+
+
+def query_terms(q):
+    digits = re.sub(r'[\s\-+()]', '', q)
+    if digits.isdigit():
+        # Phone and civic registration numbers are typed with spaces and dashes.
+        return [digits]
+    return [t for t in non_alnum_regex.split(normalize(q)) if t]
+
+
+def trigrams(token, partial=False):
+    """ Trigrams of token padded like pg_trgm, a partial (typed so far) token is not padded at the end so it matches
+    the start of longer tokens. """
+    padded = "  " + token + ("" if partial else " ")
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MemberSuggestIndex:
+    """ In memory trigram index over the member search columns for typeahead suggestions. Built in bulk on first use
+    and updated per member using the member change log, rebuilt if changes may have been missed. """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.built = False
+        self.members = {}
+        self.tokens = {}
+        self.postings = defaultdict(set)
+        self.changes = MemberChangeTracker()
+
+    def _add(self, row):
+        member_id = row[0]
+        tokens = member_tokens(row[1:])
+        self.members[member_id] = dict(zip(RESULT_COLUMNS, row[len(SUGGEST_COLUMNS) + 1:]))
+        self.tokens[member_id] = tokens
+        for trigram in set().union(*(trigrams(t) for t in tokens)):
+            self.postings[trigram].add(member_id)
+
+    def _remove(self, member_id):
+        tokens = self.tokens.pop(member_id, set())
+        self.members.pop(member_id, None)
+        for trigram in set().union(*(trigrams(t) for t in tokens)):
+            postings = self.postings.get(trigram)
+            if postings is not None:
+                postings.discard(member_id)
+                if not postings:
+                    del self.postings[trigram]
+
+    def _load(self, member_ids=None, session=db_session):
+        query = (
+            session
+            .query(Member.member_id,
+                   *(getattr(Member, c) for c in SUGGEST_COLUMNS),
+                   *(getattr(Member, c) for c in RESULT_COLUMNS))
+            .filter(Member.deleted_at.is_(None))
+        )
+        if member_ids is not None:
+            query = query.filter(Member.member_id.in_(member_ids))
+        for row in query:
+            self._add(row)
+
+    def build(self, session=db_session):
+        with self.lock:
+            self.changes.reset(session)
+            self.members = {}
+            self.tokens = {}
+            self.postings = defaultdict(set)
+            self._load(session=session)
+            self.built = True
+
+    def sync(self, session=db_session):
+        with self.lock:
+            if not self.built:
+                self.build(session)
+                return
+            member_ids = self.changes.poll(session)
+            if member_ids is None:
+                self.build(session)
+            elif member_ids:
+                for member_id in member_ids:
+                    self._remove(member_id)
+                self._load(member_ids, session)
+
+    def _term_scores(self, term):
+        """ Score for each member matching term. """
+        term_trigrams = trigrams(term, partial=True)
+        hits = defaultdict(int)
+        for trigram in term_trigrams:
+            for member_id in self.postings.get(trigram, ()):
+                hits[member_id] += 1
+
+        scores = {}
+        for member_id, count in hits.items():
+            similarity = count / len(term_trigrams)
+            if similarity < MIN_TERM_SIMILARITY:
+                continue
+            tokens = self.tokens[member_id]
+            if term in tokens:
+                similarity += EXACT_BONUS
+            elif any(t.startswith(term) for t in tokens):
+                similarity += PREFIX_BONUS
+            scores[member_id] = similarity
+        return scores
+
+    def suggest(self, q, limit=10):
+        """ Top members matching all terms in q, ranked by summed term score. """
+        terms = query_terms(q)
+        if not terms:
+            return []
+
+        with self.lock:
+            scores = None
+            for term in terms:
+                term_scores = self._term_scores(term)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {m: s + term_scores[m] for m, s in scores.items() if m in term_scores}
+                if not scores:
+                    return []
+
+            best = nlargest(limit, scores.items(), key=lambda i: (i[1], -i[0]))
+            return [dict(self.members[member_id], score=round(score, 3)) for member_id, score in best]
+
+
+member_suggest_index = MemberSuggestIndex()
+
+
+def suggest_members(q, limit=10):
+    member_suggest_index.sync()
+    return member_suggest_index.suggest(q, limit)
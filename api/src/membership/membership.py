@@ -1,14 +1,16 @@
 from dataclasses import dataclass
-from datetime import date, timedelta
+from datetime import date, timedelta, datetime
+from itertools import chain
 
-from sqlalchemy import func
+from sqlalchemy import func, case, and_, or_, text, bindparam, Date, event
+from sqlalchemy.orm import Session, attributes
 
-from membership.models import Span, Member
+from membership.models import Span, Member, MembershipSummary, member_group, Key, MemberChange, Group
 from service.api_definition import NOT_UNIQUE
 from service.db import db_session
-from service.error import UnprocessableEntity
+from service.error import UnprocessableEntity, NotFound
 from service.util import date_to_str
-from typing import List
+from typing import List, Dict, Set, Optional
 
 
 @dataclass(frozen=True)
@@ -37,6 +39,22 @@ class MembershipData:
         )
 
 
+# Max number of member ids in each IN clause when getting summaries.
+SUMMARY_CHUNK_SIZE = 1000
+
+
+NO_MEMBERSHIP = MembershipData(
+    membership_end=None,
+    membership_active=False,
+    labaccess_end=None,
+    labaccess_active=False,
+    special_labaccess_end=None,
+    special_labaccess_active=False,
+    effective_labaccess_end=None,
+    effective_labaccess_active=False,
+)
+
+
 def max_or_none(*args):
     items = [i for i in args if i is not None]
     if items:
@@ -48,93 +66,269 @@ def get_membership_summary(member_id):
     return get_membership_summaries([member_id])[0]
 
 
-def get_membership_summaries(member_ids: List[int]):
-    ''' Returns a list of MembershipData for each member in member_ids.
-    '''
+def membership_data(membership_end, membership_active, labaccess_end, labaccess_active, special_labaccess_end,
+                    special_labaccess_active):
+    return MembershipData(
+        membership_end=membership_end,
+        membership_active=bool(membership_active),
+        labaccess_end=labaccess_end,
+        labaccess_active=bool(labaccess_active),
+        special_labaccess_end=special_labaccess_end,
+        special_labaccess_active=bool(special_labaccess_active),
+        effective_labaccess_end=max_or_none(labaccess_end, special_labaccess_end),
+        effective_labaccess_active=bool(labaccess_active or special_labaccess_active),
+    )
 
-    # Speed up the database query for the common special case that member_ids is a list with exactly 1 element.
-    # In other cases we will extract information about every member.
-    # Since the method is only used with either 1 member or all members in the database this is reasonable.
-    span_filter = Span.member_id == member_ids[0] if len(member_ids) == 1 else True
 
-    today = date.today()
-    
-    # Converts a list of rows of IDs to a set of them
-    def setify(rows):
-        return set(r[0] for r in rows)
-    
-    # Converts a list of rows of IDs and values to a map from id to value
-    def mapify(rows):
-        return {r[0]: r[1] for r in rows}
+def calculate_membership_summaries(member_ids: List[int], today=None, session=db_session,
+                                   lock=False) -> Dict[int, MembershipData]:
+    """ Calculate MembershipData from spans for members in member_ids, members without spans are not included in the
+    result. All span types are aggregated in one query (per chunk of member ids). With lock spans are read with a
+    locking read, which sees the latest committed spans instead of the transaction snapshot. """
 
-    labaccess_active = setify(
-        db_session
-            .query(Span.member_id)
-            .filter(span_filter,
-                    Span.type == Span.LABACCESS,
-                    Span.startdate <= today,
-                    Span.enddate >= today,
+    today = today or date.today()
+
+    def end_of(span_type):
+        return func.max(case((Span.type == span_type, Span.enddate)))
+
+    def active(span_type):
+        is_active = and_(Span.type == span_type, Span.startdate <= today, Span.enddate >= today)
+        return func.sum(case((is_active, 1), else_=0))
+
+    summaries = {}
+    for i in range(0, len(member_ids), SUMMARY_CHUNK_SIZE):
+        query = (
+            session
+            .query(
+                Span.member_id,
+                end_of(Span.MEMBERSHIP), active(Span.MEMBERSHIP),
+                end_of(Span.LABACCESS), active(Span.LABACCESS),
+                end_of(Span.SPECIAL_LABACESS), active(Span.SPECIAL_LABACESS),
+            )
+            .filter(Span.member_id.in_(member_ids[i:i + SUMMARY_CHUNK_SIZE]),
                     Span.deleted_at.is_(None))
             .group_by(Span.member_id)
-            .all()
-    )
+        )
+        if lock:
+            query = query.with_for_update(read=True)
+        for member_id, *row in query:
+            summaries[member_id] = membership_data(*row)
 
-    labaccess_end = mapify(db_session.query(Span.member_id, func.max(Span.enddate)).filter(
-        span_filter,
-        Span.type == Span.LABACCESS,
-        Span.deleted_at.is_(None)
-    ).group_by(Span.member_id).all())
-    
-    membership_active = setify(
+    return summaries
+
+
+replace_summary_statement = text(
+    "REPLACE INTO membership_summary (member_id, membership_end, membership_active, labaccess_end, labaccess_active,"
+    "                                 special_labaccess_end, special_labaccess_active, active_date)"
+    " VALUES (:member_id, :membership_end, :membership_active, :labaccess_end, :labaccess_active,"
+    "         :special_labaccess_end, :special_labaccess_active, :active_date)"
+).bindparams(
+    bindparam('membership_end', type_=Date),
+    bindparam('labaccess_end', type_=Date),
+    bindparam('special_labaccess_end', type_=Date),
+    bindparam('active_date', type_=Date),
+)
+
+
+def refresh_membership_summaries(member_ids: List[int], today=None, session=db_session) -> Dict[int, MembershipData]:
+    """ Recalculate the summary rows of the members in member_ids from spans, returns the new summaries for the members
+    that exists.
+
+    The member rows are locked so writers of the same summary are serialized, and spans are aggregated with a locking
+    read. Otherwise, with repeatable read, a transaction could overwrite the row written by a concurrent transaction
+    with an aggregate from a snapshot without the spans of that transaction. """
+
+    today = today or date.today()
+    member_ids = sorted(set(member_ids))
+
+    existing_ids = set()
+    for i in range(0, len(member_ids), SUMMARY_CHUNK_SIZE):
+        existing_ids.update(
+            member_id for member_id, in
+            session
+            .query(Member.member_id)
+            .filter(Member.member_id.in_(member_ids[i:i + SUMMARY_CHUNK_SIZE]))
+            .order_by(Member.member_id)
+            .with_for_update()
+        )
+    if not existing_ids:
+        return {}
+
+    summaries = calculate_membership_summaries(sorted(existing_ids), today, session=session, lock=True)
+    summaries = {member_id: summaries.get(member_id, NO_MEMBERSHIP) for member_id in existing_ids}
+
+    session.execute(replace_summary_statement, [
+        dict(
+            member_id=member_id,
+            membership_end=s.membership_end,
+            membership_active=s.membership_active,
+            labaccess_end=s.labaccess_end,
+            labaccess_active=s.labaccess_active,
+            special_labaccess_end=s.special_labaccess_end,
+            special_labaccess_active=s.special_labaccess_active,
+            active_date=today,
+        )
+        for member_id, s in summaries.items()
+    ])
+
+    return summaries
+
+
+def roll_membership_summaries(today=None):
+    """ Recalculate all summary rows that are missing or not valid for today, run nightly so the active flags are
+    moved forward before they are read. """
+
+    today = today or date.today()
+
+    member_ids = [
+        member_id for member_id, in
         db_session
-            .query(Span.member_id)
-            .filter(span_filter,
-                    Span.type == Span.MEMBERSHIP,
-                    Span.startdate <= today,
-                    Span.enddate >= today,
-                    Span.deleted_at.is_(None))
+        .query(Member.member_id)
+        .outerjoin(MembershipSummary, MembershipSummary.member_id == Member.member_id)
+        .filter(Member.deleted_at.is_(None),
+                or_(MembershipSummary.active_date.is_(None), MembershipSummary.active_date != today))
+    ]
+
+    for i in range(0, len(member_ids), SUMMARY_CHUNK_SIZE):
+        refresh_membership_summaries(member_ids[i:i + SUMMARY_CHUNK_SIZE], today)
+
+    return len(member_ids)
+
+
+def get_membership_summaries(member_ids: List[int]):
+    """ Returns a list of MembershipData for each member in member_ids. Summaries are read from the membership_summary
+    table, missing or outdated rows are calculated from spans but not stored, rows are only written on span changes and
+    by roll_membership_summaries so reads never write. """
+
+    today = date.today()
+
+    summaries = {}
+    for i in range(0, len(member_ids), SUMMARY_CHUNK_SIZE):
+        query = (
+            db_session
+            .query(
+                MembershipSummary.member_id,
+                MembershipSummary.membership_end, MembershipSummary.membership_active,
+                MembershipSummary.labaccess_end, MembershipSummary.labaccess_active,
+                MembershipSummary.special_labaccess_end, MembershipSummary.special_labaccess_active,
+            )
+            .filter(MembershipSummary.member_id.in_(member_ids[i:i + SUMMARY_CHUNK_SIZE]),
+                    MembershipSummary.active_date == today)
+        )
+        for member_id, *row in query:
+            summaries[member_id] = membership_data(*row)
+
+    outdated_ids = list({member_id for member_id in member_ids if member_id not in summaries})
+    if outdated_ids:
+        summaries.update(calculate_membership_summaries(outdated_ids, today))
+
+    return [summaries.get(member_id, NO_MEMBERSHIP) for member_id in member_ids]
+
+
+def log_member_changes(member_ids, session=db_session):
+    """ Log that data of members changed, used to invalidate per process caches. """
+    now = datetime.utcnow()
+    session.execute(MemberChange.__table__.insert(), [dict(member_id=i, created_at=now) for i in member_ids])
+
+
+# Changes are logged at flush and committed in another order than their ids, a change log id that is not visible is
+# waited for this long. Ids of rolled back transactions never show up, caches are rebuilt when waiting times out.
+GAP_TIMEOUT = timedelta(hours=1)
+
+
+class MemberChangeTracker:
+    """ Follows the member change log for a per process cache. Ids below the last seen id that are not visible yet
+    (gaps) belong to transactions that are not committed, they are polled until they show up. """
+
+    def __init__(self):
+        self.last_change_id = 0
+        self.gaps = {}
+        self.polled_at = None
+
+    def reset(self, session=db_session):
+        """ Start following from a change old enough that all changes before it are committed, call when the cache is
+        fully rebuilt. Later changes are read again on next poll. """
+        now = datetime.utcnow()
+        old_id, oldest_id = (
+            session
+            .query(func.max(case((MemberChange.created_at < now - GAP_TIMEOUT, MemberChange.id))),
+                   func.min(MemberChange.id))
+            .one()
+        )
+        self.last_change_id = old_id or (oldest_id or 1) - 1
+        self.gaps = {}
+        self.polled_at = now
+
+    def poll(self, session=db_session) -> Optional[Set[int]]:
+        """ Return ids of members changed since last poll, or None if changes may have been missed and the cache must
+        be rebuilt. """
+        now = datetime.utcnow()
+
+        if self.polled_at is None or now - self.polled_at > GAP_TIMEOUT:
+            # Not reset or not polled for a long time, changes may have been pruned from the log.
+            return None
+        self.polled_at = now
+
+        changes = (
+            session
+            .query(MemberChange.id, MemberChange.member_id)
+            .filter(or_(MemberChange.id > self.last_change_id, MemberChange.id.in_(list(self.gaps))))
             .all()
-    )
+        )
+        member_ids = {member_id for _, member_id in changes}
+        change_ids = {change_id for change_id, _ in changes}
 
-    membership_end = mapify(db_session.query(Span.member_id, func.max(Span.enddate)).filter(
-        span_filter,
-        Span.type == Span.MEMBERSHIP,
-        Span.deleted_at.is_(None)
-    ).group_by(Span.member_id).all())
-    
-    special_labaccess_active = setify(
+        for change_id in change_ids:
+            self.gaps.pop(change_id, None)
+        max_change_id = max(change_ids, default=self.last_change_id)
+        for change_id in range(self.last_change_id + 1, max_change_id):
+            if change_id not in change_ids:
+                self.gaps[change_id] = now
+        self.last_change_id = max(self.last_change_id, max_change_id)
+
+        if any(since < now - GAP_TIMEOUT for since in self.gaps.values()):
+            return None
+
+        return member_ids
+
+
+def prune_member_changes(before):
+    """ Delete member change log rows older than before, caches are rebuilt daily so old changes are not needed. The
+    last row is always kept since its id is the current snapshot version. """
+    last_id, = db_session.query(func.max(MemberChange.id)).one()
+    return (
         db_session
-            .query(Span.member_id)
-            .filter(span_filter,
-                    Span.type == Span.SPECIAL_LABACESS,
-                    Span.startdate <= today,
-                    Span.enddate >= today,
-                    Span.deleted_at.is_(None))
-            .group_by(Span.member_id)
-            .all()
+        .query(MemberChange)
+        .filter(MemberChange.created_at < before, MemberChange.id < last_id)
+        .delete(synchronize_session=False)
     )
 
-    special_labaccess_end = mapify(db_session.query(Span.member_id, func.max(Span.enddate)).filter(
-        span_filter,
-        Span.type == Span.SPECIAL_LABACESS,
-        Span.deleted_at.is_(None)
-    ).group_by(Span.member_id).all())
-
-    memberships = []
-    for id in member_ids:
-        # Create the MembershipData structure
-        # Note that the dict.get method returns None if the key doesn't exist in the map
-        memberships.append(MembershipData(
-            labaccess_end=labaccess_end.get(id),
-            labaccess_active=id in labaccess_active,
-            special_labaccess_end=special_labaccess_end.get(id),
-            special_labaccess_active=id in special_labaccess_active,
-            membership_end=membership_end.get(id),
-            membership_active=id in membership_active,
-            effective_labaccess_end=max_or_none(labaccess_end.get(id), special_labaccess_end.get(id)),
-            effective_labaccess_active=(id in labaccess_active) or (id in special_labaccess_active)
-        ))
-    return memberships
+
+@event.listens_for(Session, "after_flush")
+def collect_member_changes(session, flush_context):
+    """ Collect members with changed member data, keys or spans. Summaries are refreshed and changes logged after the
+    flush in the same transaction. """
+    span_member_ids = session.info.setdefault('membership_summary_member_ids', set())
+    changed_member_ids = session.info.setdefault('membership_changed_member_ids', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Member):
+            changed_member_ids.add(obj.member_id)
+        elif isinstance(obj, (Span, Key)):
+            member_ids = {obj.member_id, *attributes.get_history(obj, 'member_id').deleted}
+            changed_member_ids.update(member_ids)
+            if isinstance(obj, Span):
+                span_member_ids.update(member_ids)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def refresh_changed_members(session, flush_context):
+    span_member_ids = session.info.pop('membership_summary_member_ids', set()) - {None}
+    if span_member_ids:
+        refresh_membership_summaries(list(span_member_ids), session=session)
+    
+    changed_member_ids = session.info.pop('membership_changed_member_ids', set()) - {None}
+    if changed_member_ids:
+        log_member_changes(sorted(changed_member_ids), session=session)
 
 
 def get_members_and_membership():
@@ -142,12 +336,46 @@ def get_members_and_membership():
         db_session
         .query(Member)
         .filter(Member.deleted_at.is_(None))
+        .all()
     )
     memberships = get_membership_summaries([m.member_id for m in members])
 
     return members, memberships
 
 
+def iter_members_and_membership(batch_size=1000):
+    """ Iterate over (member, MembershipData) for all members ordered by member_id, members are fetched in batches
+    by member_id joined with their summaries so memory use is constant. Summaries that are missing or not valid for
+    today are calculated from spans for each batch, nothing is written. """
+    
+    today = date.today()
+    last_member_id = 0
+    while True:
+        rows = (
+            db_session
+            .query(Member, MembershipSummary)
+            .outerjoin(MembershipSummary, MembershipSummary.member_id == Member.member_id)
+            .filter(Member.deleted_at.is_(None), Member.member_id > last_member_id)
+            .order_by(Member.member_id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return
+        
+        outdated_ids = [member.member_id for member, s in rows if s is None or s.active_date != today]
+        calculated = calculate_membership_summaries(outdated_ids, today) if outdated_ids else {}
+        
+        for member, s in rows:
+            if s is None or s.active_date != today:
+                yield member, calculated.get(member.member_id, NO_MEMBERSHIP)
+            else:
+                yield member, membership_data(s.membership_end, s.membership_active, s.labaccess_end,
+                                              s.labaccess_active, s.special_labaccess_end, s.special_labaccess_active)
+        
+        last_member_id = rows[-1][0].member_id
+
+
 def add_membership_days(member_id=None, span_type=None, days=None, creation_reason=None, default_start_date=None):
     assert days >= 0
 
@@ -180,6 +408,86 @@ def add_membership_days(member_id=None, span_type=None, days=None, creation_reas
     
     return get_membership_summary(member_id)
 
+
+def bulk_creation_reason(creation_reason, member_id):
+    return f"{creation_reason}, member_id: {member_id}"
+
+
+def bulk_add_membership_days(member_ids=None, group_id=None, span_type=None, days=None, creation_reason=None,
+                             default_start_date=None):
+    """ Add days to many members at once, given as member ids and/or all members of a group. Each span gets a
+    creation_reason derived from creation_reason and the member id, members that already got the span are skipped. """
+    assert days >= 0
+
+    member_ids = set(member_ids or [])
+    if group_id is not None:
+        if db_session.query(Group).get(group_id) is None:
+            raise NotFound("Could not find any entity with specified parameters.", fields='group_id')
+        member_ids.update(
+            member_id for member_id, in
+            db_session.query(member_group.c.member_id)
+            .join(Member, Member.member_id == member_group.c.member_id)
+            .filter(member_group.c.group_id == group_id, Member.deleted_at.is_(None))
+        )
+    member_ids = sorted(member_ids)
+
+    if not default_start_date:
+        default_start_date = date.today()
+
+    spans = []
+    skipped = 0
+    for i in range(0, len(member_ids), SUMMARY_CHUNK_SIZE):
+        chunk = member_ids[i:i + SUMMARY_CHUNK_SIZE]
+        reasons = {bulk_creation_reason(creation_reason, member_id): member_id for member_id in chunk}
+
+        existing_ids = {
+            member_id for member_id, in db_session.query(Member.member_id).filter(Member.member_id.in_(chunk))
+        }
+        missing_ids = set(chunk) - existing_ids
+        if missing_ids:
+            raise NotFound(f"Members {', '.join(map(str, sorted(missing_ids)))} not found.", fields='member_ids')
+
+        already_added = set()
+        for reason, startdate, enddate, type_ in (
+            db_session
+            .query(Span.creation_reason, Span.startdate, Span.enddate, Span.type)
+            .filter(Span.creation_reason.in_(reasons))
+        ):
+            if days != (enddate - startdate).days or span_type != type_:
+                raise UnprocessableEntity(f"Duplicate entry.", fields='creation_reason', what=NOT_UNIQUE)
+            already_added.add(reasons[reason])
+        skipped += len(already_added)
+
+        last_ends = dict(
+            db_session
+            .query(Span.member_id, func.max(Span.enddate))
+            .filter(Span.member_id.in_(chunk), Span.type == span_type, Span.deleted_at.is_(None))
+            .group_by(Span.member_id)
+        )
+
+        for member_id in chunk:
+            if member_id in already_added:
+                continue
+            last_end = last_ends.get(member_id)
+            if not last_end or last_end < default_start_date:
+                last_end = default_start_date
+            spans.append(dict(member_id=member_id, startdate=last_end, enddate=last_end + timedelta(days=days),
+                              type=span_type, creation_reason=bulk_creation_reason(creation_reason, member_id)))
+
+    if spans:
+        # Bulk insert does not flush through the session, so summaries are refreshed and changes logged explicitly.
+        db_session.execute(Span.__table__.insert(), spans)
+        refresh_membership_summaries([s['member_id'] for s in spans])
+        log_member_changes([s['member_id'] for s in spans])
+
+    return dict(
+        added=len(spans),
+        skipped=skipped,
+        min_enddate=date_to_str(min((s['enddate'] for s in spans), default=None)),
+        max_enddate=date_to_str(max((s['enddate'] for s in spans), default=None)),
+    )
+
+
 def get_access_summary(member_id: int):
     from multiaccessy.accessy import accessy_session
     member: Member = (
@@ -1,6 +1,5 @@
 from logging import getLogger
 
-import phonenumbers as phonenumbers
 from sqlalchemy import Column, Integer, String, DateTime, Text, Date, Enum, Table, ForeignKey, func, text, select, \
     BigInteger, Boolean
 from sqlalchemy.ext.declarative import declarative_base
@@ -90,12 +89,13 @@ class Group(Base):
         return f'Group(group_id={self.group_id}, name={self.name})'
 
 
-# Calculated property will be executed as a sub select for each groups, since it is not that many groups this will be
-# fine.
+# Calculated property executed as a sub select for each group, deferred so it is only executed when accessed. Group
+# listings count members with one grouped query instead, see GroupEntity.
 Group.num_members = column_property(
     select([func.count(member_group.columns.member_id)])
     .where(Group.group_id == member_group.columns.group_id)
-    .scalar_subquery()
+    .scalar_subquery(),
+    deferred=True,
 )
 
 
@@ -117,7 +117,9 @@ class Key(Base):
     __tablename__ = 'membership_keys'
 
     key_id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
-    member_id = Column(Integer, ForeignKey('membership_members.member_id'), nullable=False)
+    # Active history to be able to invalidate caches of the old member when moving a key.
+    member_id = column_property(Column(Integer, ForeignKey('membership_members.member_id'), nullable=False),
+                                active_history=True)
     description = Column(Text)
     tagid = Column(String(255), nullable=False, unique=True)
     created_at = Column(DateTime, server_default=func.now())
@@ -138,7 +140,9 @@ class Span(Base):
     SPECIAL_LABACESS = 'special_labaccess'
 
     span_id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
-    member_id = Column(Integer, ForeignKey('membership_members.member_id'), nullable=False)
+    # Active history to be able to update the membership summary of the old member when moving a span.
+    member_id = column_property(Column(Integer, ForeignKey('membership_members.member_id'), nullable=False),
+                                active_history=True)
     startdate = Column(Date, nullable=False)  # Start date, inclusive
     enddate = Column(Date, nullable=False)    # End date, inclusive
     type = Column(Enum(LABACCESS, MEMBERSHIP, SPECIAL_LABACESS), nullable=False)
@@ -153,6 +157,53 @@ class Span(Base):
         return f'Span(span_id={self.span_id}, type={self.type}, enddate={self.enddate})'
 
 
+class MembershipSummary(Base):
+    """ Materialized summary of the spans of a member, updated in the same transaction as the spans are written, see
+    membership.membership. """
+
+    __tablename__ = 'membership_summary'
+
+    member_id = Column(Integer, ForeignKey('membership_members.member_id'), primary_key=True, nullable=False)
+    membership_end = Column(Date)
+    membership_active = Column(Boolean, nullable=False)
+    labaccess_end = Column(Date)
+    labaccess_active = Column(Boolean, nullable=False)
+    special_labaccess_end = Column(Date)
+    special_labaccess_active = Column(Boolean, nullable=False)
+
+    # The active flags are valid for this date only, rows for older dates are rolled forward nightly.
+    active_date = Column(Date, nullable=False)
+
+    def __repr__(self):
+        return f'MembershipSummary(member_id={self.member_id}, active_date={self.active_date})'
+
+
+class MemberChange(Base):
+    """ Log of members whose member data, keys or spans changed, used by per process caches to invalidate only those
+    members. Written in the same transaction as the change, see membership.membership. """
+
+    __tablename__ = 'membership_member_changes'
+
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
+    member_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'MemberChange(id={self.id}, member_id={self.member_id}, created_at={self.created_at})'
+
+
+class MemberNumberSequence(Base):
+    """ Next member number that is not reserved, there is only one row. See membership.member_number. """
+
+    __tablename__ = 'membership_member_number_sequence'
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    next_number = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f'MemberNumberSequence(id={self.id}, next_number={self.next_number})'
+
+
 class Box(Base):
     __tablename__ = 'membership_box'
     
@@ -215,6 +266,8 @@ def normalise_phone_number(phone):
     if not phone:
         return None
     
+    import phonenumbers
+    
     try:
         p = phonenumbers.parse(phone, "SE")
     except phonenumbers.NumberParseException:
@@ -0,0 +1,187 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from threading import RLock
+from typing import Dict, List, Set, Tuple
+
+from membership.membership import MemberChangeTracker
+from membership.models import Span
+from service.db import db_session
+
+
+# Incremental refreshes are not done more often than this.
+REFRESH_INTERVAL = timedelta(seconds=60)
+
+# Rows fetched per round trip when loading spans.
+LOAD_BATCH_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class SpanInterval:
+    member_id: int
+    type: str
+    startdate: date  # Inclusive
+    enddate: date    # Inclusive
+    deleted: bool
+
+
+class TypeIndex:
+    """ Index over the spans of one type. Spans of each member are merged into non overlapping intervals, so a member is
+    counted once for each date however many spans covers it. """
+
+    def __init__(self, spans: List[SpanInterval]):
+        by_member = defaultdict(list)
+        for span in spans:
+            by_member[span.member_id].append((span.startdate, span.enddate))
+
+        self.intervals_by_member: Dict[int, List[Tuple[date, date]]] = {}
+        for member_id, intervals in by_member.items():
+            intervals.sort()
+            merged = [list(intervals[0])]
+            for start, end in intervals[1:]:
+                if start <= merged[-1][1] + timedelta(days=1):
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self.intervals_by_member[member_id] = [tuple(i) for i in merged]
+
+        self.starts = sorted(s for intervals in self.intervals_by_member.values() for s, _ in intervals)
+        self.ends = sorted(e for intervals in self.intervals_by_member.values() for _, e in intervals)
+
+        # Dates where the count may change, same as the dates used by the old sql implementation of spans_by_date.
+        one_day = timedelta(days=1)
+        self.boundaries = sorted({d for s in spans
+                                  for d in (s.startdate - one_day, s.startdate, s.enddate, s.enddate + one_day)})
+
+        self._counts_by_date = None
+
+    def count(self, day: date) -> int:
+        return bisect_right(self.starts, day) - bisect_left(self.ends, day)
+
+    def counts_by_date(self) -> List[Tuple[date, int]]:
+        """ Count for every boundary with any members, in one sweep over the sorted interval starts and ends. The index
+        is replaced when spans change, so the result is computed once. """
+        if self._counts_by_date is None:
+            result = []
+            started = ended = 0
+            for day in self.boundaries:
+                while started < len(self.starts) and self.starts[started] <= day:
+                    started += 1
+                while ended < len(self.ends) and self.ends[ended] < day:
+                    ended += 1
+                if started > ended:
+                    result.append((day, started - ended))
+            self._counts_by_date = result
+        return self._counts_by_date
+
+    def covers(self, member_id: int, day: date) -> bool:
+        intervals = self.intervals_by_member.get(member_id, [])
+        i = bisect_right(intervals, (day, date.max)) - 1
+        return i >= 0 and intervals[i][1] >= day
+
+
+class SpanIndex:
+    """ In memory interval index over all spans, built from one streaming query and refreshed per member using the
+    member change log. Answers point in time counts, active sets and per member span days for statistics and batch
+    jobs. Deleted spans are kept, they are only used by span_days. """
+
+    def __init__(self):
+        self.spans: Dict[int, SpanInterval] = {}
+        self.span_ids_by_member: Dict[int, Set[int]] = defaultdict(set)
+        self.built_at = None
+        self.refreshed_at = None
+        self.type_indexes: Dict[str, TypeIndex] = {}
+        self.changes = MemberChangeTracker()
+        self.lock = RLock()
+
+    def _load(self, member_ids=None, session=db_session):
+        query = (
+            session
+            .query(Span.span_id, Span.member_id, Span.type, Span.startdate, Span.enddate, Span.deleted_at.isnot(None))
+            .yield_per(LOAD_BATCH_SIZE)
+        )
+        if member_ids is not None:
+            query = query.filter(Span.member_id.in_(member_ids))
+        for span_id, *row in query:
+            span = SpanInterval(*row[:4], deleted=bool(row[4]))
+            self.spans[span_id] = span
+            self.span_ids_by_member[span.member_id].add(span_id)
+
+    def build(self, session=db_session):
+        now = datetime.utcnow()
+        self.changes.reset(session)
+        self.spans = {}
+        self.span_ids_by_member = defaultdict(set)
+        self._load(session=session)
+        self.built_at = self.refreshed_at = now
+        self.type_indexes = {}
+
+    def refresh(self, session=db_session):
+        """ Reload the spans of members with changes logged since last refresh, rebuild if changes may have been
+        missed. """
+        member_ids = self.changes.poll(session)
+        if member_ids is None:
+            self.build(session)
+            return
+
+        self.refreshed_at = datetime.utcnow()
+        if not member_ids:
+            return
+
+        for member_id in member_ids:
+            for span_id in self.span_ids_by_member.pop(member_id, set()):
+                del self.spans[span_id]
+        self._load(sorted(member_ids), session)
+        self.type_indexes = {}
+
+    def ensure_fresh(self, session=db_session):
+        now = datetime.utcnow()
+        with self.lock:
+            if self.built_at is None:
+                self.build(session)
+            elif now - self.refreshed_at > REFRESH_INTERVAL:
+                self.refresh(session)
+        return self
+
+    def type_index(self, span_type) -> TypeIndex:
+        with self.lock:
+            index = self.type_indexes.get(span_type)
+            if index is None:
+                index = TypeIndex([s for s in self.spans.values() if s.type == span_type and not s.deleted])
+                self.type_indexes[span_type] = index
+            return index
+
+    def count(self, span_type, day: date) -> int:
+        """ Number of members with a span of span_type covering day. """
+        return self.type_index(span_type).count(day)
+
+    def counts_by_date(self, span_type) -> List[Tuple[date, int]]:
+        """ Number of members with a span of span_type for every date the number may change, dates without members are
+        left out. """
+        return self.type_index(span_type).counts_by_date()
+
+    def active_members(self, span_type, day: date) -> Set[int]:
+        """ Members with a span of span_type covering day. """
+        index = self.type_index(span_type)
+        return {member_id for member_id in index.intervals_by_member if index.covers(member_id, day)}
+
+    def span_days(self, span_type, startdate: date, enddate: date) -> Dict[int, int]:
+        """ Summed length of spans of span_type clipped to startdate and enddate, per member with any days. Counted as
+        the membership statistics always have: deleted spans are included, the length of a span is enddate - startdate
+        and overlapping spans are not merged. """
+        result = defaultdict(int)
+        with self.lock:
+            spans = [s for s in self.spans.values() if s.type == span_type]
+        for span in spans:
+            if span.startdate < enddate and span.enddate > startdate:
+                result[span.member_id] += (min(span.enddate, enddate) - max(span.startdate, startdate)).days
+        return dict(result)
+
+
+span_index = SpanIndex()
+
+
+def get_span_index() -> SpanIndex:
+    """ The process wide span index, built or refreshed if needed. """
+    return span_index.ensure_fresh()
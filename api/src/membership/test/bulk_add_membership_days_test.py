@@ -0,0 +1,53 @@
+import membership
+from membership.membership import bulk_add_membership_days, get_membership_summary
+from membership.models import Span, Group
+from service.db import db_session
+from service.error import UnprocessableEntity, NotFound
+from test_aid.test_base import FlaskTestBase
+from test_aid.test_util import random_str
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models]
+
+    def test_days_are_added_after_existing_spans_or_from_start_date(self):
+        with_span = self.db.create_member()
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(-5), enddate=self.date(5))
+        without_span = self.db.create_member()
+
+        result = bulk_add_membership_days([with_span.member_id, without_span.member_id], None, Span.LABACCESS, 10,
+                                          random_str())
+
+        self.assertEqual(dict(added=2, skipped=0, min_enddate=self.date(10).isoformat(),
+                              max_enddate=self.date(15).isoformat()), result)
+        self.assertEqual(self.date(15), get_membership_summary(with_span.member_id).labaccess_end)
+        self.assertEqual(self.date(10), get_membership_summary(without_span.member_id).labaccess_end)
+
+    def test_members_of_group_are_included_and_repeated_call_is_skipped(self):
+        group = Group(name=random_str(), title=random_str())
+        members = [self.db.create_member() for _ in range(3)]
+        group.members.extend(members[:2])
+        db_session.add(group)
+        db_session.commit()
+        reason = random_str()
+
+        result = bulk_add_membership_days([members[2].member_id], group.group_id, Span.MEMBERSHIP, 7, reason)
+        self.assertEqual(3, result['added'])
+
+        result = bulk_add_membership_days([members[2].member_id], group.group_id, Span.MEMBERSHIP, 7, reason)
+        self.assertEqual(0, result['added'])
+        self.assertEqual(3, result['skipped'])
+
+        with self.assertRaises(UnprocessableEntity):
+            bulk_add_membership_days([members[0].member_id], None, Span.MEMBERSHIP, 8, reason)
+
+    def test_missing_member_is_not_found(self):
+        member = self.db.create_member()
+
+        with self.assertRaises(NotFound):
+            bulk_add_membership_days([member.member_id, 999999], None, Span.MEMBERSHIP, 7, random_str())
+
+    def test_missing_group_is_not_found(self):
+        with self.assertRaises(NotFound):
+            bulk_add_membership_days(None, 999999, Span.MEMBERSHIP, 7, random_str())
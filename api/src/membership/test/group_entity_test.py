@@ -0,0 +1,57 @@
+from functools import partial
+
+import membership
+from membership.models import Group
+from membership.views import group_entity
+from service.api_definition import Arg
+from service.db import db_session
+from service.entity import DESC
+from test_aid.test_base import FlaskTestBase
+from test_aid.test_util import random_str
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models]
+
+    def create_group(self, members=()):
+        group = Group(name=random_str(), title=random_str())
+        group.members.extend(members)
+        db_session.add(group)
+        db_session.commit()
+        return group
+
+    def test_num_members_is_deferred(self):
+        group = self.create_group()
+        db_session.expire_all()
+
+        group = db_session.query(Group).get(group.group_id)
+
+        self.assertNotIn('num_members', group.__dict__)
+
+    def test_list_and_read_counts_members(self):
+        empty = self.create_group()
+        full = self.create_group([self.db.create_member(), self.db.create_member()])
+
+        data = {obj['group_id']: obj for obj in group_entity.list()['data']}
+
+        self.assertEqual(0, data[empty.group_id]['num_members'])
+        self.assertEqual(2, data[full.group_id]['num_members'])
+        self.assertEqual(2, group_entity.read(full.group_id)['num_members'])
+
+    def test_list_route_args_are_filled_from_request(self):
+        self.assertEqual({'sort_by', 'sort_order', 'search', 'page_size', 'page', 'expand'},
+                         set(Arg.get_args(partial(group_entity.list, relation=None))))
+
+    def test_list_searches_sorts_and_pages(self):
+        prefix = random_str()
+        groups = [self.create_group() for _ in range(3)]
+        for i, group in enumerate(groups):
+            group.title = f"{prefix} {i}"
+        db_session.commit()
+
+        result = group_entity.list(search=prefix, sort_by='title', sort_order=DESC, page_size=2, page=1)
+
+        self.assertEqual(3, result['total'])
+        self.assertEqual([groups[2].group_id, groups[1].group_id], [obj['group_id'] for obj in result['data']])
+        self.assertNotIn('num_members', group_entity.to_obj(groups[0]))
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import membership
+from membership.membership import MemberChangeTracker, GAP_TIMEOUT
+from membership.models import MemberChange
+from service.db import db_session
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models]
+
+    def setUp(self):
+        self.tracker = MemberChangeTracker()
+        self.tracker.reset()
+        self.tracker.poll()
+
+    def log_change(self, change_id, member_id, created_at=None):
+        db_session.add(MemberChange(id=change_id, member_id=member_id, created_at=created_at or datetime.utcnow()))
+        db_session.commit()
+
+    def test_change_committed_after_later_change_is_not_missed(self):
+        first_id = self.tracker.last_change_id + 1
+        self.log_change(first_id + 1, 2)
+
+        self.assertEqual({2}, self.tracker.poll())
+        self.assertEqual({first_id}, set(self.tracker.gaps))
+
+        # Flushed long ago, committed now.
+        self.log_change(first_id, 1, created_at=datetime.utcnow() - timedelta(minutes=30))
+
+        self.assertEqual({1}, self.tracker.poll())
+        self.assertEqual({}, self.tracker.gaps)
+        self.assertEqual(set(), self.tracker.poll())
+
+    def test_gap_that_never_shows_up_requires_rebuild(self):
+        first_id = self.tracker.last_change_id + 1
+        self.log_change(first_id + 1, 2)
+        self.tracker.poll()
+
+        self.tracker.gaps[first_id] -= GAP_TIMEOUT
+
+        self.assertIsNone(self.tracker.poll())
+
+    def test_reset_reads_recent_changes_again(self):
+        change_id = self.tracker.last_change_id + 1
+        self.log_change(change_id, 3)
+
+        self.tracker.reset()
+
+        self.assertLess(self.tracker.last_change_id, change_id)
+        self.assertIn(3, self.tracker.poll())
@@ -0,0 +1,51 @@
+import membership
+from membership.member_number import MemberNumberAllocator
+from membership.models import MemberNumberSequence, Member
+from membership.views import member_entity
+from service.db import db_session
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models]
+
+    def setUp(self):
+        db_session.query(MemberNumberSequence).delete()
+        db_session.commit()
+
+    def next_number(self):
+        db_session.expire_all()
+        return db_session.query(MemberNumberSequence).get(1).next_number
+
+    def test_numbers_follow_max_member_number_and_batch_is_reserved_once(self):
+        self.db.create_member()
+        max_number = db_session.query(Member.member_number).order_by(Member.member_number.desc()).first()[0]
+        allocator = MemberNumberAllocator(batch_size=3)
+
+        self.assertEqual([max_number + 1, max_number + 2, max_number + 3], [allocator.allocate() for _ in range(3)])
+        self.assertEqual(max_number + 4, self.next_number())
+
+        self.assertEqual(max_number + 4, allocator.allocate())
+        self.assertEqual(max_number + 7, self.next_number())
+
+    def test_allocators_in_different_processes_never_get_the_same_number(self):
+        allocators = [MemberNumberAllocator(batch_size=2) for _ in range(3)]
+
+        numbers = [allocators[i % 3].allocate() for i in range(20)]
+
+        self.assertEqual(len(numbers), len(set(numbers)))
+
+    def test_explicit_member_numbers_are_not_allocated(self):
+        allocator = MemberNumberAllocator(batch_size=5)
+        first = allocator.allocate()
+        member_entity.create(dict(firstname="explicit", email="explicit@example.com", member_number=first + 1))
+        member_entity.create(dict(firstname="explicit", email="explicit2@example.com", member_number=first + 100))
+
+        self.assertEqual(first + 2, allocator.allocate())
+        self.assertEqual(first + 101, self.next_number())
+
+    def test_created_member_gets_number_from_sequence(self):
+        member = member_entity.create(dict(firstname="sequence", email="sequence@example.com"))
+
+        self.assertLess(member['member_number'], self.next_number())
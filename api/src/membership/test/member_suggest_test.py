@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import membership
+from membership.member_suggest import MemberSuggestIndex
+from membership.membership import GAP_TIMEOUT
+from membership.models import MemberChange, Member
+from service.db import db_session
+from test_aid.test_base import FlaskTestBase
+from test_aid.test_util import random_str
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models]
+
+    def setUp(self):
+        self.index = MemberSuggestIndex()
+
+    def suggested_ids(self, q):
+        return [s['member_id'] for s in self.index.suggest(q)]
+
+    def test_prefix_and_typo_in_name_matches(self):
+        name = "Zlatanus" + random_str(4)
+        member = self.db.create_member(firstname=name, lastname="Ibrahimovíc")
+        self.index.build()
+
+        self.assertEqual([member.member_id], self.suggested_ids(name[:5]))
+        self.assertEqual([member.member_id], self.suggested_ids(f"{name} ibrahimovc"))
+        self.assertEqual([member.member_id], self.suggested_ids(f"{name} IBRAHIMOVIC"))
+
+    def test_phone_number_matches_local_format_with_separators(self):
+        member = self.db.create_member(phone="+46709998877")
+        self.index.build()
+
+        self.assertEqual([member.member_id], self.suggested_ids("070-999 88 77"))
+        self.assertEqual([member.member_id], self.suggested_ids("+46 70 999")[:1])
+
+    def test_exact_member_number_is_ranked_first_and_changes_are_synced(self):
+        member = self.db.create_member()
+        self.index.build()
+        self.assertEqual(member.member_id, self.suggested_ids(str(member.member_number))[0])
+
+        member.firstname = "Qwertyuiop" + random_str(4)
+        db_session.commit()
+        self.index.sync()
+
+        self.assertEqual([member.member_id], self.suggested_ids(member.firstname))
+
+        member.deleted_at = self.datetime()
+        db_session.commit()
+        self.index.sync()
+
+        self.assertEqual([], self.suggested_ids(member.firstname))
+
+    def test_change_committed_after_later_change_is_synced(self):
+        member = self.db.create_member()
+        other = self.db.create_member()
+        self.index.build()
+        self.index.sync()
+        late_change_id = self.index.changes.last_change_id + 1
+
+        # A change flushed earlier with a lower id is committed after a later change.
+        db_session.add(MemberChange(id=late_change_id + 1, member_id=other.member_id, created_at=datetime.utcnow()))
+        db_session.commit()
+        self.index.sync()
+
+        # Update without the flush listener, the change is logged below.
+        db_session.query(Member).filter_by(member_id=member.member_id).update(
+            dict(firstname="Asdfghjkl" + random_str(4)))
+        db_session.add(MemberChange(id=late_change_id, member_id=member.member_id,
+                                    created_at=datetime.utcnow() - timedelta(minutes=30)))
+        db_session.commit()
+        db_session.refresh(member)
+        self.index.sync()
+
+        self.assertEqual([member.member_id], self.suggested_ids(member.firstname))
+
+    def test_index_is_rebuilt_when_changes_may_have_been_missed(self):
+        self.index.build()
+        member = self.db.create_member(firstname="Zxcvbnm" + random_str(4))
+        db_session.query(MemberChange).filter_by(member_id=member.member_id).delete()
+        db_session.commit()
+        self.index.changes.polled_at -= GAP_TIMEOUT
+
+        self.index.sync()
+
+        self.assertEqual([member.member_id], self.suggested_ids(member.firstname))
@@ -0,0 +1,131 @@
+import sys
+from unittest.mock import patch
+
+import membership
+from membership.membership import get_membership_summaries, get_membership_summary, NO_MEMBERSHIP, \
+    roll_membership_summaries, iter_members_and_membership
+from membership.models import Span, MembershipSummary
+from service.db import db_session
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models]
+
+    def test_member_without_spans_has_no_membership(self):
+        member = self.db.create_member()
+
+        self.assertEqual(NO_MEMBERSHIP, get_membership_summary(member.member_id))
+
+    def test_summary_aggregates_all_span_types(self):
+        member = self.db.create_member()
+        self.db.create_span(type=Span.MEMBERSHIP, startdate=self.date(-10), enddate=self.date(10))
+        self.db.create_span(type=Span.MEMBERSHIP, startdate=self.date(11), enddate=self.date(40))
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(-40), enddate=self.date(-10))
+        self.db.create_span(type=Span.SPECIAL_LABACESS, startdate=self.date(0), enddate=self.date(5))
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(-5), enddate=self.date(90),
+                            deleted_at=self.datetime())
+
+        summary = get_membership_summary(member.member_id)
+
+        self.assertEqual(self.date(40), summary.membership_end)
+        self.assertTrue(summary.membership_active)
+        self.assertEqual(self.date(-10), summary.labaccess_end)
+        self.assertFalse(summary.labaccess_active)
+        self.assertEqual(self.date(5), summary.special_labaccess_end)
+        self.assertTrue(summary.special_labaccess_active)
+        self.assertEqual(self.date(5), summary.effective_labaccess_end)
+        self.assertTrue(summary.effective_labaccess_active)
+
+    def test_summaries_for_subset_of_members_in_chunks_keeps_order(self):
+        members = [self.db.create_member() for _ in range(5)]
+        for i, member in enumerate(members):
+            self.db.create_span(member=member, type=Span.LABACCESS, startdate=self.date(-1), enddate=self.date(i))
+
+        wanted = [members[3], members[0], members[4]]
+        with patch.object(sys.modules['membership.membership'], 'SUMMARY_CHUNK_SIZE', 2):
+            summaries = get_membership_summaries([m.member_id for m in wanted] + [-1])
+
+        self.assertEqual([self.date(3), self.date(0), self.date(4), None], [s.labaccess_end for s in summaries])
+        self.assertEqual([True, True, True, False], [s.labaccess_active for s in summaries])
+
+    def test_summary_row_is_updated_when_spans_are_written(self):
+        member = self.db.create_member()
+        span = self.db.create_span(type=Span.LABACCESS, startdate=self.date(-1), enddate=self.date(10))
+
+        row = db_session.query(MembershipSummary).get(member.member_id)
+        self.assertEqual(self.date(10), row.labaccess_end)
+        self.assertTrue(row.labaccess_active)
+        self.assertEqual(self.date(), row.active_date)
+
+        span.deleted_at = self.datetime()
+        db_session.commit()
+
+        db_session.refresh(row)
+        self.assertIsNone(row.labaccess_end)
+        self.assertFalse(row.labaccess_active)
+
+    def test_summary_rows_of_both_members_are_updated_when_span_changes_member(self):
+        member1 = self.db.create_member()
+        member2 = self.db.create_member()
+        span = self.db.create_span(member=member1, type=Span.MEMBERSHIP, startdate=self.date(), enddate=self.date(5))
+
+        span.member_id = member2.member_id
+        db_session.commit()
+
+        self.assertIsNone(get_membership_summary(member1.member_id).membership_end)
+        self.assertEqual(self.date(5), get_membership_summary(member2.member_id).membership_end)
+
+    def test_outdated_summary_row_is_recalculated_but_not_written_when_read(self):
+        member = self.db.create_member()
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(1), enddate=self.date(10))
+        row = db_session.query(MembershipSummary).get(member.member_id)
+        row.active_date = self.date(-1)
+        row.labaccess_active = True
+        db_session.commit()
+
+        self.assertFalse(get_membership_summary(member.member_id).labaccess_active)
+        db_session.expire_all()
+        self.assertEqual(self.date(-1), db_session.query(MembershipSummary).get(member.member_id).active_date)
+
+    def test_roll_forward_calculates_active_flags_for_new_date(self):
+        member = self.db.create_member()
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(1), enddate=self.date(10))
+
+        roll_membership_summaries(self.date(1))
+
+        row = db_session.query(MembershipSummary).get(member.member_id)
+        self.assertEqual(self.date(1), row.active_date)
+        self.assertTrue(row.labaccess_active)
+
+    def test_iter_members_and_membership_pairs_members_with_summaries(self):
+        member = self.db.create_member()
+        self.db.create_span(type=Span.MEMBERSHIP, startdate=self.date(), enddate=self.date(7))
+        without_spans = self.db.create_member()
+
+        result = dict((m.member_id, s) for m, s in iter_members_and_membership(batch_size=2))
+
+        self.assertEqual(self.date(7), result[member.member_id].membership_end)
+        self.assertEqual(NO_MEMBERSHIP, result[without_spans.member_id])
+
+    def test_iter_members_and_membership_calculates_outdated_and_missing_summaries_without_writing(self):
+        outdated = self.db.create_member()
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(1), enddate=self.date(10))
+        row = db_session.query(MembershipSummary).get(outdated.member_id)
+        row.active_date = self.date(-1)
+        row.labaccess_active = True
+        missing = self.db.create_member()
+        self.db.create_span(type=Span.MEMBERSHIP, startdate=self.date(-1), enddate=self.date(3))
+        db_session.query(MembershipSummary).filter_by(member_id=missing.member_id).delete()
+        db_session.commit()
+
+        result = dict((m.member_id, s) for m, s in iter_members_and_membership(batch_size=1))
+
+        self.assertFalse(result[outdated.member_id].labaccess_active)
+        self.assertEqual(self.date(10), result[outdated.member_id].labaccess_end)
+        self.assertTrue(result[missing.member_id].membership_active)
+        self.assertEqual(self.date(3), result[missing.member_id].membership_end)
+        db_session.expire_all()
+        self.assertEqual(self.date(-1), db_session.query(MembershipSummary).get(outdated.member_id).active_date)
+        self.assertIsNone(db_session.query(MembershipSummary).get(missing.member_id))
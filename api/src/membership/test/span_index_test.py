@@ -0,0 +1,111 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import membership
+from membership.models import Span
+from membership.span_index import SpanIndex
+from service.db import db_session
+from statistics.maker_statistics import membership_number_months, membership_number_months2
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models]
+
+    def setUp(self):
+        # The db is shared between tests, so each test uses its own date range.
+        self.index = SpanIndex()
+
+    def test_counts_merges_overlapping_spans_of_same_member(self):
+        member1 = self.db.create_member()
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(1000), enddate=self.date(1010))
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(1005), enddate=self.date(1020))
+        member2 = self.db.create_member()
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(1010), enddate=self.date(1030))
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(1000), enddate=self.date(1100),
+                            deleted_at=self.datetime())
+
+        self.index.build()
+
+        self.assertEqual(2, self.index.count(Span.LABACCESS, self.date(1010)))
+        self.assertEqual(1, self.index.count(Span.LABACCESS, self.date(1025)))
+        self.assertEqual(0, self.index.count(Span.LABACCESS, self.date(1031)))
+        self.assertEqual({member1.member_id, member2.member_id},
+                         self.index.active_members(Span.LABACCESS, self.date(1015)))
+        self.assertEqual({member2.member_id}, self.index.active_members(Span.LABACCESS, self.date(1021)))
+
+        counts = dict(self.index.counts_by_date(Span.LABACCESS))
+        self.assertEqual(1, counts[self.date(1000)])
+        self.assertEqual(2, counts[self.date(1010)])
+        self.assertEqual(1, counts[self.date(1030)])
+        self.assertNotIn(self.date(1031), counts)
+
+    def test_span_days_is_clipped_to_range(self):
+        member = self.db.create_member()
+        self.db.create_span(type=Span.MEMBERSHIP, startdate=self.date(2000), enddate=self.date(2009))
+        self.db.create_span(type=Span.MEMBERSHIP, startdate=self.date(2005), enddate=self.date(2019))
+
+        self.index.build()
+
+        span_days = self.index.span_days(Span.MEMBERSHIP, self.date(2010), self.date(2100))
+        self.assertEqual(9, span_days[member.member_id])
+
+    def test_refresh_adds_new_and_removes_deleted_spans(self):
+        member = self.db.create_member()
+        span = self.db.create_span(type=Span.SPECIAL_LABACESS, startdate=self.date(3000), enddate=self.date(3010))
+        self.index.build()
+        self.assertEqual({member.member_id}, self.index.active_members(Span.SPECIAL_LABACESS, self.date(3005)))
+
+        other = self.db.create_member()
+        self.db.create_span(type=Span.SPECIAL_LABACESS, startdate=self.date(3000), enddate=self.date(3010))
+        span.deleted_at = datetime.utcnow()
+        db_session.commit()
+
+        self.index.refresh()
+
+        self.assertEqual({other.member_id}, self.index.active_members(Span.SPECIAL_LABACESS, self.date(3005)))
+
+    def test_refresh_picks_up_edited_span_dates(self):
+        member = self.db.create_member()
+        span = self.db.create_span(type=Span.SPECIAL_LABACESS, startdate=self.date(3500), enddate=self.date(3510))
+        self.index.build()
+
+        span.enddate = self.date(3520)
+        db_session.commit()
+        self.index.refresh()
+
+        self.assertEqual({member.member_id}, self.index.active_members(Span.SPECIAL_LABACESS, self.date(3515)))
+
+    def test_counts_by_date_sweep_matches_count_per_date(self):
+        for offsets in [(4000, 4010), (4003, 4004), (4012, 4020), (4011, 4011), (4030, 4040)]:
+            self.db.create_member()
+            self.db.create_span(type=Span.LABACCESS, startdate=self.date(offsets[0]), enddate=self.date(offsets[1]))
+            self.db.create_span(type=Span.LABACCESS, startdate=self.date(offsets[0] + 2), enddate=self.date(4015))
+
+        self.index.build()
+
+        index = self.index.type_index(Span.LABACCESS)
+        expected = [(day, index.count(day)) for day in index.boundaries if index.count(day) > 0]
+        self.assertEqual(expected, self.index.counts_by_date(Span.LABACCESS))
+        self.assertIs(self.index.counts_by_date(Span.LABACCESS), self.index.counts_by_date(Span.LABACCESS))
+
+    def test_membership_number_months_counts_spans_as_before_the_index(self):
+        startdate, enddate = self.date(5000), self.date(5090)
+        with patch('statistics.maker_statistics.get_span_index', return_value=self.index):
+            self.index.build()
+            before = [membership_number_months(Span.LABACCESS, startdate, enddate),
+                      membership_number_months2(Span.LABACCESS, startdate, enddate)]
+
+            self.db.create_member()
+            self.db.create_span(type=Span.LABACCESS, startdate=self.date(5000), enddate=self.date(5029))
+            self.db.create_span(type=Span.LABACCESS, startdate=self.date(5020), enddate=self.date(5059))
+            self.db.create_span(type=Span.LABACCESS, startdate=self.date(5060), enddate=self.date(5089),
+                                deleted_at=self.datetime())
+            self.index.build()
+            after = [membership_number_months(Span.LABACCESS, startdate, enddate),
+                     membership_number_months2(Span.LABACCESS, startdate, enddate)]
+
+        # Deleted spans are included, ends are exclusive and overlaps are not merged: 29 + 39 + 29 days, 3 months.
+        for before_counts, after_counts in zip(before, after):
+            self.assertEqual([0, 0, 0, 1], [a - b for a, b in zip(after_counts, before_counts)])
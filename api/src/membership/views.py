@@ -1,14 +1,23 @@
+import csv
+import json
+from dataclasses import fields
+from io import StringIO
+
 from membership import service
+from membership.group_entity import GroupEntity
 from membership.member_entity import MemberEntity
-from membership.membership import get_membership_summary, add_membership_days, get_members_and_membership, get_access_summary
+from membership.member_suggest import suggest_members
+from membership.membership import get_membership_summary, add_membership_days, get_members_and_membership, \
+    get_access_summary, iter_members_and_membership, MembershipData, bulk_add_membership_days
 from membership.models import Member, Group, member_group, Span, Permission, group_permission, \
     Key
 from membership.member_auth import get_member_permissions
 from service.api_definition import MEMBER_VIEW, MEMBER_CREATE, MEMBER_EDIT, MEMBER_DELETE, GROUP_VIEW, GROUP_CREATE, \
     GROUP_EDIT, GROUP_DELETE, GROUP_MEMBER_VIEW, GROUP_MEMBER_ADD, GROUP_MEMBER_REMOVE, SPAN_VIEW, SPAN_MANAGE, \
     PERMISSION_MANAGE, POST, Arg, PERMISSION_VIEW, KEYS_VIEW, KEYS_EDIT, GET, Enum, \
-    iso_date, non_empty_str, natural1
+    iso_date, non_empty_str, natural1, natural1_list, REQUIRED
 from service.entity import Entity, not_empty, ASC, OrmManyRelation, OrmSingeRelation, ExpandField
+from service.error import BadRequest
 
 member_entity = MemberEntity(
     Member,
@@ -19,12 +28,13 @@ member_entity = MemberEntity(
                     'address_city', 'phone', 'civicregno', 'member_number'),
 )
 
-group_entity = Entity(
+group_entity = GroupEntity(
     Group,
     validation=dict(name=not_empty, title=not_empty),
     default_sort_column='title',
     default_sort_order=ASC,
     search_columns=('name', 'title', 'description'),
+    hidden_columns=('num_members',),
 )
 
 permission_entity = Entity(
@@ -90,6 +100,22 @@ def member_add_membership_days(
     return add_membership_days(entity_id, type, days, creation_reason, default_start_date).as_json()
 
 
+@service.route("/member/suggest", method=GET, permission=MEMBER_VIEW)
+def member_suggest(q=Arg(str), limit=Arg(natural1, required=False)):
+    """ Typeahead suggestions for the member picker, answered from an in memory index. """
+    return suggest_members(q, min(limit or 10, 100))
+
+
+@service.route("/member/addMembershipDays", method=POST, permission=SPAN_MANAGE)
+def member_bulk_add_membership_days(
+        member_ids=Arg(natural1_list, required=False), group_id=Arg(natural1, required=False),
+        type=Arg(Enum(Span.MEMBERSHIP, Span.LABACCESS, Span.SPECIAL_LABACESS)), days=Arg(natural1),
+        creation_reason=Arg(non_empty_str), default_start_date=Arg(iso_date, required=False)):
+    if not member_ids and not group_id:
+        raise BadRequest("One of member_ids and group_id is required.", fields='member_ids,group_id', what=REQUIRED)
+    return bulk_add_membership_days(member_ids, group_id, type, days, creation_reason, default_start_date)
+
+
 @service.route("/member/<int:member_id>/pending_actions", method=GET, permission=SPAN_VIEW)
 def member_get_pending(member_id):
     from shop.shop_data import pending_actions
@@ -128,6 +154,52 @@ def all_with_membership(entity_id=None):
     return dict_members
 
 
+EXPORT_CSV = 'csv'
+EXPORT_NDJSON = 'ndjson'
+
+
+@service.stream_route("/member/all_with_membership/export", permission=MEMBER_VIEW)
+def all_with_membership_export(format=Arg(Enum(EXPORT_CSV, EXPORT_NDJSON), required=False)):
+    """ Streaming variant of all_with_membership, rows are written while members are read so memory use is constant
+    regardless of the number of members. """
+    
+    rows = (
+        (member_entity.to_obj(member), membership.as_json())
+        for member, membership in iter_members_and_membership()
+    )
+    
+    if format == EXPORT_CSV:
+        return csv_export(rows), 'text/csv'
+    
+    return ndjson_export(rows), 'application/x-ndjson'
+
+
+def ndjson_export(rows):
+    for obj, membership in rows:
+        obj["membership"] = membership
+        yield json.dumps(obj) + "\n"
+
+
+def csv_export(rows):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+    
+    member_columns = list(member_entity.cols_to_obj)
+    membership_columns = [f.name for f in fields(MembershipData)]
+    writer.writerow(member_columns + membership_columns)
+    yield flush()
+    
+    for obj, membership in rows:
+        writer.writerow([obj[c] for c in member_columns] + [membership[c] for c in membership_columns])
+        yield flush()
+
+
 service.entity_routes(
     path="/group",
     entity=group_entity,
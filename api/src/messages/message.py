@@ -1,17 +1,21 @@
+from functools import cache
 from os.path import abspath, dirname
 
-from jinja2 import FileSystemLoader, Environment, select_autoescape
-
 from messages.models import MessageTemplate, Message
 from service.config import get_public_url
 
 
-template_loader = FileSystemLoader(abspath(dirname(dirname(__file__))) + '/templates')
-template_env = Environment(loader=template_loader, autoescape=select_autoescape())
+@cache
+def get_template_env():
+    """ Create the jinja environment on first use, jinja is not needed to serve most requests. """
+    from jinja2 import FileSystemLoader, Environment, select_autoescape
+    
+    template_loader = FileSystemLoader(abspath(dirname(dirname(__file__))) + '/templates')
+    return Environment(loader=template_loader, autoescape=select_autoescape())
 
 
 def render_template(name, **kwargs):
-    return template_env.get_template(name).render(**kwargs)
+    return get_template_env().get_template(name).render(**kwargs)
 
 
 def send_message(template: MessageTemplate, member, db_session=None, **kwargs):
@@ -17,6 +17,7 @@ class MessageTemplate(enum.Enum):
     PASSWORD_RESET = 'password_reset'
     ADD_LABACCESS_TIME = 'add_labaccess_time'
     ADD_MEMBERSHIP_TIME = 'add_membership_time'
+    ADD_MEMBERSHIP_AND_LABACCESS_TIME = 'add_membership_and_labaccess_time'
     BOX_WARNING = 'box_warning'
     BOX_FINAL_WARNING = 'box_final_warning'
     BOX_TERMINATED = 'box_terminated'
@@ -4,7 +4,7 @@ import shop
 from dispatch_emails import membership_reminder, MEMBERSHIP_REMINDER_DAYS_BEFORE, \
     MEMBERSHIP_REMINDER_GRACE_PERIOD
 from membership import membership
-from membership.models import Span, Member
+from membership.models import Span, Member, MembershipSummary
 from messages.models import Message, MessageTemplate
 from service.db import db_session
 from shop.models import ProductAction, Transaction
@@ -27,6 +27,7 @@ class Test(ShopTestMixin, FlaskTestBase):
     def setUp(self):
         db_session.query(Member).delete()
         db_session.query(Span).delete()
+        db_session.query(MembershipSummary).delete()
         db_session.query(Message).delete()
     
     def send_membership(self):
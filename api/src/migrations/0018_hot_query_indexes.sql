@@ -0,0 +1,23 @@
+-- Indexes for the membership summary, reminder, login throttling and shipping queries.
+
+-- Membership summary and add_membership_days (member_id, type, deleted_at, MAX(enddate)).
+ALTER TABLE `membership_spans` ADD INDEX `member_type_deleted_enddate_index` (`member_id`, `type`, `deleted_at`, `enddate`);
+
+-- Statistics and reminders scanning spans of a type by date.
+ALTER TABLE `membership_spans` ADD INDEX `type_deleted_startdate_enddate_index` (`type`, `deleted_at`, `startdate`, `enddate`, `member_id`);
+
+-- Reminders checking if a template was recently sent to a member, replaces member_id_index.
+ALTER TABLE `message` ADD INDEX `member_template_created_index` (`member_id`, `template`, `created_at`);
+ALTER TABLE `message` DROP INDEX `member_id_index`;
+
+-- Failed login count per ip during the last hour.
+ALTER TABLE `login` ADD INDEX `ip_date_index` (`ip`, `date`);
+
+-- Pending actions when shipping orders.
+ALTER TABLE `webshop_transaction_actions` ADD INDEX `status_content_index` (`status`, `content_id`);
+
+-- Completed transactions by date for statistics and exports.
+ALTER TABLE `webshop_transactions` ADD INDEX `status_created_at_index` (`status`, `created_at`);
+
+-- Pending actions and purchase history for one member.
+ALTER TABLE `webshop_transactions` ADD INDEX `member_id_status_index` (`member_id`, `status`);
@@ -0,0 +1,31 @@
+-- Materialized membership summary per member, maintained when spans are written.
+CREATE TABLE IF NOT EXISTS `membership_summary` (
+  `member_id` int(10) unsigned NOT NULL,
+  `membership_end` date DEFAULT NULL,
+  `membership_active` tinyint(1) NOT NULL,
+  `labaccess_end` date DEFAULT NULL,
+  `labaccess_active` tinyint(1) NOT NULL,
+  `special_labaccess_end` date DEFAULT NULL,
+  `special_labaccess_active` tinyint(1) NOT NULL,
+  `active_date` date NOT NULL,
+  PRIMARY KEY (`member_id`),
+  KEY `active_date_index` (`active_date`),
+  CONSTRAINT `membership_summary_member_id_foreign` FOREIGN KEY (`member_id`) REFERENCES `membership_members` (`member_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Backfill from existing spans, rows with another active_date are recalculated when read.
+INSERT INTO `membership_summary` (`member_id`, `membership_end`, `membership_active`, `labaccess_end`,
+                                  `labaccess_active`, `special_labaccess_end`, `special_labaccess_active`,
+                                  `active_date`)
+SELECT m.`member_id`,
+       MAX(CASE WHEN s.`type` = 'membership' THEN s.`enddate` END),
+       COALESCE(SUM(s.`type` = 'membership' AND s.`startdate` <= CURDATE() AND s.`enddate` >= CURDATE()), 0) > 0,
+       MAX(CASE WHEN s.`type` = 'labaccess' THEN s.`enddate` END),
+       COALESCE(SUM(s.`type` = 'labaccess' AND s.`startdate` <= CURDATE() AND s.`enddate` >= CURDATE()), 0) > 0,
+       MAX(CASE WHEN s.`type` = 'special_labaccess' THEN s.`enddate` END),
+       COALESCE(SUM(s.`type` = 'special_labaccess' AND s.`startdate` <= CURDATE() AND s.`enddate` >= CURDATE()), 0) > 0,
+       CURDATE()
+FROM `membership_members` m
+LEFT JOIN `membership_spans` s ON s.`member_id` = m.`member_id` AND s.`deleted_at` IS NULL
+WHERE m.`deleted_at` IS NULL
+GROUP BY m.`member_id`;
@@ -0,0 +1,8 @@
+-- Log of changed members for invalidating per process caches, old rows are pruned nightly.
+CREATE TABLE IF NOT EXISTS `membership_member_changes` (
+  `id` int(10) unsigned NOT NULL AUTO_INCREMENT,
+  `member_id` int(10) unsigned NOT NULL,
+  `created_at` datetime NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `created_at_index` (`created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -0,0 +1,9 @@
+-- Version of the public product catalog, bumped on every write to products, categories, actions or images so
+-- workers know when to rebuild their cached catalog snapshot.
+CREATE TABLE IF NOT EXISTS `webshop_catalog_version` (
+  `id` int(10) unsigned NOT NULL,
+  `version` int(10) unsigned NOT NULL DEFAULT '0',
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+INSERT IGNORE INTO `webshop_catalog_version` (`id`, `version`) VALUES (1, 0);
@@ -0,0 +1,4 @@
+-- Content hash of product images, used as ETag and version in image urls.
+ALTER TABLE `webshop_product_images` ADD COLUMN `hash` varchar(40) COLLATE utf8mb4_0900_ai_ci DEFAULT NULL AFTER `data`;
+
+UPDATE `webshop_product_images` SET `hash` = SHA1(`data`) WHERE `data` IS NOT NULL;
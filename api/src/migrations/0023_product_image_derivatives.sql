@@ -0,0 +1,12 @@
+-- Smaller and webp versions of product images generated at upload.
+CREATE TABLE IF NOT EXISTS `webshop_product_image_derivatives` (
+  `id` int(10) unsigned NOT NULL AUTO_INCREMENT,
+  `image_id` int(10) unsigned NOT NULL,
+  `width` int(10) unsigned NOT NULL,
+  `type` varchar(64) COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `data` MEDIUMBLOB NOT NULL,
+  `hash` varchar(40) COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `image_width_type_index` (`image_id`, `width`, `type`),
+  CONSTRAINT `derivative_image_constraint` FOREIGN KEY (`image_id`) REFERENCES `webshop_product_images` (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -0,0 +1,14 @@
+-- Ledger of stripe webhook events, the webhook only records the event and a worker processes it.
+CREATE TABLE IF NOT EXISTS `webshop_stripe_webhook_events` (
+  `id` varchar(255) COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `type` varchar(255) COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `payload` mediumtext COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `status` enum('pending','processing','processed','failed') COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `attempts` int(10) unsigned NOT NULL DEFAULT '0',
+  `error` text COLLATE utf8mb4_0900_ai_ci,
+  `received_at` datetime NOT NULL,
+  `claimed_at` datetime DEFAULT NULL,
+  `processed_at` datetime DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `status_received_at_index` (`status`, `received_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
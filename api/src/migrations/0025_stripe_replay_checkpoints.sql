@@ -0,0 +1,7 @@
+-- Last stripe event processed by a named replay of stripe events, a replay resumes after it.
+CREATE TABLE IF NOT EXISTS `webshop_stripe_replay_checkpoints` (
+  `name` varchar(255) COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `event_id` varchar(255) COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `updated_at` datetime NOT NULL,
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
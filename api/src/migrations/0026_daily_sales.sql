@@ -0,0 +1,20 @@
+-- Sales per day and product for statistics, updated when transactions complete.
+CREATE TABLE IF NOT EXISTS `webshop_daily_sales` (
+  `date` date NOT NULL,
+  `product_id` int(10) unsigned NOT NULL,
+  `category_id` int(10) unsigned NOT NULL,
+  `count` int(10) NOT NULL,
+  `amount` decimal(15,2) NOT NULL,
+  PRIMARY KEY (`date`, `product_id`),
+  KEY `product_id_date_index` (`product_id`, `date`),
+  CONSTRAINT `daily_sales_product_constraint` FOREIGN KEY (`product_id`) REFERENCES `webshop_products` (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Backfill from all completed transactions, backfill_daily_sales.py does the same for a date range.
+INSERT INTO `webshop_daily_sales` (`date`, `product_id`, `category_id`, `count`, `amount`)
+SELECT DATE(t.created_at), c.product_id, p.category_id, SUM(c.count), SUM(c.amount)
+FROM webshop_transactions AS t
+JOIN webshop_transaction_contents AS c ON c.transaction_id = t.id
+JOIN webshop_products AS p ON p.id = c.product_id
+WHERE t.status = 'completed'
+GROUP BY DATE(t.created_at), c.product_id, p.category_id;
@@ -0,0 +1,5 @@
+-- Display order is allocated with gaps without a lock and reordered in one statement, so it is no longer unique.
+ALTER TABLE `webshop_product_categories` DROP INDEX `webshop_product_categories_display_order_unique`,
+  ADD INDEX `display_order_index` (`display_order`);
+ALTER TABLE `webshop_products` DROP INDEX `webshop_products_display_order_unique`,
+  ADD INDEX `display_order_index` (`display_order`);
@@ -0,0 +1,9 @@
+-- Sequence for member numbers, processes reserve batches of numbers from it instead of locking on MAX(member_number).
+CREATE TABLE IF NOT EXISTS `membership_member_number_sequence` (
+  `id` int(10) unsigned NOT NULL,
+  `next_number` int(10) unsigned NOT NULL,
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+INSERT INTO `membership_member_number_sequence` (`id`, `next_number`)
+SELECT 1, COALESCE(MAX(`member_number`), 999) + 1 FROM `membership_members`;
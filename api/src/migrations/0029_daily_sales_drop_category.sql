@@ -0,0 +1,2 @@
+-- Category revenue is counted by the current category of each product, the category at sale time is not read.
+ALTER TABLE `webshop_daily_sales` DROP COLUMN `category_id`;
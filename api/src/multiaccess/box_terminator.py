@@ -4,7 +4,8 @@ from sqlalchemy import desc
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm.exc import NoResultFound
 
-from membership.models import Member, Box, Span
+from membership.membership import get_membership_summary, get_membership_summaries
+from membership.models import Member, Box
 from messages.message import send_message
 from messages.models import MessageTemplate
 from service.db import db_session
@@ -16,17 +17,14 @@ from shop.transactions import pending_action_value_sum, ProductAction
 JUDGMENT_DAY = date(1997, 9, 26)  # Used as default for missing lab access date.
 
 
-def get_labacess_end_date(box):
-    try:
-        return max(s.enddate for s in box.member.spans
-                   if s.type in (Span.LABACCESS, Span.SPECIAL_LABACESS) and not s.deleted_at)
-    except ValueError:
-        return JUDGMENT_DAY
+def get_labacess_end_date(box, membership=None):
+    membership = membership or get_membership_summary(box.member_id)
+    return membership.effective_labaccess_end or JUDGMENT_DAY
 
 
 def get_box_query():
-    query = db_session.query(Box).join(Member).outerjoin(Span)
-    query = query.options(contains_eager(Box.member), contains_eager(Box.member).contains_eager(Member.spans))
+    query = db_session.query(Box).join(Member)
+    query = query.options(contains_eager(Box.member))
     return query
 
 
@@ -37,8 +35,8 @@ def get_expire_date_from_labaccess_end_date(expire_date):
     return JUDGMENT_DAY
 
 
-def get_box_info(box):
-    expire_date = get_labacess_end_date(box) + timedelta(days=1)
+def get_box_info(box, membership=None):
+    expire_date = get_labacess_end_date(box, membership) + timedelta(days=1)
     terminate_date = get_expire_date_from_labaccess_end_date(expire_date)
     pending_labaccess_days = pending_action_value_sum(box.member_id, ProductAction.ADD_LABACCESS_DAYS)
 
@@ -63,8 +61,9 @@ def get_box_info(box):
 
 
 def box_terminator_boxes():
-    query = get_box_query()
-    return [get_box_info(b) for b in query.order_by(desc(Box.last_check_at))]
+    boxes = get_box_query().order_by(desc(Box.last_check_at)).all()
+    memberships = get_membership_summaries([b.member_id for b in boxes])
+    return [get_box_info(b, m) for b, m in zip(boxes, memberships)]
 
 
 def box_terminator_nag(member_number=None, box_label_id=None, nag_type=None):
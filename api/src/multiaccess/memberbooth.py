@@ -1,47 +1,234 @@
+import hashlib
+import hmac
+import json
+from collections import defaultdict
+from datetime import date, datetime
 from logging import getLogger
+from threading import RLock
 
-from membership.membership import get_membership_summary
+from sqlalchemy import func
+
+from membership.membership import get_membership_summaries, MemberChangeTracker, GAP_TIMEOUT
 from service.db import db_session
 from service.error import NotFound
-from membership.models import Member, Key
+from service.util import date_to_str
+from membership.models import Member, Key, MemberChange
 
 
 logger = getLogger("makeradmin")
 
 
-def member_to_response_object(member: Member):
+def tag_key(tagid):
+    """ Tags are looked up as ints from the booth, normalize numeric tags so leading zeros does not matter. """
+    tagid = str(tagid)
+    return int(tagid) if tagid.isdigit() else tagid
+
+
+class MemberboothCache:
+    """ Per process index from tag to member and precomputed memberbooth response objects. Invalidated per member
+    using the member change log and fully rebuilt when the date changes, since active flags depend on it, or when
+    changes may have been missed. Built on first use so process start does not scan all members. """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.date = None
+        self.member_id_by_tag = {}
+        self.responses = {}
+        self.changes = MemberChangeTracker()
+
+    def build(self, session=db_session):
+        """ Build index and responses for all members with keys. """
+        today = date.today()
+        self.changes.reset(session)
+        self.member_id_by_tag = {}
+        self.responses = {}
+        self.date = today
+        self.load_members(None, session)
+
+    def load_members(self, member_ids, session=db_session):
+        """ Load tags and responses for members in member_ids (or all members if None) that have keys, responses for
+        other members are created when needed. """
+        query = (
+            session
+            .query(Key.tagid, Key.member_id)
+            .join(Member, Member.member_id == Key.member_id)
+            .filter(Key.deleted_at.is_(None), Member.deleted_at.is_(None))
+        )
+        if member_ids is not None:
+            query = query.filter(Key.member_id.in_(member_ids))
+        tags = query.all()
+
+        for tagid, member_id in tags:
+            self.member_id_by_tag[tag_key(tagid)] = member_id
+
+        self.responses.update(memberbooth_response_objects({member_id for _, member_id in tags}, session))
+
+    def invalidate(self, member_ids, session=db_session):
+        for member_id in member_ids:
+            self.responses.pop(member_id, None)
+        self.member_id_by_tag = {t: m for t, m in self.member_id_by_tag.items() if m not in member_ids}
+        self.load_members(member_ids, session)
+
+    def sync(self, session=db_session):
+        """ Apply changes logged since last sync. """
+        if self.date != date.today():
+            self.build(session)
+            return
+
+        member_ids = self.changes.poll(session)
+        if member_ids is None:
+            self.build(session)
+        elif member_ids:
+            self.invalidate(member_ids, session)
+
+    def member_id_for_tag(self, tagid):
+        with self.lock:
+            self.sync()
+            return self.member_id_by_tag.get(tag_key(tagid))
+
+    def response(self, member_id):
+        with self.lock:
+            self.sync()
+            response = self.responses.get(member_id)
+            if response is None:
+                response = memberbooth_response_objects([member_id]).get(member_id)
+                if response is not None:
+                    self.responses[member_id] = response
+            return response
+
+
+memberbooth_cache = MemberboothCache()
+
+
+def memberbooth_response_objects(member_ids, session=db_session):
+    """ Build memberbooth response objects for members in bulk, returns a dict from member_id to response. """
+    member_ids = list(member_ids)
+    if not member_ids:
+        return {}
+
+    members = session.query(Member).filter(Member.member_id.in_(member_ids)).all()
+
+    keys_by_member = defaultdict(list)
+    for key_id, member_id, tagid in (
+        session.query(Key.key_id, Key.member_id, Key.tagid).filter(Key.member_id.in_(member_ids)).order_by(Key.key_id)
+    ):
+        keys_by_member[member_id].append({'key_id': key_id, 'rfid_tag': tagid})
+
+    memberships = get_membership_summaries([m.member_id for m in members])
+
     return {
-        'member_id': member.member_id,
-        'member_number': member.member_number,
-        'firstname': member.firstname,
-        'lastname': member.lastname,
-        'end_date': max((span.enddate for span in member.spans)).isoformat() if len(member.spans) > 0 else None,
-        'keys': [{'key_id': key.key_id, 'rfid_tag': key.tagid} for key in member.keys],
+        member.member_id: {
+            'member_id': member.member_id,
+            'member_number': member.member_number,
+            'firstname': member.firstname,
+            'lastname': member.lastname,
+            'keys': keys_by_member[member.member_id],
+            'membership_data': membership.as_json(),
+        }
+        for member, membership in zip(members, memberships)
     }
 
 
-def memberbooth_response_object(member: Member, membership_data):
-    response = member_to_response_object(member)
-    del response["end_date"]
-    response["membership_data"] = membership_data.as_json()
-    return response
+# Format of the snapshot records, bump when changing them.
+SNAPSHOT_FORMAT = 1
 
 
-def tag_to_memberinfo(tagid: str):
-    key = db_session.query(Key)\
-        .join(Key.member) \
-        .filter(Key.tagid == tagid) \
-        .filter(
-            Member.deleted_at.is_(None),
-            Key.deleted_at.is_(None),
-        ) \
-        .first()
+def snapshot_records(member_ids=None, session=db_session):
+    """ Compact records for offline verification in memberbooth kiosks, for members in member_ids (or all members if
+    None). Returns records and ids of members in member_ids that are deleted or missing. """
+    query = (
+        session
+        .query(Member.member_id, Member.member_number, Member.firstname, Member.lastname)
+        .filter(Member.deleted_at.is_(None))
+        .order_by(Member.member_id)
+    )
+    if member_ids is not None:
+        query = query.filter(Member.member_id.in_(member_ids))
+    members = query.all()
+
+    tags_by_member = defaultdict(list)
+    key_query = (
+        session
+        .query(Key.member_id, Key.tagid)
+        .join(Member, Member.member_id == Key.member_id)
+        .filter(Key.deleted_at.is_(None), Member.deleted_at.is_(None))
+        .order_by(Key.key_id)
+    )
+    if member_ids is not None:
+        key_query = key_query.filter(Key.member_id.in_(member_ids))
+    for member_id, tagid in key_query:
+        tags_by_member[member_id].append(tagid)
+
+    memberships = get_membership_summaries([m.member_id for m in members])
+
+    records = [
+        {
+            'member_id': member_id,
+            'member_number': member_number,
+            'firstname': firstname,
+            'lastname': lastname,
+            'tags': tags_by_member[member_id],
+            'membership_end': date_to_str(membership.membership_end),
+            'labaccess_end': date_to_str(membership.effective_labaccess_end),
+        }
+        for (member_id, member_number, firstname, lastname), membership in zip(members, memberships)
+    ]
+
+    existing_ids = {r['member_id'] for r in records}
+    deleted_ids = sorted(set(member_ids or []) - existing_ids)
+
+    return records, deleted_ids
 
-    if key is None:
+
+def sign_snapshot(snapshot, secret):
+    """ HMAC-SHA256 of the snapshot as json with sorted keys and no whitespace, kiosks verify it the same way. """
+    message = json.dumps(snapshot, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def memberbooth_snapshot(since=None, secret=None, session=db_session):
+    """ Versioned and signed snapshot of members for memberbooth kiosks. The version is an id in the member change log,
+    if since is given and the log still covers it only members changed after since are included (incremental),
+    otherwise all members (full). """
+
+    # Changes are committed in another order than their ids, use a version old enough that no change before it can
+    # show up later. Changes after the version may be sent again in the next delta, applying them is idempotent.
+    now = datetime.utcnow()
+    version, = (
+        session
+        .query(func.coalesce(func.max(MemberChange.id), 0))
+        .filter(MemberChange.created_at < now - GAP_TIMEOUT)
+        .one()
+    )
+    oldest_id, = session.query(func.min(MemberChange.id)).one()
+
+    full = since is None or oldest_id is None or since + 1 < oldest_id
+    if full:
+        records, deleted_ids = snapshot_records(session=session)
+    else:
+        member_ids = {
+            member_id for member_id, in
+            session.query(MemberChange.member_id).filter(MemberChange.id > since).distinct()
+        }
+        records, deleted_ids = snapshot_records(sorted(member_ids), session=session)
+
+    snapshot = dict(
+        format=SNAPSHOT_FORMAT,
+        version=version,
+        since=None if full else since,
+        full=full,
+        members=records,
+        deleted_member_ids=deleted_ids,
+    )
+    return {**snapshot, 'signature': sign_snapshot(snapshot, secret)}
+
+
+def tag_to_memberinfo(tagid: str):
+    member_id = memberbooth_cache.member_id_for_tag(tagid)
+    if member_id is None:
         return None
 
-    membership_data = get_membership_summary(key.member_id)
-    return memberbooth_response_object(key.member, membership_data)
+    return memberbooth_cache.response(member_id)
 
 
 def pin_login_to_memberinfo(member_number: int, pin_code: str):
@@ -60,8 +247,7 @@ def pin_login_to_memberinfo(member_number: int, pin_code: str):
         logger.warning(f"Incorrect PIN code for member #{member.member_number}")
         raise NotFound(f"The member + pin code combination does not belong to any known user.")
 
-    membership_data = get_membership_summary(member.member_id)
-    return memberbooth_response_object(member, membership_data)
+    return memberbooth_cache.response(member.member_id)
 
 
 def member_number_to_memberinfo(member_number: int):
@@ -70,5 +256,4 @@ def member_number_to_memberinfo(member_number: int):
     if not member:
         return None
 
-    membership_data = get_membership_summary(member.member_id)
-    return memberbooth_response_object(member, membership_data)
+    return memberbooth_cache.response(member.member_id)
@@ -0,0 +1,48 @@
+import membership
+from membership.models import Span
+from multiaccess.memberbooth import MemberboothCache
+from service.db import db_session
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models]
+
+    def setUp(self):
+        self.cache = MemberboothCache()
+
+    def test_tag_lookup_is_answered_from_index_built_in_bulk(self):
+        member = self.db.create_member()
+        key = self.db.create_key(tagid="0012345")
+        self.cache.build()
+
+        self.assertEqual(member.member_id, self.cache.member_id_by_tag[12345])
+        self.assertEqual(member.member_id, self.cache.member_id_for_tag(12345))
+        response = self.cache.response(member.member_id)
+        self.assertEqual([{'key_id': key.key_id, 'rfid_tag': "0012345"}], response['keys'])
+        self.assertFalse(response['membership_data']['labaccess_active'])
+
+    def test_span_change_invalidates_response(self):
+        member = self.db.create_member()
+        self.db.create_key()
+        self.cache.build()
+        self.assertFalse(self.cache.response(member.member_id)['membership_data']['labaccess_active'])
+
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(), enddate=self.date(10))
+
+        self.assertTrue(self.cache.response(member.member_id)['membership_data']['labaccess_active'])
+
+    def test_deleted_key_and_member_is_removed_from_index(self):
+        member = self.db.create_member()
+        key = self.db.create_key()
+        other = self.db.create_member()
+        other_key = self.db.create_key()
+        self.cache.build()
+
+        key.deleted_at = self.datetime()
+        other.deleted_at = self.datetime()
+        db_session.commit()
+
+        self.assertIsNone(self.cache.member_id_for_tag(key.tagid))
+        self.assertIsNone(self.cache.member_id_for_tag(other_key.tagid))
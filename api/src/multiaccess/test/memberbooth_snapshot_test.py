@@ -0,0 +1,49 @@
+import membership
+from membership.models import Span, MemberChange
+from multiaccess.memberbooth import memberbooth_snapshot, sign_snapshot
+from service.db import db_session
+from test_aid.test_base import FlaskTestBase
+
+
+SECRET = "secret"
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models]
+
+    def test_full_snapshot_is_signed_and_contains_tags_and_end_dates(self):
+        member = self.db.create_member()
+        key = self.db.create_key()
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(), enddate=self.date(10))
+
+        snapshot = memberbooth_snapshot(secret=SECRET)
+
+        self.assertTrue(snapshot['full'])
+        signature = snapshot.pop('signature')
+        self.assertEqual(sign_snapshot(snapshot, SECRET), signature)
+        record, = [r for r in snapshot['members'] if r['member_id'] == member.member_id]
+        self.assertEqual([key.tagid], record['tags'])
+        self.assertEqual(self.date(10).isoformat(), record['labaccess_end'])
+        self.assertIsNone(record['membership_end'])
+
+    def test_incremental_snapshot_contains_changed_and_deleted_members_only(self):
+        unchanged = self.db.create_member()
+        changed = self.db.create_member()
+        deleted = self.db.create_member()
+        # Changes within the lookback are always sent again, make the changes so far older than that.
+        db_session.query(MemberChange).update({MemberChange.created_at: self.datetime(hours=-1)})
+        db_session.commit()
+        version = memberbooth_snapshot(secret=SECRET)['version']
+
+        self.db.create_span(member=changed, type=Span.MEMBERSHIP, startdate=self.date(), enddate=self.date(30))
+        deleted.deleted_at = self.datetime()
+        db_session.commit()
+
+        snapshot = memberbooth_snapshot(since=version, secret=SECRET)
+
+        self.assertFalse(snapshot['full'])
+        member_ids = [r['member_id'] for r in snapshot['members']]
+        self.assertIn(changed.member_id, member_ids)
+        self.assertNotIn(unchanged.member_id, member_ids)
+        self.assertIn(deleted.member_id, snapshot['deleted_member_ids'])
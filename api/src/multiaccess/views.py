@@ -3,8 +3,11 @@ from flask import g
 from multiaccess import service
 from multiaccess.box_terminator import box_terminator_validate, box_terminator_nag, \
     box_terminator_boxes
-from multiaccess.memberbooth import pin_login_to_memberinfo, tag_to_memberinfo, member_number_to_memberinfo
-from service.api_definition import GET, Arg, MEMBER_EDIT, POST, symbol, MEMBERBOOTH
+from multiaccess.memberbooth import pin_login_to_memberinfo, tag_to_memberinfo, member_number_to_memberinfo, \
+    memberbooth_snapshot
+from service.api_definition import GET, Arg, MEMBER_EDIT, POST, symbol, MEMBERBOOTH, natural0
+from service.config import config
+from service.error import InternalServerError
 
 
 @service.route("/memberbooth/tag", method=GET, permission=MEMBERBOOTH)
@@ -22,6 +25,16 @@ def memberbooth_member(member_number=Arg(int)):
     return member_number_to_memberinfo(member_number)
 
 
+@service.route("/memberbooth/snapshot", method=GET, permission=MEMBERBOOTH)
+def memberbooth_snapshot_route(since=Arg(natural0, required=False)):
+    """ Signed member snapshot for offline kiosks, full or incremental since a version. """
+    secret = config.get('MEMBERBOOTH_SNAPSHOT_SECRET', log_value=False)
+    if not secret:
+        raise InternalServerError("Memberbooth snapshots are not configured.",
+                                  log="config MEMBERBOOTH_SNAPSHOT_SECRET is missing")
+    return memberbooth_snapshot(since, secret)
+
+
 @service.route("/box-terminator/boxes", method=GET, permission=MEMBER_EDIT)
 def box_terminator_boxes_routes():
     """ Returns a list of all boxes scanned, ever. """
@@ -8,10 +8,11 @@ from random import random
 from time import sleep
 from typing import Union
 
-import requests
-
 from service.config import config
 from service.entity import fromisoformat
+from service.util import lazy_import
+
+requests = lazy_import("requests")
 
 logger = getLogger("accessy")
 
@@ -3,9 +3,10 @@ from dataclasses import dataclass, field
 from datetime import date, timedelta
 from logging import getLogger
 
-from sqlalchemy.orm import contains_eager
+from sqlalchemy import or_
 
-from membership.models import Member, Span
+from membership.membership import roll_membership_summaries
+from membership.models import Member, Span, MembershipSummary
 from multiaccessy.accessy import PHONE, AccessyMember, ACCESSY_LABACCESS_GROUP, ACCESSY_SPECIAL_LABACCESS_GROUP, \
     accessy_session
 from service.db import db_session
@@ -20,27 +21,32 @@ GROUPS = {
 
 
 def get_wanted_access(today) -> dict[PHONE, AccessyMember]:
-    query = db_session.query(Member).join(Member.spans)
-    query = query.options(contains_eager(Member.spans))
+    # Normally a no-op since summaries are rolled forward nightly.
+    roll_membership_summaries(today)
+    
+    query = db_session.query(Member, MembershipSummary).join(MembershipSummary)
     query = query.filter(
         Member.deleted_at.is_(None),
         Member.phone.is_not(None),
         Member.labaccess_agreement_at.is_not(None),
-        Span.type.in_([Span.LABACCESS, Span.SPECIAL_LABACESS]),
-        Span.startdate <= today,
-        Span.enddate >= today,
-        Span.deleted_at.is_(None),
+        MembershipSummary.active_date == today,
+        or_(MembershipSummary.labaccess_active, MembershipSummary.special_labaccess_active),
     )
     
     return {
         m.phone: AccessyMember(
             phone=m.phone,
             name=f"{m.firstname} {m.lastname}",
-            groups={GROUPS[span.type] for span in m.spans},
+            groups={
+                GROUPS[span_type]
+                for span_type, active in ((Span.LABACCESS, s.labaccess_active),
+                                          (Span.SPECIAL_LABACESS, s.special_labaccess_active))
+                if active
+            },
             member_id=m.member_id,
             member_number=m.member_number,
         )
-        for m in query
+        for m, s in query
     }
 
 
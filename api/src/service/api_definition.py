@@ -171,6 +171,13 @@ def symbol_list(value):
     return [symbol(item) for item in value]
     
 
+def natural1_list(value):
+    """ A list of naturals excluding 0. """
+    if not isinstance(value, list):
+        raise ValueError(f"Value {value} should be a list.")
+    return [natural1(item) for item in value]
+    
+
 def iso_date(value):
     """ An iso formatted date. """
     return date.fromisoformat(value)
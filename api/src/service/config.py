@@ -35,6 +35,7 @@ default = Dict(name="default", src=dict(
     HOST_PUBLIC='',
     STRIPE_PRIVATE_KEY=None,
     STRIPE_SIGNING_SECRET=None,
+    MEMBERBOOTH_SNAPSHOT_SECRET=None,  # Key for signing offline memberbooth snapshots.
     APP_DEBUG=None,
     CORS_ALLOWED_ORIGINS='https://medlem.makerspace.se,https://stockholm.makeradmin.se,https://medlem.dev.makerspace.se'
                          ',http://localhost:8009,http://localhost:8011,http://localhost:8080',
@@ -1,7 +1,10 @@
+import json
+import os
 from functools import wraps
+from tempfile import gettempdir
 from typing import Union
 
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import scoped_session, Session, sessionmaker
 
 from service.logging import logger
@@ -56,15 +59,65 @@ def create_mysql_engine(host=None, port=None, db=None, user=None, pwd=None, time
 fields_by_index = {}
 
 
-def populate_fields_by_index(engine):
-    """ Populate the dict fields_by_index (used for error messages) by inspecting the database. """
+FIELDS_BY_INDEX_SNAPSHOT = os.path.join(gettempdir(), "makeradmin_fields_by_index.json")
+
+
+def get_schema_version(engine):
+    """ Return a key identifying the db schema, the database name and the id of the last applied migration. """
+    with engine.connect() as connection:
+        migration_id = connection.execute(text("SELECT MAX(id) FROM migrations")).scalar()
+    return f"{engine.url.database}:{migration_id}"
+
+
+def read_fields_by_index_snapshot(filename, schema_version):
+    try:
+        with open(filename) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if snapshot.get('schema_version') != schema_version:
+        return None
+    
+    return snapshot.get('fields_by_index')
+
+
+def write_fields_by_index_snapshot(filename, schema_version, fields):
+    tmp_filename = f"{filename}.{os.getpid()}"
+    try:
+        with open(tmp_filename, 'w') as f:
+            json.dump(dict(schema_version=schema_version, fields_by_index=fields), f)
+        os.replace(tmp_filename, filename)
+    except OSError as e:
+        logger.warning(f"failed to write fields by index snapshot to {filename}: {e}")
+
+
+def inspect_fields_by_index(engine):
+    fields = {}
     engine_inspect = inspect(engine)
     for table in engine_inspect.get_table_names():
         for index in engine_inspect.get_indexes(table):
             index_name = index['name']
             column_names = index['column_names']
-            fields_by_index[index_name] = ",".join(column_names)
-            fields_by_index[table + '.' + index_name] = ",".join(column_names)
+            fields[index_name] = ",".join(column_names)
+            fields[table + '.' + index_name] = ",".join(column_names)
+    return fields
+
+
+def populate_fields_by_index(engine, snapshot_filename=FIELDS_BY_INDEX_SNAPSHOT):
+    """ Populate the dict fields_by_index (used for error messages) by inspecting the database. Inspecting every table
+    is slow so the result is saved in a snapshot file keyed by schema version, it is reused by all processes until the
+    next migration. """
+    schema_version = get_schema_version(engine)
+    
+    fields = read_fields_by_index_snapshot(snapshot_filename, schema_version)
+    if fields is None:
+        logger.info(f"inspecting db indexes for schema version {schema_version}")
+        fields = inspect_fields_by_index(engine)
+        write_fields_by_index_snapshot(snapshot_filename, schema_version, fields)
+    
+    fields_by_index.clear()
+    fields_by_index.update(fields)
     
     
 def nested_atomic(f):
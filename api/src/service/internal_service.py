@@ -2,7 +2,7 @@ import re
 from functools import wraps, partial
 
 import pymysql
-from flask import Blueprint, g, jsonify
+from flask import Blueprint, g, jsonify, Response, stream_with_context
 from pymysql.constants.ER import DUP_ENTRY, BAD_NULL_ERROR
 from sqlalchemy.exc import IntegrityError
 
@@ -121,12 +121,44 @@ class InternalService(Blueprint):
     def raw_route(self, rule, **options):
         return super().route(rule, **options)
 
+    def stream_route(self, path, permission=None, method=GET, **route_kwargs):
+        """
+        Route for large responses that are streamed to the client while they are produced. Permission and args are
+        handled as for route, but the function should return a tuple of an iterable of str chunks and the mimetype.
+        
+        Nothing is committed, the function should only read from the db.
+        
+        :param path path from Blueprint.route
+        :param permission the permission required for the user to access this route
+        :param method the http method
+        :param route_kwargs all extra kwargs are forwarded to Blueprint.route
+        """
+        
+        assert permission is not None, "permission is required, use PUBLIC for no permission needed"
+        
+        def decorator(f):
+            params = Arg.get_args(f)
+            
+            @wraps(f)
+            def view_wrapper(*args, **kwargs):
+                if permission != PUBLIC and permission not in g.permissions:
+                    raise Forbidden(message=f"'{permission}' permission is required for this operation.")
+                
+                Arg.fill_args(params, kwargs)
+                
+                chunks, mimetype = f(*args, **kwargs)
+                
+                return Response(stream_with_context(chunks), mimetype=mimetype)
+            
+            return super(InternalService, self).route(path, methods=(method,), **route_kwargs)(view_wrapper)
+        return decorator
+
     def entity_routes(self, path=None, entity=None, permission_list=None, permission_create=None, permission_read=None,
                       permission_update=None, permission_delete=None):
         """
         Add routes to manipulate an entity (model). Routes will be added if there is a permission for it,
         list: GET <path>, create: POST <path>, update: PUT <path>/<id>, read: GET <path>/<id>, delete: DELETE
-        <path>/<id>.
+        <path>/<id>. Entities that can be reordered also get reorder: POST <path>/reorder, using the update permission.
         
         :param path path to use for entity
         :param entity object which supports the view methods needed
@@ -172,6 +204,15 @@ class InternalService(Blueprint):
                 method=PUT,
                 status='updated',
             )(entity.update)
+            
+            if hasattr(entity, 'reorder'):
+                self.route(
+                    f"{path}/reorder",
+                    endpoint=entity.name + "_reorder",
+                    permission=permission_update,
+                    method=POST,
+                    status='updated',
+                )(entity.reorder)
 
         if permission_delete:
             self.route(
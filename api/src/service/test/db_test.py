@@ -0,0 +1,54 @@
+import os
+from tempfile import TemporaryDirectory
+
+from sqlalchemy import create_engine, text
+
+from service.db import populate_fields_by_index, fields_by_index
+from test_aid.test_base import TestBase
+
+
+class Test(TestBase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:')
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE migrations (id INTEGER PRIMARY KEY, name VARCHAR(255))"))
+            connection.execute(text("INSERT INTO migrations VALUES (1, '0001_initial')"))
+            connection.execute(text("CREATE TABLE thing (id INTEGER PRIMARY KEY, a INTEGER, b INTEGER)"))
+            connection.execute(text("CREATE UNIQUE INDEX thing_a_b_index ON thing (a, b)"))
+
+        self.tmp_dir = TemporaryDirectory()
+        self.snapshot = os.path.join(self.tmp_dir.name, "snapshot.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        fields_by_index.clear()
+
+    def add_index_and_migration(self, migration_id=None):
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE INDEX thing_b_index ON thing (b)"))
+            if migration_id:
+                connection.execute(text(f"INSERT INTO migrations VALUES ({migration_id}, 'migration')"))
+
+    def test_populate_inspects_db_and_writes_snapshot(self):
+        populate_fields_by_index(self.engine, snapshot_filename=self.snapshot)
+
+        self.assertEqual("a,b", fields_by_index["thing_a_b_index"])
+        self.assertEqual("a,b", fields_by_index["thing.thing_a_b_index"])
+        self.assertTrue(os.path.exists(self.snapshot))
+
+    def test_snapshot_is_used_when_schema_version_is_unchanged(self):
+        populate_fields_by_index(self.engine, snapshot_filename=self.snapshot)
+        self.add_index_and_migration()
+
+        populate_fields_by_index(self.engine, snapshot_filename=self.snapshot)
+
+        self.assertNotIn("thing_b_index", fields_by_index)
+
+    def test_snapshot_is_replaced_after_migration(self):
+        populate_fields_by_index(self.engine, snapshot_filename=self.snapshot)
+        self.add_index_and_migration(migration_id=2)
+
+        populate_fields_by_index(self.engine, snapshot_filename=self.snapshot)
+
+        self.assertEqual("b", fields_by_index["thing_b_index"])
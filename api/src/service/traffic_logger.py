@@ -53,7 +53,10 @@ class TrafficLogger:
         }
 
         if method == "GET":
-            if len(session_response.data) > self.LOG_LIMIT:
+            # Reading data of a streamed response would load all of it into memory before it is sent.
+            if session_response.is_streamed:
+                data = "<skipping streamed content>"
+            elif len(session_response.data) > self.LOG_LIMIT:
                 data = "<content too large for logging>"
             # Webship images are unnecessary and large
             elif session_request.path.startswith("/webshop/image/"):
@@ -1,5 +1,7 @@
+import sys
 from contextlib import closing
 from datetime import datetime
+from importlib.util import find_spec, LazyLoader, module_from_spec
 from socket import socket, AF_INET, SOCK_STREAM
 from time import perf_counter, sleep
 
@@ -41,3 +43,19 @@ def dt_to_str(d):
     if d is None:
         return None
     return d.isoformat()
+
+
+def lazy_import(name):
+    """ Return module name without executing it, the module is executed on first attribute access. Use for heavy
+    modules that are only needed by a few code paths so they don't slow down startup. """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    
+    spec = find_spec(name)
+    loader = LazyLoader(spec.loader)
+    spec.loader = loader
+    module = module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,5 +1,3 @@
-import stripe
-
 from service.internal_service import InternalService
 from service.config import config
 
@@ -0,0 +1,143 @@
+import csv
+import json
+import zlib
+from datetime import timedelta, datetime, time
+from io import StringIO
+
+from service.db import db_session
+from shop.models import Transaction, TransactionContent, Product
+
+
+CSV = 'csv'
+TSV = 'tsv'
+NDJSON = 'ndjson'
+
+FORMATS = (CSV, TSV, NDJSON)
+
+MIMETYPES = {
+    CSV: 'text/csv',
+    TSV: 'text/tab-separated-values',
+    NDJSON: 'application/x-ndjson',
+}
+
+GZIP = 'gzip'
+
+COLUMNS = ('created_at', 'transaction_id', 'member_id', 'product_id', 'product_name', 'count', 'amount')
+
+# Columns of the export made with mysql by export_transactions.sh before, transactions are left joined with contents
+# and products and missing values are written as NULL like mysql does.
+LEGACY_COLUMNS = ('created_at', 'id', 'amount', 'name')
+
+LEGACY_NULL = 'NULL'
+
+# Rows fetched from the server side cursor at a time.
+BATCH_SIZE = 1000
+
+# Rows per yielded chunk, writing each row as a chunk would make the stream slow.
+ROWS_PER_CHUNK = 100
+
+
+def iter_completed_transaction_rows(start, end, batch_size=BATCH_SIZE, session=db_session):
+    """ Contents of completed transactions created between start and end (both dates inclusive) ordered by creation,
+    as tuples of COLUMNS. The range scan uses the status, created_at index and rows are streamed from a server side
+    cursor so memory use is constant. """
+    return (
+        session
+        .query(Transaction.created_at, Transaction.id, Transaction.member_id, TransactionContent.product_id,
+               Product.name, TransactionContent.count, TransactionContent.amount)
+        .join(TransactionContent, TransactionContent.transaction_id == Transaction.id)
+        .join(Product, Product.id == TransactionContent.product_id)
+        .filter(
+            Transaction.status == Transaction.COMPLETED,
+            Transaction.created_at >= datetime.combine(start, time()),
+            Transaction.created_at < datetime.combine(end + timedelta(days=1), time()),
+        )
+        .order_by(Transaction.created_at, Transaction.id, TransactionContent.id)
+        .yield_per(batch_size)
+    )
+
+
+def iter_legacy_transaction_rows(start, end, batch_size=BATCH_SIZE, session=db_session):
+    """ Completed transactions created between start and end (both dates inclusive) left joined with contents and
+    products ordered by creation, as tuples of LEGACY_COLUMNS. """
+    return (
+        session
+        .query(Transaction.created_at, Transaction.id, TransactionContent.amount, Product.name)
+        .outerjoin(TransactionContent, TransactionContent.transaction_id == Transaction.id)
+        .outerjoin(Product, Product.id == TransactionContent.product_id)
+        .filter(
+            Transaction.status == Transaction.COMPLETED,
+            Transaction.created_at >= datetime.combine(start, time()),
+            Transaction.created_at < datetime.combine(end + timedelta(days=1), time()),
+        )
+        .order_by(Transaction.created_at, Transaction.id, TransactionContent.id)
+        .yield_per(batch_size)
+    )
+
+
+def chunked(lines, rows_per_chunk=ROWS_PER_CHUNK):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= rows_per_chunk:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def delimited_lines(rows, delimiter, columns=COLUMNS, null=""):
+    buffer = StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(columns)
+    yield flush()
+
+    for row in rows:
+        writer.writerow([null if value is None else value for value in row])
+        yield flush()
+
+
+def ndjson_lines(rows, columns=COLUMNS):
+    for row in rows:
+        obj = dict(zip(columns, row))
+        obj['created_at'] = obj['created_at'].isoformat()
+        if obj['amount'] is not None:
+            obj['amount'] = str(obj['amount'])
+        yield json.dumps(obj) + "\n"
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def accounting_export(start, end, format=CSV, compress=None, legacy=False):
+    """ Export of completed transaction contents for bookkeeping, returns iterable of chunks and mimetype. Chunks are
+    str, or bytes if compressed with gzip. With legacy the rows and columns of the old mysql export are used. """
+    if legacy:
+        rows, columns, null = iter_legacy_transaction_rows(start, end), LEGACY_COLUMNS, LEGACY_NULL
+    else:
+        rows, columns, null = iter_completed_transaction_rows(start, end), COLUMNS, ""
+
+    if format == NDJSON:
+        lines = ndjson_lines(rows, columns)
+    else:
+        lines = delimited_lines(rows, "\t" if format == TSV else ",", columns, null)
+
+    chunks = chunked(lines)
+
+    if compress == GZIP:
+        return gzipped(chunks), 'application/gzip'
+
+    return chunks, MIMETYPES[format]
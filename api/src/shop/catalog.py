@@ -0,0 +1,86 @@
+import hashlib
+from threading import RLock
+
+from flask import current_app, request, make_response
+
+from service.db import db_session
+from service.error import NotFound
+from shop.catalog_version import get_catalog_version
+from shop.models import Product
+from shop.shop_data import all_product_data, get_membership_products, image_hashes, public_product_obj
+
+
+# The version is checked on every request, so clients can cache for a short while and then revalidate.
+CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=86400"
+
+
+def json_bytes(data):
+    """ Same serialization as the data of InternalService.route. """
+    return current_app.json.dumps({'status': 'ok', 'data': data}).encode()
+
+
+class CatalogSnapshot:
+    """ Catalog for one version, serialized once. Product pages are serialized when first requested. """
+
+    def __init__(self, version, session=db_session):
+        self.version = version
+        self.product_data = all_product_data()
+        self.membership_products = get_membership_products()
+        hashes = image_hashes()
+        self.products = {
+            p.id: public_product_obj(p, hashes)
+            for p in session.query(Product).filter(Product.deleted_at.is_(None))
+        }
+        self.responses = {}
+
+    def response(self, key):
+        """ Json bytes and etag for key, which is 'product_data', 'register_page_data' or a product id. """
+        cached = self.responses.get(key)
+        if cached is not None:
+            return cached
+
+        if key == 'product_data':
+            data = self.product_data
+        elif key == 'register_page_data':
+            data = {"membershipProducts": self.membership_products, "productData": self.product_data}
+        else:
+            product = self.products.get(key)
+            if product is None:
+                raise NotFound()
+            data = {"product": product, "productData": self.product_data}
+
+        body = json_bytes(data)
+        cached = self.responses[key] = body, f"{self.version}-{hashlib.sha1(body).hexdigest()}"
+        return cached
+
+
+class CatalogCache:
+    """ Per process snapshot of the public catalog, rebuilt when the catalog version in the db changes. """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.snapshot = None
+
+    def get(self, session=db_session):
+        version = get_catalog_version(session)
+        with self.lock:
+            if self.snapshot is None or self.snapshot.version != version:
+                self.snapshot = CatalogSnapshot(version, session)
+            return self.snapshot
+
+    def response(self, key):
+        snapshot = self.get()
+        with self.lock:
+            body, etag = snapshot.response(key)
+
+        if etag in request.if_none_match:
+            response = make_response("", 304)
+        else:
+            response = make_response(body)
+            response.headers.set("Content-Type", "application/json")
+        response.set_etag(etag)
+        response.headers.set("Cache-Control", CACHE_CONTROL)
+        return response
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,38 @@
+from itertools import chain
+
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+
+from service.db import db_session
+from shop.models import Product, ProductCategory, ProductAction, ProductImage, CatalogVersion
+
+
+# Models that are part of the public catalog, any write to them bumps the catalog version.
+CATALOG_MODELS = (Product, ProductCategory, ProductAction, ProductImage)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_catalog_changes(session, flush_context):
+    if any(isinstance(obj, CATALOG_MODELS) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info['catalog_changed'] = True
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def bump_catalog_version_after_flush(session, flush_context):
+    if not session.info.pop('catalog_changed', False):
+        return
+
+    bump_catalog_version(session)
+
+
+def bump_catalog_version(session=db_session):
+    """ Invalidate cached catalogs, needed after bulk updates of catalog models that are not seen by the flush
+    listeners. """
+    result = session.execute(text("UPDATE webshop_catalog_version SET version = version + 1 WHERE id = 1"))
+    if not result.rowcount:
+        session.execute(text("INSERT INTO webshop_catalog_version (id, version) VALUES (1, 1)"))
+
+
+def get_catalog_version(session=db_session):
+    version, = session.query(func.coalesce(func.max(CatalogVersion.version), 0)).one()
+    return version
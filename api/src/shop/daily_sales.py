@@ -0,0 +1,66 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func, select, insert
+from sqlalchemy.dialects import mysql, sqlite
+
+from service.db import db_session
+from shop.models import DailySales, Transaction, TransactionContent
+
+
+COLUMNS = ('date', 'product_id', 'count', 'amount')
+
+
+def upsert_daily_sales(rows, session=db_session):
+    """ Add count and amount of rows to the rollup, rows that does not exist are created. """
+    if not rows:
+        return
+
+    if session.get_bind().dialect.name == 'mysql':
+        stmt = mysql.insert(DailySales).values(rows)
+        stmt = stmt.on_duplicate_key_update(count=DailySales.count + stmt.inserted.count,
+                                            amount=DailySales.amount + stmt.inserted.amount)
+    else:
+        stmt = sqlite.insert(DailySales).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=['date', 'product_id'],
+                                          set_=dict(count=DailySales.count + stmt.excluded.count,
+                                                    amount=DailySales.amount + stmt.excluded.amount))
+    session.execute(stmt)
+
+
+def add_transaction_sales(transaction, session=db_session):
+    """ Add the contents of a transaction that was just completed to the rollup. """
+    rows = (
+        session
+        .query(TransactionContent.product_id, func.sum(TransactionContent.count), func.sum(TransactionContent.amount))
+        .filter(TransactionContent.transaction_id == transaction.id)
+        .group_by(TransactionContent.product_id)
+    )
+    day = transaction.created_at.date()
+    upsert_daily_sales([dict(zip(COLUMNS, (day, *row))) for row in rows], session)
+
+
+def backfill_daily_sales(start=None, end=None, session=db_session):
+    """ Rebuild the rollup from completed transactions between start and end (both inclusive, None for no limit),
+    returns number of rollup rows. """
+    conditions = []
+    if start:
+        conditions.append(DailySales.date >= start)
+    if end:
+        conditions.append(DailySales.date <= end)
+    session.query(DailySales).filter(*conditions).delete(synchronize_session=False)
+
+    day = func.date(Transaction.created_at)
+    query = (
+        select(day, TransactionContent.product_id, func.sum(TransactionContent.count),
+               func.sum(TransactionContent.amount))
+        .select_from(Transaction)
+        .join(TransactionContent, TransactionContent.transaction_id == Transaction.id)
+        .where(Transaction.status == Transaction.COMPLETED)
+        .group_by(day, TransactionContent.product_id)
+    )
+    if start:
+        query = query.where(Transaction.created_at >= datetime.combine(start, time()))
+    if end:
+        query = query.where(Transaction.created_at < datetime.combine(end + timedelta(days=1), time()))
+
+    return session.execute(insert(DailySales).from_select(COLUMNS, query)).rowcount
@@ -5,24 +5,30 @@ from service.db import db_session
 from service.util import date_to_str
 
 
-def send_membership_updated_email(member_id, extended_days, end_date):
+def send_days_added_email(member_id, labaccess_days, labaccess_end, membership_days, membership_end):
+    """ One email for all shipped days of a member, days are None if nothing of that type was shipped. """
     member = db_session.query(Member).get(member_id)
 
-    send_message(
-        MessageTemplate.ADD_MEMBERSHIP_TIME, member,
-        extended_days=extended_days,
-        end_date=date_to_str(end_date)
-    )
-
-
-def send_labaccess_extended_email(member_id, extended_days, end_date):
-    member = db_session.query(Member).get(member_id)
-
-    send_message(
-        MessageTemplate.ADD_LABACCESS_TIME, member,
-        extended_days=extended_days,
-        end_date=date_to_str(end_date)
-    )
+    if labaccess_days is not None and membership_days is not None:
+        send_message(
+            MessageTemplate.ADD_MEMBERSHIP_AND_LABACCESS_TIME, member,
+            labaccess_days=labaccess_days,
+            labaccess_end=date_to_str(labaccess_end),
+            membership_days=membership_days,
+            membership_end=date_to_str(membership_end),
+        )
+    elif labaccess_days is not None:
+        send_message(
+            MessageTemplate.ADD_LABACCESS_TIME, member,
+            extended_days=labaccess_days,
+            end_date=date_to_str(labaccess_end)
+        )
+    else:
+        send_message(
+            MessageTemplate.ADD_MEMBERSHIP_TIME, member,
+            extended_days=membership_days,
+            end_date=date_to_str(membership_end)
+        )
 
 
 def send_receipt_email(transaction):
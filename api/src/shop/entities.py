@@ -22,6 +22,7 @@ product_action_entity = Entity(ProductAction)
 product_image_entity = ProductImageEntity(
     ProductImage,
     search_columns=("name",),
+    read_only_columns=("hash",),
 )
 
 
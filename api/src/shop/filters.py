@@ -1,11 +1,23 @@
 from datetime import timedelta, date
+from functools import cached_property
 
 from membership.membership import get_membership_summary
 from service.error import BadRequest
 
 
-def filter_start_package(cart_item, member_id):
-    end_date = get_membership_summary(member_id).labaccess_end
+class FilterData:
+    """ Member data used by product filters, fetched at most once per cart however many items use it. """
+    
+    def __init__(self, member_id):
+        self.member_id = member_id
+    
+    @cached_property
+    def membership(self):
+        return get_membership_summary(self.member_id)
+
+
+def filter_start_package(cart_item, data):
+    end_date = data.membership.labaccess_end
     
     if not end_date:
         return
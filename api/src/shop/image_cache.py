@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from datetime import datetime
+from threading import RLock
+
+from flask import request, make_response
+
+from service.db import db_session
+from shop.image_derivatives import content_hash, pick_width, BASE_WIDTH, PNG, WEBP
+from shop.models import ProductImage, ProductImageDerivative
+
+
+DEFAULT_IMAGE_PATH = "/work/default-product-image.png"
+
+# Total size of blobs kept in memory per process.
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Urls with the right content hash (?v=) never change, others are revalidated after a while.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CACHE_CONTROL = "public, max-age=300"
+
+
+class CachedImage:
+
+    def __init__(self, data, type, hash, modified):
+        self.data = data
+        self.type = type
+        self.hash = hash
+        self.modified = modified
+
+
+def requested_variant():
+    """ Width and type to serve, width from the w param and webp if the client accepts it. """
+    try:
+        width = pick_width(int(request.args.get('w', 0)))
+    except ValueError:
+        width = BASE_WIDTH
+    type = WEBP if request.accept_mimetypes[WEBP] else PNG
+    return width, type
+
+
+class ImageCache:
+    """ Per process LRU cache of image blobs keyed by image id, hash of the stored image and variant, a hit for a
+    versioned url is served without touching the db. """
+
+    def __init__(self, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.lock = RLock()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.images = OrderedDict()
+        self.default = None
+
+    def get(self, key):
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        with self.lock:
+            if key in self.images or len(image.data) > self.max_bytes:
+                return
+            self.images[key] = image
+            self.size += len(image.data)
+            while self.size > self.max_bytes:
+                _, evicted = self.images.popitem(last=False)
+                self.size -= len(evicted.data)
+
+    def default_image(self):
+        if self.default is None:
+            with open(DEFAULT_IMAGE_PATH, 'rb') as f:
+                data = f.read()
+            self.default = CachedImage(data, 'image/png', content_hash(data), datetime.utcnow())
+        return self.default
+
+    def load(self, image_id, variant, session=db_session):
+        """ Current version of image, the blob is only read from the db when not cached. Images uploaded before
+        derivatives existed are served as stored. Returns hash of the stored image and the image. """
+        row = (
+            session
+            .query(ProductImage.hash, ProductImage.type, ProductImage.created_at, ProductImage.updated_at)
+            .filter(ProductImage.id == image_id, ProductImage.deleted_at.is_(None))
+            .one_or_none()
+        )
+        if row is None:
+            return None, None
+
+        hash, type, created_at, updated_at = row
+        image = hash and self.get((image_id, hash, variant))
+        if image:
+            return hash, image
+
+        width, derivative_type = variant
+        derivative = (
+            session
+            .query(ProductImageDerivative.data, ProductImageDerivative.type)
+            .filter_by(image_id=image_id, width=width, type=derivative_type)
+            .one_or_none()
+        )
+        if derivative:
+            data, type = derivative
+        else:
+            data, = session.query(ProductImage.data).filter(ProductImage.id == image_id).one()
+            if data is None:
+                return None, None
+
+        hash = hash or content_hash(data)
+        image = CachedImage(data, type, content_hash(data), updated_at or created_at)
+        self.put((image_id, hash, variant), image)
+        return hash, image
+
+    def response(self, image_id):
+        version = request.args.get('v')
+        variant = requested_variant()
+        hash, image = version, self.get((image_id, version, variant)) if version else None
+        if image is None:
+            hash, image = self.load(image_id, variant)
+        if image is None:
+            hash, image = None, self.default_image()
+
+        response = make_response(image.data)
+        response.headers.set("Content-Type", image.type)
+        response.headers.set("Vary", "Accept")
+        response.headers.set("Cache-Control", IMMUTABLE_CACHE_CONTROL if version and version == hash else CACHE_CONTROL)
+        response.set_etag(image.hash)
+        response.last_modified = image.modified
+        return response.make_conditional(request)
+
+
+image_cache = ImageCache()
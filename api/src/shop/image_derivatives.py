@@ -0,0 +1,59 @@
+import hashlib
+from io import BytesIO
+from threading import BoundedSemaphore
+
+
+# Width of the stored image, derivatives are made for all widths and formats except the stored width as png.
+BASE_WIDTH = 500
+WIDTHS = (120, 250, BASE_WIDTH)
+
+PNG = "image/png"
+WEBP = "image/webp"
+TYPES = (WEBP, PNG)
+
+FORMAT_BY_TYPE = {PNG: "png", WEBP: "webp"}
+
+SAVE_OPTIONS = {
+    PNG: dict(compress_level=8),
+    WEBP: dict(quality=85, method=4),
+}
+
+# Encoding is cpu bound and done in the request thread, uploads encoding at the same time in a process wait for each
+# other so uploads can not use more than one cpu per worker process.
+ENCODE_CONCURRENCY = 1
+
+encode_semaphore = BoundedSemaphore(ENCODE_CONCURRENCY)
+
+
+def render(data, width, type):
+    """ Scale image data down to at most width wide and encode it as type. """
+    from PIL import Image
+
+    image = Image.open(BytesIO(data))
+    image.thumbnail((width, 1_000_000), Image.LANCZOS)
+    if type == WEBP and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    out = BytesIO()
+    image.save(out, format=FORMAT_BY_TYPE[type], **SAVE_OPTIONS[type])
+    return out.getvalue()
+
+
+def content_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def derivative_sizes():
+    return [(width, type) for width in WIDTHS for type in TYPES if (width, type) != (BASE_WIDTH, PNG)]
+
+
+def generate_derivatives(data):
+    """ Returns list of (width, type, data) for all derivatives of the base image data. """
+    with encode_semaphore:
+        return [(width, type, render(data, width, type)) for width, type in derivative_sizes()]
+
+
+def pick_width(requested):
+    """ Smallest width that is at least the requested width, base width if none requested. """
+    if not requested:
+        return BASE_WIDTH
+    return next((width for width in WIDTHS if width >= requested), WIDTHS[-1])
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, Text, Numeric, ForeignKey, Enum, Boolean, LargeBinary
+from sqlalchemy import Column, Integer, String, DateTime, func, Text, Numeric, ForeignKey, Enum, Boolean, LargeBinary, \
+    Date, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, configure_mappers
 
@@ -12,7 +13,7 @@ class ProductCategory(Base):
     
     id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
     name = Column(String(255), nullable=False)
-    display_order = Column(Integer, nullable=False, unique=True)
+    display_order = Column(Integer, nullable=False, index=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now())
     deleted_at = Column(DateTime)
@@ -28,14 +29,32 @@ class ProductImage(Base):
     name = Column(String(255), nullable=False)
     type = Column(String(64), nullable=False)
     data = Column(LargeBinary)
+    hash = Column(String(40))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now())
     deleted_at = Column(DateTime)
     
+    derivatives = relationship("ProductImageDerivative", cascade="all, delete-orphan")
+
     def __repr__(self):
         return f'ProductImage(id={self.id}, path={self.path})'
 
 
+class ProductImageDerivative(Base):
+    __tablename__ = 'webshop_product_image_derivatives'
+    __table_args__ = (UniqueConstraint('image_id', 'width', 'type', name='image_width_type_index'),)
+
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
+    image_id = Column(Integer, ForeignKey(ProductImage.id), nullable=False)
+    width = Column(Integer, nullable=False)
+    type = Column(String(64), nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    hash = Column(String(40), nullable=False)
+
+    def __repr__(self):
+        return f'ProductImageDerivative(id={self.id}, image_id={self.image_id}, width={self.width}, type={self.type})'
+
+
 class Product(Base):
     __tablename__ = 'webshop_products'
     
@@ -47,7 +66,7 @@ class Product(Base):
     price = Column(Numeric(precision="15,3"), nullable=False)
     smallest_multiple = Column(Integer, nullable=False, server_default='1')
     filter = Column(String(255))
-    display_order = Column(Integer, nullable=False, unique=True)
+    display_order = Column(Integer, nullable=False, index=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now())
     deleted_at = Column(DateTime)
@@ -119,6 +138,18 @@ class TransactionContent(Base):
         return f'TransactionContent(id={self.id}, count={self.count}, amount={self.amount})'
 
 
+class DailySales(Base):
+    __tablename__ = 'webshop_daily_sales'
+
+    date = Column(Date, primary_key=True, nullable=False)
+    product_id = Column(Integer, ForeignKey(Product.id), primary_key=True, nullable=False)
+    count = Column(Integer, nullable=False)
+    amount = Column(Numeric(precision="15,2"), nullable=False)
+
+    def __repr__(self):
+        return f'DailySales(date={self.date}, product_id={self.product_id}, count={self.count}, amount={self.amount})'
+
+
 class TransactionAction(Base):
     __tablename__ = 'webshop_transaction_actions'
 
@@ -151,6 +182,49 @@ class PendingRegistration(Base):
         return f'PendingRegistration(id={self.id})'
 
 
+class StripeWebhookEvent(Base):
+    __tablename__ = 'webshop_stripe_webhook_events'
+    
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+    
+    id = Column(String(255), primary_key=True, nullable=False)
+    type = Column(String(255), nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(Enum(PENDING, PROCESSING, PROCESSED, FAILED), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    received_at = Column(DateTime, nullable=False)
+    claimed_at = Column(DateTime)
+    processed_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f'StripeWebhookEvent(id={self.id}, type={self.type}, status={self.status})'
+
+
+class StripeReplayCheckpoint(Base):
+    __tablename__ = 'webshop_stripe_replay_checkpoints'
+
+    name = Column(String(255), primary_key=True, nullable=False)
+    event_id = Column(String(255), nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'StripeReplayCheckpoint(name={self.name}, event_id={self.event_id})'
+
+
+class CatalogVersion(Base):
+    __tablename__ = 'webshop_catalog_version'
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    version = Column(Integer, nullable=False, server_default='0')
+
+    def __repr__(self):
+        return f'CatalogVersion(id={self.id}, version={self.version})'
+
+
 class StripePending(Base):
     __tablename__ = 'webshop_stripe_pending'
 
@@ -1,35 +1,61 @@
 from flask import request
-from sqlalchemy import func
+from sqlalchemy import func, case
 
+from service.api_definition import Arg, natural1_list, BAD_VALUE
 from service.db import db_session
 from service.entity import Entity
-from service.error import InternalServerError
+from service.error import UnprocessableEntity
+from shop.catalog_version import bump_catalog_version
+
+
+# Gap between display orders of new and reordered entities, leaves room to move an entity between two others by
+# updating only that entity.
+ORDER_GAP = 1024
 
 
 class OrderedEntity(Entity):
     """
     Special handling of entity with display_order field:
-    
-    * display_order should be auto increment but mysql only supports one auto increment per table,
-    can solve it with a trigger or like this using an explicit mysql lock.
+
+    * display_order is not unique, new entities are placed last with a gap to the entity before, no lock is needed
+    and entities can be moved between others with a single update. Entities created at the same time may get the same
+    display_order, they are ordered by id.
+    * The positions of the reordered entities are rewritten in a single statement by reorder.
     """
-    
+
     def create(self, data=None, commit=True):
         if data is None:
             data = request.json or {}
-        
-        status, = db_session.execute("SELECT GET_LOCK('display_order', 20)").fetchone()
-        if not status:
-            raise InternalServerError("Failed to create, try again later.",
-                                      log="failed to aquire display_order lock")
-        try:
-            if data.get('display_order') is None:
-                data['display_order'] = (db_session.query(func.max(self.model.display_order)).scalar() or 0) + 1
-            obj = self.to_obj(self._create_internal(data, commit=commit))
-            return obj
-        except Exception:
-            # Rollback session if anything went wrong or we can't release the lock.
-            db_session.rollback()
-            raise
-        finally:
-            db_session.execute("DO RELEASE_LOCK('display_order')")
+
+        if data.get('display_order') is None:
+            data['display_order'] = (db_session.query(func.max(self.model.display_order)).scalar() or 0) + ORDER_GAP
+        return self.to_obj(self._create_internal(data, commit=commit))
+
+    def reorder(self, ids=Arg(natural1_list)):
+        """ Place the entities in ids in that order, in the positions they currently have, so entities not in ids (like
+        products in other categories) keep their display_order and their place among the reordered entities. """
+        if len(set(ids)) != len(ids):
+            raise UnprocessableEntity("Ids must be unique.", fields='ids', what=BAD_VALUE)
+
+        if not ids:
+            return
+
+        slots = sorted(
+            display_order for display_order, in
+            db_session.query(self.model.display_order).filter(self.pk.in_(ids))
+        )
+        if len(slots) != len(ids):
+            raise UnprocessableEntity("Ids not found.", fields='ids', what=BAD_VALUE)
+
+        # Entities created at the same time can share display_order, make the positions increasing.
+        for i in range(1, len(slots)):
+            slots[i] = max(slots[i], slots[i - 1] + 1)
+
+        positions = dict(zip(ids, slots))
+        (
+            db_session
+            .query(self.model)
+            .filter(self.pk.in_(ids))
+            .update({self.model.display_order: case(positions, value=self.pk)}, synchronize_session=False)
+        )
+        bump_catalog_version()
@@ -1,14 +1,17 @@
 from io import BytesIO
 
-from PIL import Image, UnidentifiedImageError
-
+from service.db import db_session
 from service.entity import Entity, logger
 from service.error import BadRequest
+from shop.image_derivatives import BASE_WIDTH, PNG, content_hash, generate_derivatives
+from shop.models import ProductImageDerivative
 
 
 class ProductImageEntity(Entity):
-    
+
     def to_model(self, obj):
+        from PIL import Image, UnidentifiedImageError
+
         model = super().to_model(obj)
 
         if "data" in model and "type" in model:
@@ -16,12 +19,27 @@ class ProductImageEntity(Entity):
                 image = Image.open(BytesIO(model["data"]))
             except UnidentifiedImageError:
                 raise BadRequest("unsupported or invalid file format")
-            image.thumbnail((500, 1_000_000), Image.ANTIALIAS)
+            image.thumbnail((BASE_WIDTH, 1_000_000), Image.LANCZOS)
             bytes = BytesIO()
             image.save(bytes, format="png", compress_level=8)
             model["data"] = bytes.getvalue()
-            model["type"] = "image/png"
+            model["type"] = PNG
             if len(model["data"]) > 1_000_000:
                 raise BadRequest("image too large")
-            
+            model["hash"] = content_hash(model["data"])
+            model["derivatives"] = [
+                ProductImageDerivative(width=width, type=type, data=data, hash=content_hash(data))
+                for width, type, data in generate_derivatives(model["data"])
+            ]
+
         return model
+
+    def _update_internal(self, entity_id, data, commit=True):
+        # New derivatives have the same width and type as the old ones, the old ones must be deleted first as
+        # they would be deleted after the new ones are inserted when the collection is replaced.
+        if data and "data" in data and "type" in data:
+            image = db_session.query(self.model).get(entity_id)
+            if image:
+                image.derivatives = []
+                db_session.flush()
+        return super()._update_internal(entity_id, data, commit=commit)
@@ -1,7 +1,9 @@
+from collections import defaultdict
 from logging import getLogger
 
+from pytz import UTC
 from sqlalchemy import desc
-from sqlalchemy.orm import joinedload, contains_eager
+from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm.exc import NoResultFound
 
 from membership.views import member_entity
@@ -9,7 +11,7 @@ from service.db import db_session
 from service.error import NotFound
 from shop.entities import transaction_entity, transaction_content_entity, product_entity, category_entity, \
     product_image_entity
-from shop.models import Transaction, Product, ProductCategory, ProductAction
+from shop.models import Transaction, Product, ProductCategory, ProductAction, ProductImage, TransactionContent
 from shop.transactions import pending_actions_query
 
 logger = getLogger('makeradmin')
@@ -37,22 +39,60 @@ def pending_actions(member_id=None):
     ]
 
 
-def member_history(member_id):
+HISTORY_PAGE_SIZE = 20
+
+
+def member_history(member_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """ Page of transactions of member, newest first, starting before transaction id before (the cursor). Line items
+    only refers to products, name and unit of each product is included once per page. """
+    
     query = (
         db_session
-        .query(Transaction)
-        .options(joinedload('contents'), joinedload('contents.product'))
+        .query(Transaction.id, Transaction.created_at, Transaction.status, Transaction.amount)
         .filter(Transaction.member_id == member_id)
         .order_by(desc(Transaction.id))
     )
+    if before is not None:
+        query = query.filter(Transaction.id < before)
     
-    return [{
-        **transaction_entity.to_obj(transaction),
-        'contents': [{
-            **transaction_content_entity.to_obj(content),
-            'product': product_entity.to_obj(content.product),
-        } for content in transaction.contents]
-    } for transaction in query.all()]
+    transactions = query.limit(limit + 1).all()
+    next_before = transactions[limit - 1].id if len(transactions) > limit else None
+    transactions = transactions[:limit]
+    
+    contents_by_transaction = defaultdict(list)
+    product_ids = set()
+    if transactions:
+        for transaction_id, product_id, count, amount in (
+            db_session
+            .query(TransactionContent.transaction_id, TransactionContent.product_id, TransactionContent.count,
+                   TransactionContent.amount)
+            .filter(TransactionContent.transaction_id.in_([t.id for t in transactions]))
+            .order_by(TransactionContent.id)
+        ):
+            contents_by_transaction[transaction_id].append(
+                {'product_id': product_id, 'count': count, 'amount': str(amount)}
+            )
+            product_ids.add(product_id)
+    
+    products = {}
+    if product_ids:
+        products = {
+            id: {'id': id, 'name': name, 'unit': unit}
+            for id, name, unit in
+            db_session.query(Product.id, Product.name, Product.unit).filter(Product.id.in_(product_ids))
+        }
+    
+    return {
+        'transactions': [{
+            'id': t.id,
+            'created_at': t.created_at.replace(tzinfo=UTC).isoformat(),
+            'status': t.status,
+            'amount': str(t.amount),
+            'contents': contents_by_transaction[t.id],
+        } for t in transactions],
+        'products': products,
+        'next_before': next_before,
+    }
 
 
 def receipt(member_id, transaction_id):
@@ -69,9 +109,20 @@ def receipt(member_id, transaction_id):
     }
 
 
+def image_hashes():
+    """ Content hash of all images, clients use it to version image urls. """
+    return dict(db_session.query(ProductImage.id, ProductImage.hash).filter(ProductImage.deleted_at.is_(None)))
+
+
+def public_product_obj(product, hashes):
+    return {**product_entity.to_obj(product), 'image_hash': hashes.get(product.image_id)}
+
+
 def all_product_data():
     """ Return all public products and categories. """
     
+    hashes = image_hashes()
+    
     query = (
         db_session
         .query(ProductCategory)
@@ -79,12 +130,13 @@ def all_product_data():
         .options(contains_eager(ProductCategory.products))
         .filter(Product.deleted_at.is_(None))
         .filter(Product.show)
-        .order_by(ProductCategory.display_order)
+        .order_by(ProductCategory.display_order, ProductCategory.id)
     )
 
     return [{
         **category_entity.to_obj(category),
-        'items': [product_entity.to_obj(product) for product in sorted(category.products, key=lambda p: p.display_order)]
+        'items': [public_product_obj(product, hashes)
+                  for product in sorted(category.products, key=lambda p: (p.display_order, p.id))]
     } for category in query]
     
 
@@ -95,7 +147,7 @@ def get_product_data(product_id):
         raise NotFound()
     
     return {
-        "product": product_entity.to_obj(product),
+        "product": public_product_obj(product, image_hashes()),
         "productData": all_product_data(),
     }
 
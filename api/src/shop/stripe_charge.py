@@ -1,11 +1,8 @@
 from logging import getLogger
 
-import stripe
-from stripe.error import InvalidRequestError, CardError, StripeError
-
 from service.error import InternalServerError, EXCEPTION
 from shop.models import Transaction
-from shop.stripe_constants import CURRENCY, ChargeStatus
+from shop.stripe_constants import CURRENCY, ChargeStatus, stripe
 from shop.stripe_util import convert_to_stripe_amount
 from shop.transactions import PaymentFailed, payment_success
 
@@ -20,7 +17,7 @@ def raise_from_stripe_invalid_request_error(e):
         raise PaymentFailed(log=f"stripe charge failed: {str(e)}", level=EXCEPTION)
 
 
-def create_stripe_charge(transaction, card_source_id) -> stripe.Charge:
+def create_stripe_charge(transaction, card_source_id) -> "stripe.Charge":
 
     if transaction.status != Transaction.PENDING:
         raise InternalServerError(f"unexpected status of transaction",
@@ -35,14 +32,14 @@ def create_stripe_charge(transaction, card_source_id) -> stripe.Charge:
             description=f'charge for transaction id {transaction.id}',
             source=card_source_id,
         )
-    except InvalidRequestError as e:
+    except stripe.error.InvalidRequestError as e:
         raise_from_stripe_invalid_request_error(e)
         
-    except CardError as e:
+    except stripe.error.CardError as e:
         error = e.json_body.get('error', {})
         raise PaymentFailed(message=error.get("message"), log=f"stripe charge failed: {str(error)}")
         
-    except StripeError as e:
+    except stripe.error.StripeError as e:
         raise InternalServerError(log=f"stripe charge failed (possibly temporarily): {str(e)}")
 
 
@@ -1,6 +1,8 @@
-import stripe
-
 from service.config import config
+from service.util import lazy_import
+
+# Imported lazily, the stripe package is heavy and only used when handling payments.
+stripe = lazy_import("stripe")
 
 stripe.api_key = config.get("STRIPE_PRIVATE_KEY", log_value=False)
 
@@ -1,12 +1,16 @@
+import json
+from datetime import datetime, timedelta
 from logging import getLogger
+from queue import Queue
+from threading import Lock, Thread
 
-import stripe
-from stripe.error import SignatureVerificationError
+from sqlalchemy import insert, or_, and_
 
+from service.db import db_session
 from service.error import BadRequest, InternalServerError
-from shop.models import Transaction
+from shop.models import Transaction, StripeWebhookEvent, StripeReplayCheckpoint
 from shop.stripe_charge import charge_transaction, create_stripe_charge
-from shop.stripe_constants import STRIPE_SIGNING_SECRET, Type, Subtype, SourceType
+from shop.stripe_constants import STRIPE_SIGNING_SECRET, Type, Subtype, SourceType, stripe
 from shop.transactions import get_source_transaction, commit_fail_transaction, PaymentFailed
 
 logger = getLogger('makeradmin')
@@ -112,22 +116,110 @@ def stripe_event(event):
 
 
 def stripe_callback(data, headers):
-    """ Handle stripe event callback. In case of non 200 response stripe will send the same event again (retrying a
-    few times), so the code is written to handle that. For example an error that can be assumed to be intermittent
-    like a communication error with stripe will not fail or succeed a transaction but just leave it as is. """
+    """ Handle stripe event callback. The event is verified and recorded in the webhook event ledger, it is processed
+    later by the stripe event worker. Stripe retries events until it gets a 200 response, a retry of an already
+    recorded event is acknowledged without recording it again. """
     try:
         signature = headers['Stripe-Signature']
         event = stripe.Webhook.construct_event(data, signature, STRIPE_SIGNING_SECRET)
-    except (KeyError, SignatureVerificationError) as e:
+    except (KeyError, stripe.error.SignatureVerificationError) as e:
         raise BadRequest(log=f"failed to process stripe callback: {str(e)}")
 
-    stripe_event(event)
+    payload = data.decode() if isinstance(data, bytes) else data
+    if record_stripe_event(event.id, event.type, payload):
+        logger.info(f"recorded stripe event {event.id} of type {event.type}")
+    else:
+        logger.info(f"stripe event {event.id} already recorded, ignoring")
+
+
+# Events that failed are retried after this delay, and given up on after this many attempts.
+RETRY_DELAY = timedelta(minutes=1)
+MAX_ATTEMPTS = 5
+
+# An event claimed by a worker that did not finish it in this time is assumed to be abandoned.
+STALE_CLAIM = timedelta(minutes=10)
+
+
+def record_stripe_event(event_id, event_type, payload, session=db_session):
+    """ Record event in the ledger, returns False if it was already recorded. """
+    result = session.execute(
+        insert(StripeWebhookEvent)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+        .values(id=event_id, type=event_type, payload=payload, status=StripeWebhookEvent.PENDING, attempts=0,
+                received_at=datetime.utcnow())
+    )
+    return bool(result.rowcount)
+
+
+def claim_stripe_event(session=db_session):
+    """ Claim the oldest event that is due for processing, concurrent workers skip events claimed by others. The
+    claim is committed, so the event processing can commit as it normally does. Returns None if there is nothing
+    to do. """
+    now = datetime.utcnow()
+    event = (
+        session
+        .query(StripeWebhookEvent)
+        .filter(or_(
+            and_(StripeWebhookEvent.status == StripeWebhookEvent.PENDING,
+                 or_(StripeWebhookEvent.claimed_at.is_(None), StripeWebhookEvent.claimed_at < now - RETRY_DELAY)),
+            and_(StripeWebhookEvent.status == StripeWebhookEvent.PROCESSING,
+                 StripeWebhookEvent.claimed_at < now - STALE_CLAIM),
+        ))
+        .order_by(StripeWebhookEvent.received_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if event:
+        event.status = StripeWebhookEvent.PROCESSING
+        event.claimed_at = now
+        event.attempts += 1
+    session.commit()
+    return event
+
+
+def process_recorded_stripe_event(event, session=db_session):
+    try:
+        stripe_event(stripe.Event.construct_from(json.loads(event.payload), stripe.api_key))
+    except Exception as e:
+        session.rollback()
+        logger.exception(f"failed to process stripe event {event.id}, attempt {event.attempts}: {e}")
+        event.status = StripeWebhookEvent.FAILED if event.attempts >= MAX_ATTEMPTS else StripeWebhookEvent.PENDING
+        event.error = str(e)
+    else:
+        event.status = StripeWebhookEvent.PROCESSED
+        event.processed_at = datetime.utcnow()
+        event.error = None
+    session.commit()
+
+
+def process_recorded_stripe_events(limit=100, session=db_session):
+    """ Process up to limit recorded events that are due, returns number of processed events. """
+    count = 0
+    while count < limit:
+        event = claim_stripe_event(session)
+        if event is None:
+            break
+        process_recorded_stripe_event(event, session)
+        count += 1
+    return count
+
 
+# Max number of threads processing the events of a replay, events about the same payment are always processed by the
+# same thread in the order they were listed.
+MAX_REPLAY_WORKERS = 4
 
-def process_stripe_events(start=None, source_id=None, type=None):
-    """ Used to make server fetch stripe events, used for testing since webhook is hard to use. """
+# Listed events waiting per thread, listing is paused when a thread falls behind.
+REPLAY_QUEUE_SIZE = 100
+
+# Events listed per request to stripe.
+REPLAY_PAGE_SIZE = 100
+
+
+def event_filter(source_id):
+    """ Filter for events about source_id, or all events if source_id is None. """
     
-    def event_filter(event):
+    def matches(event):
         if not source_id:
             return True
 
@@ -150,17 +242,165 @@ def process_stripe_events(start=None, source_id=None, type=None):
         
         return False
     
-    logger.info(f"getting stripe events with start={start}, source_id={source_id}, type={type}")
-    events = list(filter(event_filter,
-                         stripe.Event.list(created={'gte': start} if start else None,
-                                           type=type)))
-    event_count = len(events)
-    logger.info(f"got {event_count} events")
-    for event in events:
+    return matches
+
+
+def event_key(event):
+    """ The id the handler of the event looks up the transaction by, events with different keys never touch the same
+    transaction. """
+    obj = event.data.object
+    event_type = event.type.split('.', 1)[0]
+    if event_type == Type.CHARGE:
+        return obj.get('payment_method')
+    return obj.get('id')
+
+
+def get_replay_checkpoint(name, session=db_session):
+    checkpoint = session.query(StripeReplayCheckpoint).get(name)
+    return checkpoint.event_id if checkpoint else None
+
+
+def save_replay_checkpoint(name, event_id, session=db_session):
+    session.merge(StripeReplayCheckpoint(name=name, event_id=event_id, updated_at=datetime.utcnow()))
+    session.commit()
+
+
+def list_stripe_events(start=None, type=None, ending_before=None):
+    """ Stream events from stripe, pages are fetched as the events are consumed. Events after ending_before are listed
+    oldest first, otherwise they are listed newest first. """
+    params = dict(created={'gte': start} if start else None, type=type, limit=REPLAY_PAGE_SIZE)
+    if ending_before:
+        params['ending_before'] = ending_before
+    return stripe.Event.list(**params).auto_paging_iter()
+
+
+class ReplayProgress:
+    """ Keeps track of which listed events are done. Events are processed out of order by the workers, the checkpoint
+    only moves past an event when it and all events listed before it are done. """
+    
+    def __init__(self):
+        self.lock = Lock()
+        self.event_ids = []
+        self.done = set()
+        self.done_count = 0
+        self.error = None
+    
+    def listed(self, event):
+        with self.lock:
+            self.event_ids.append(event.id)
+            return len(self.event_ids) - 1
+    
+    def completed(self, index):
+        with self.lock:
+            self.done.add(index)
+            while self.done_count in self.done:
+                self.done.remove(self.done_count)
+                self.done_count += 1
+    
+    def failed(self, error):
+        with self.lock:
+            self.error = self.error or error
+    
+    def last_done(self):
+        """ Id of the last event in listing order that is done along with all events before it. """
+        with self.lock:
+            return self.event_ids[self.done_count - 1] if self.done_count else None
+
+
+def replay_event(index, event, progress, session=db_session):
+    try:
         stripe_event(event)
-        
-    return event_count
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.exception(f"failed to process stripe event {event.id}: {e}")
+        progress.failed(e)
+    else:
+        progress.completed(index)
 
 
+class ReplayPool:
+    """ Worker threads with one bounded queue each, events with the same key always go to the same thread so events
+    about a payment are processed in order. """
+    
+    def __init__(self, progress, workers):
+        self.progress = progress
+        self.queues = [Queue(maxsize=REPLAY_QUEUE_SIZE) for _ in range(workers)]
+        self.threads = [Thread(target=self.work, args=(queue,), daemon=True) for queue in self.queues]
+        for thread in self.threads:
+            thread.start()
+    
+    def work(self, queue):
+        try:
+            while True:
+                item = queue.get()
+                if item is None:
+                    return
+                if not self.progress.error:
+                    replay_event(*item, self.progress)
+        finally:
+            db_session.remove()
+    
+    def submit(self, index, event):
+        self.queues[hash(event_key(event)) % len(self.queues)].put((index, event))
+    
+    def shutdown(self):
+        for queue in self.queues:
+            queue.put(None)
+        for thread in self.threads:
+            thread.join()
 
 
+def process_stripe_events(start=None, source_id=None, type=None, checkpoint=None, workers=1,
+                          list_events=list_stripe_events):
+    """ Make server fetch stripe events and process them, used for testing since webhook is hard to use and to replay
+    events that were missed. Events are processed as they are listed.
+    
+    With a checkpoint name the replay resumes after the last event processed by the previous replay with that name.
+    The first replay lists events newest first so its checkpoint is saved when all events are processed, replays after
+    that list events oldest first and save the checkpoint as they go.
+    
+    With more than one worker events about different payments are processed concurrently.
+    
+    Returns number of processed events.
+    """
+    
+    ending_before = get_replay_checkpoint(checkpoint) if checkpoint else None
+    
+    logger.info(f"getting stripe events with start={start}, source_id={source_id}, type={type}"
+                f", checkpoint={checkpoint} ({ending_before}), workers={workers}")
+    
+    events = filter(event_filter(source_id), list_events(start=start, type=type, ending_before=ending_before))
+    progress = ReplayProgress()
+    
+    def save_checkpoint():
+        if not checkpoint or not progress.done_count:
+            return
+        if ending_before:
+            save_replay_checkpoint(checkpoint, progress.last_done())
+        elif progress.done_count == len(progress.event_ids):
+            save_replay_checkpoint(checkpoint, progress.event_ids[0])
+    
+    pool = ReplayPool(progress, workers) if workers > 1 else None
+    try:
+        for event in events:
+            if progress.error:
+                break
+            index = progress.listed(event)
+            if pool:
+                pool.submit(index, event)
+            else:
+                replay_event(index, event, progress)
+            if ending_before and index % REPLAY_PAGE_SIZE == REPLAY_PAGE_SIZE - 1:
+                save_checkpoint()
+    finally:
+        if pool:
+            pool.shutdown()
+        save_checkpoint()
+    
+    logger.info(f"processed {progress.done_count} events")
+    
+    if progress.error:
+        raise progress.error
+    
+    return progress.done_count
@@ -1,13 +1,10 @@
 from logging import getLogger
 from time import sleep
 
-import stripe
-from stripe.error import InvalidRequestError, StripeError, CardError
-
 from service.db import db_session
 from service.error import InternalServerError, EXCEPTION, BadRequest
 from shop.models import Transaction, StripePending
-from shop.stripe_constants import PaymentIntentStatus, PaymentIntentNextActionType, CURRENCY
+from shop.stripe_constants import PaymentIntentStatus, PaymentIntentNextActionType, CURRENCY, stripe
 from shop.stripe_util import convert_to_stripe_amount
 from shop.transactions import PaymentFailed, payment_success, get_source_transaction, commit_fail_transaction
 
@@ -34,10 +31,10 @@ def capture_stripe_payment_intent(transaction, payment_intent):
         )
 
         complete_payment_intent_transaction(transaction, captured_intent)
-    except InvalidRequestError as e:
+    except stripe.error.InvalidRequestError as e:
         raise PaymentFailed(log=f"stripe capture payment_intent failed: {str(e)}", level=EXCEPTION)
 
-    except StripeError as e:
+    except stripe.error.StripeError as e:
         raise InternalServerError(log=f"stripe capture payment_intent failed (possibly temporarily): {str(e)}")
 
 
@@ -118,7 +115,7 @@ def confirm_stripe_payment_intent(data):
 
     try:
         action_info = create_client_response(transaction, payment_intent)
-    except CardError as e:
+    except stripe.error.CardError as e:
         # Reason can be for example: 'Your card's security code is incorrect'.
         commit_fail_transaction(transaction)
         err = PaymentFailed(log=f"Payment failed: {str(e)}", level=EXCEPTION)
@@ -146,7 +143,7 @@ def pay_with_stripe(transaction, payment_method_id):
             f"created stripe payment_intent for transaction {transaction.id}, payment_intent id {payment_intent.id}")
 
         return create_client_response(transaction, payment_intent)
-    except InvalidRequestError as e:
+    except stripe.error.InvalidRequestError as e:
         raise_from_stripe_invalid_request_error(e)
 
 
@@ -0,0 +1,90 @@
+import csv
+import gzip
+import json
+from datetime import datetime, date
+from decimal import Decimal
+from io import StringIO
+
+import membership
+import shop
+from service.db import db_session
+from shop.accounting_export import accounting_export, COLUMNS, LEGACY_COLUMNS, CSV, TSV, NDJSON, GZIP
+from shop.models import Transaction, TransactionContent
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        member = cls.db.create_member()
+        cls.db.create_category()
+        cls.tape = cls.db.create_product(name="tape")
+        cls.wood = cls.db.create_product(name="wood, pine")
+        cls.create_transaction(member, datetime(2022, 12, 31, 23, 59), Transaction.COMPLETED, [cls.tape])
+        cls.first = cls.create_transaction(member, datetime(2023, 1, 1), Transaction.COMPLETED, [cls.tape, cls.wood])
+        cls.without_contents = cls.create_transaction(member, datetime(2023, 3, 1), Transaction.COMPLETED, [])
+        cls.create_transaction(member, datetime(2023, 6, 1), Transaction.FAILED, [cls.tape])
+        cls.last = cls.create_transaction(member, datetime(2023, 12, 31, 23, 59), Transaction.COMPLETED, [cls.wood])
+        cls.create_transaction(member, datetime(2024, 1, 1), Transaction.COMPLETED, [cls.wood])
+
+    @staticmethod
+    def create_transaction(member, created_at, status, products):
+        transaction = Transaction(member_id=member.member_id, amount=Decimal(10 * len(products)), status=status,
+                                  created_at=created_at)
+        db_session.add(transaction)
+        db_session.flush()
+        for product in products:
+            db_session.add(TransactionContent(transaction_id=transaction.id, product_id=product.id, count=2,
+                                              amount=Decimal(10)))
+        db_session.commit()
+        return transaction
+
+    def export(self, format, compress=None, legacy=False):
+        chunks, mimetype = accounting_export(date(2023, 1, 1), date(2023, 12, 31), format, compress, legacy=legacy)
+        if compress:
+            return gzip.decompress(b"".join(chunks)).decode(), mimetype
+        return "".join(chunks), mimetype
+
+    def test_csv_export_contains_completed_contents_in_range(self):
+        data, mimetype = self.export(CSV)
+
+        rows = list(csv.reader(StringIO(data)))
+        self.assertEqual('text/csv', mimetype)
+        self.assertEqual(list(COLUMNS), rows[0])
+        expected = [(self.first.id, "tape"), (self.first.id, "wood, pine"), (self.last.id, "wood, pine")]
+        self.assertEqual([(str(i), name) for i, name in expected], [(r[1], r[4]) for r in rows[1:]])
+
+    def test_tsv_export_is_tab_separated(self):
+        data, mimetype = self.export(TSV)
+
+        self.assertEqual('text/tab-separated-values', mimetype)
+        self.assertEqual("\t".join(COLUMNS), data.split("\n")[0])
+        self.assertEqual(4, len(data.strip().split("\n")))
+
+    def test_gzipped_ndjson_export(self):
+        data, mimetype = self.export(NDJSON, GZIP)
+
+        objs = [json.loads(line) for line in data.strip().split("\n")]
+        self.assertEqual('application/gzip', mimetype)
+        self.assertEqual([self.tape.id, self.wood.id, self.wood.id], [o['product_id'] for o in objs])
+        self.assertEqual(2, objs[0]['count'])
+        self.assertEqual("2023-01-01T00:00:00", objs[0]['created_at'])
+
+    def test_legacy_tsv_export_keeps_old_columns_and_transactions_without_contents(self):
+        data, mimetype = self.export(TSV, legacy=True)
+
+        rows = [line.split("\t") for line in data.strip().split("\n")]
+        self.assertEqual('text/tab-separated-values', mimetype)
+        self.assertEqual(list(LEGACY_COLUMNS), rows[0])
+        self.assertEqual([
+            ["2023-01-01 00:00:00", str(self.first.id), "tape"],
+            ["2023-01-01 00:00:00", str(self.first.id), "wood, pine"],
+            ["2023-03-01 00:00:00", str(self.without_contents.id), "NULL"],
+            ["2023-12-31 23:59:00", str(self.last.id), "wood, pine"],
+        ], [[created_at, i, name] for created_at, i, _, name in rows[1:]])
+        self.assertEqual([Decimal(10), Decimal(10), "NULL", Decimal(10)],
+                         [amount if amount == "NULL" else Decimal(amount) for _, _, amount, _ in rows[1:]])
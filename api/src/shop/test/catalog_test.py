@@ -0,0 +1,60 @@
+import json
+
+import membership
+import shop
+from service.db import db_session
+from service.error import NotFound
+from shop.catalog import CatalogCache, get_catalog_version
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    def setUp(self):
+        self.cache = CatalogCache()
+
+    def get(self, key, etag=None):
+        headers = {'If-None-Match': f'"{etag}"'} if etag else {}
+        with self.app.test_request_context(headers=headers):
+            return self.cache.response(key)
+
+    def test_writes_to_catalog_bump_version_and_rebuild_snapshot(self):
+        self.db.create_category()
+        product = self.db.create_product(name='before')
+        db_session.commit()
+        version = get_catalog_version()
+
+        response = self.get(product.id)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('before', json.loads(response.data)['data']['product']['name'])
+        etag, _ = response.get_etag()
+
+        product.name = 'after'
+        db_session.commit()
+        self.assertGreater(get_catalog_version(), version)
+
+        response = self.get(product.id, etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('after', json.loads(response.data)['data']['product']['name'])
+        self.assertNotEqual(etag, response.get_etag()[0])
+
+    def test_unchanged_catalog_is_not_modified(self):
+        self.db.create_category()
+        product = self.db.create_product()
+        db_session.commit()
+
+        response = self.get('product_data')
+        self.assertIn(product.id, [p['id'] for c in json.loads(response.data)['data'] for p in c['items']])
+        etag, _ = response.get_etag()
+        snapshot = self.cache.snapshot
+
+        response = self.get('product_data', etag)
+        self.assertEqual(304, response.status_code)
+        self.assertIn('max-age', response.headers['Cache-Control'])
+        self.assertIs(snapshot, self.cache.snapshot)
+
+    def test_missing_product_is_not_found(self):
+        with self.assertRaises(NotFound):
+            self.get(999999)
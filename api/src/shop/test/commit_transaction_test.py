@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+import membership
+import shop
+from service.db import db_session
+from shop.models import TransactionContent, ProductAction, TransactionAction
+from shop.transactions import commit_transaction_to_db
+from test_aid.test_base import FlaskTestBase
+from test_aid.test_util import random_str
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    def test_contents_and_actions_are_inserted_for_all_cart_items(self):
+        member = self.db.create_member()
+        self.db.create_category()
+        membership_product = self.db.create_product(price=200)
+        self.db.create_product_action(action_type=ProductAction.ADD_MEMBERSHIP_DAYS, value=365)
+        self.db.create_product_action(action_type=ProductAction.ADD_LABACCESS_DAYS, value=30)
+        self.db.create_product_action(action_type=ProductAction.ADD_LABACCESS_DAYS, value=5,
+                                      deleted_at=self.datetime())
+        plain_product = self.db.create_product(price=10)
+        db_session.commit()
+
+        contents = [
+            TransactionContent(product_id=membership_product.id, count=2, amount=Decimal(400)),
+            TransactionContent(product_id=plain_product.id, count=3, amount=Decimal(30)),
+        ]
+        transaction = commit_transaction_to_db(member_id=member.member_id, total_amount=Decimal(430),
+                                               contents=contents, stripe_card_source_id=random_str())
+
+        self.assertEqual([(membership_product.id, 2), (plain_product.id, 3)],
+                         sorted((c.product_id, c.count) for c in transaction.contents))
+
+        content_id = next(c.id for c in transaction.contents if c.product_id == membership_product.id)
+        actions = (
+            db_session
+            .query(TransactionAction.content_id, TransactionAction.action_type, TransactionAction.value,
+                   TransactionAction.status)
+            .join(TransactionAction.content)
+            .filter(TransactionContent.transaction_id == transaction.id)
+            .all()
+        )
+        self.assertCountEqual([
+            (content_id, ProductAction.ADD_MEMBERSHIP_DAYS, 730, TransactionAction.PENDING),
+            (content_id, ProductAction.ADD_LABACCESS_DAYS, 60, TransactionAction.PENDING),
+        ], actions)
@@ -0,0 +1,101 @@
+from datetime import datetime, date
+from decimal import Decimal
+from unittest.mock import patch
+
+import membership
+import shop
+from service.db import db_session
+from shop.daily_sales import backfill_daily_sales
+from shop.models import Transaction, TransactionContent, DailySales
+from shop.transactions import complete_transaction
+from statistics.maker_statistics import lasertime, shop_statistics
+from test_aid.test_base import FlaskTestBase
+
+
+@patch("shop.transactions.send_receipt_email")
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    def setUp(self):
+        db_session.query(DailySales).delete()
+        db_session.query(TransactionContent).delete()
+        db_session.query(Transaction).delete()
+        db_session.commit()
+        db_session.expunge_all()
+        self.member = self.db.create_member()
+        self.category = self.db.create_category()
+        self.laser = self.db.create_product(name="laser")
+        self.tape = self.db.create_product(name="tape")
+        db_session.commit()
+
+    def create_transaction(self, created_at, contents):
+        transaction = Transaction(member_id=self.member.member_id, amount=sum(a for _, _, a in contents),
+                                  status=Transaction.PENDING, created_at=created_at)
+        db_session.add(transaction)
+        db_session.flush()
+        for product, count, amount in contents:
+            db_session.add(TransactionContent(transaction_id=transaction.id, product_id=product.id, count=count,
+                                              amount=amount))
+        db_session.flush()
+        return transaction
+
+    def rollup(self):
+        return sorted((r.date, r.product_id, r.count, float(r.amount))
+                      for r in db_session.query(DailySales))
+
+    def complete_transactions(self):
+        now = datetime.utcnow()
+        for created_at, contents in [
+            (datetime(2023, 3, 1, 10), [(self.laser, 2, Decimal(40)), (self.tape, 1, Decimal(10))]),
+            (datetime(2023, 3, 1, 18), [(self.laser, 3, Decimal(60))]),
+            (datetime(2023, 4, 2), [(self.laser, 1, Decimal(20))]),
+            (now, [(self.tape, 4, Decimal(40))]),
+        ]:
+            complete_transaction(self.create_transaction(created_at, contents))
+        self.create_transaction(datetime(2023, 3, 1), [(self.laser, 10, Decimal(200))])
+        db_session.commit()
+        return now.date()
+
+    def test_completed_transactions_are_added_to_rollup(self, send_receipt_email):
+        today = self.complete_transactions()
+
+        self.assertEqual(sorted([
+            (date(2023, 3, 1), self.laser.id, 5, 100.0),
+            (date(2023, 3, 1), self.tape.id, 1, 10.0),
+            (date(2023, 4, 2), self.laser.id, 1, 20.0),
+            (today, self.tape.id, 4, 40.0),
+        ]), self.rollup())
+
+    def test_backfill_rebuilds_same_rollup(self, send_receipt_email):
+        self.complete_transactions()
+        expected = self.rollup()
+
+        db_session.query(DailySales).update({DailySales.count: 0})
+        self.assertEqual(2, backfill_daily_sales(date(2023, 3, 1), date(2023, 3, 1)))
+        backfill_daily_sales(date(2023, 4, 1))
+        db_session.commit()
+
+        self.assertEqual(expected, self.rollup())
+
+    def test_statistics_read_rollup_for_product(self, send_receipt_email):
+        self.complete_transactions()
+
+        self.assertEqual([("2023-03", 5), ("2023-04", 1)], lasertime(self.laser.id))
+        self.assertEqual([], lasertime(self.laser.id + 1000))
+
+        statistics = shop_statistics(self.tape.id)
+        revenue = {r["product_id"]: r["amount"] for r in statistics["revenue_by_product_last_12_months"]}
+        self.assertEqual(0.0, revenue[self.laser.id])
+        self.assertEqual(40.0, revenue[self.tape.id])
+
+    def test_category_revenue_follows_current_category_of_product(self, send_receipt_email):
+        self.complete_transactions()
+        moved_to = self.db.create_category()
+        self.tape.category_id = moved_to.id
+        db_session.commit()
+
+        revenue = {r["category_id"]: r["amount"]
+                   for r in shop_statistics()["revenue_by_category_last_12_months"]}
+        self.assertEqual(40.0, revenue[moved_to.id])
+        self.assertEqual(0.0, revenue[self.category.id])
@@ -0,0 +1,61 @@
+import membership
+import shop
+from service.db import db_session
+from shop.image_cache import ImageCache, IMMUTABLE_CACHE_CONTROL, CACHE_CONTROL
+from shop.image_derivatives import content_hash, BASE_WIDTH, PNG
+from shop.models import ProductImage
+from test_aid.test_base import FlaskTestBase
+from test_aid.test_util import random_str
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    def setUp(self):
+        self.cache = ImageCache()
+
+    def create_image(self, data):
+        image = ProductImage(name=random_str(), type='image/png', data=data, hash=content_hash(data))
+        db_session.add(image)
+        db_session.commit()
+        return image
+
+    def get(self, image_id, query_string=None, headers=None):
+        with self.app.test_request_context(query_string=query_string, headers=headers):
+            return self.cache.response(image_id)
+
+    def test_versioned_url_is_immutable_and_served_from_cache(self):
+        data = random_str(100).encode()
+        image = self.create_image(data)
+
+        response = self.get(image.id)
+        self.assertEqual(data, response.data)
+        self.assertEqual(CACHE_CONTROL, response.headers['Cache-Control'])
+        self.assertEqual((image.hash, False), response.get_etag())
+        self.assertIsNotNone(response.last_modified)
+
+        image.deleted_at = self.datetime()
+        db_session.commit()
+
+        response = self.get(image.id, query_string={'v': image.hash})
+        self.assertEqual(data, response.data)
+        self.assertEqual(IMMUTABLE_CACHE_CONTROL, response.headers['Cache-Control'])
+
+    def test_matching_etag_is_not_modified(self):
+        image = self.create_image(random_str(100).encode())
+
+        response = self.get(image.id, headers={'If-None-Match': f'"{image.hash}"'})
+
+        self.assertEqual(304, response.status_code)
+
+    def test_least_recently_used_images_are_evicted(self):
+        self.cache.max_bytes = 250
+        images = [self.create_image(random_str(100).encode()) for _ in range(3)]
+
+        for image in images:
+            self.get(image.id)
+
+        self.assertIsNone(self.cache.get((images[0].id, images[0].hash, (BASE_WIDTH, PNG))))
+        self.assertIsNotNone(self.cache.get((images[2].id, images[2].hash, (BASE_WIDTH, PNG))))
+        self.assertLessEqual(self.cache.size, 250)
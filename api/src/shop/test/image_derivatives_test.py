@@ -0,0 +1,81 @@
+from base64 import b64encode
+from io import BytesIO
+
+from PIL import Image
+
+import membership
+import shop
+from service.db import db_session
+from shop.entities import product_image_entity
+from shop.image_cache import ImageCache
+from shop.image_derivatives import WIDTHS, WEBP, PNG, BASE_WIDTH
+from shop.models import ProductImage, ProductImageDerivative
+from test_aid.test_base import FlaskTestBase
+from test_aid.test_util import random_str
+
+
+def png_data(width, height):
+    out = BytesIO()
+    Image.new("RGB", (width, height), (200, 100, 50)).save(out, format="png")
+    return out.getvalue()
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    def create_image(self, width, height):
+        model = product_image_entity.to_model(dict(name=random_str(), type="image/png",
+                                                   data=b64encode(png_data(width, height)).decode()))
+        image = ProductImage(**model)
+        db_session.add(image)
+        db_session.commit()
+        return image
+
+    def get(self, image_id, query_string=None, headers=None):
+        with self.app.test_request_context(query_string=query_string, headers=headers):
+            return ImageCache().response(image_id)
+
+    def test_derivatives_are_generated_for_all_widths_and_types(self):
+        image = self.create_image(1000, 500)
+
+        self.assertEqual(BASE_WIDTH, Image.open(BytesIO(image.data)).width)
+        self.assertEqual(
+            {(w, t) for w in WIDTHS for t in (WEBP, PNG)} - {(BASE_WIDTH, PNG)},
+            {(d.width, d.type) for d in image.derivatives},
+        )
+        for derivative in image.derivatives:
+            decoded = Image.open(BytesIO(derivative.data))
+            self.assertEqual(derivative.width, decoded.width)
+            self.assertEqual(derivative.type, Image.MIME[decoded.format])
+
+    def test_size_is_picked_from_width_param_and_type_from_accept(self):
+        image = self.create_image(1000, 500)
+
+        response = self.get(image.id, query_string={'w': 200}, headers={'Accept': 'image/webp,image/*'})
+        self.assertEqual(WEBP, response.headers['Content-Type'])
+        self.assertEqual(250, Image.open(BytesIO(response.data)).width)
+        self.assertEqual('Accept', response.headers['Vary'])
+
+        response = self.get(image.id, query_string={'w': 100}, headers={'Accept': 'image/png'})
+        self.assertEqual(PNG, response.headers['Content-Type'])
+        self.assertEqual(120, Image.open(BytesIO(response.data)).width)
+
+        response = self.get(image.id)
+        self.assertEqual(image.data, response.data)
+
+    def test_update_replaces_derivatives(self):
+        image = self.create_image(1000, 500)
+        old_hashes = {d.hash for d in image.derivatives}
+
+        product_image_entity._update_internal(image.id, dict(type="image/png",
+                                                             data=b64encode(png_data(300, 600)).decode()))
+
+        db_session.expire_all()
+        image = db_session.query(ProductImage).get(image.id)
+        self.assertEqual(300, Image.open(BytesIO(image.data)).width)
+        self.assertEqual(len(old_hashes), len(image.derivatives))
+        self.assertFalse(old_hashes & {d.hash for d in image.derivatives})
+        self.assertEqual(len(old_hashes), db_session.query(ProductImageDerivative).filter_by(image_id=image.id).count())
+        for derivative in image.derivatives:
+            self.assertEqual(min(derivative.width, 300), Image.open(BytesIO(derivative.data)).width)
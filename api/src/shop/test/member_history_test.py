@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+import membership
+import shop
+from service.db import db_session
+from shop.models import Transaction, TransactionContent
+from shop.shop_data import member_history
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    def create_transaction(self, member, products):
+        transaction = Transaction(member_id=member.member_id, amount=Decimal(10 * len(products)),
+                                  status=Transaction.COMPLETED)
+        db_session.add(transaction)
+        db_session.flush()
+        for product in products:
+            db_session.add(TransactionContent(transaction_id=transaction.id, product_id=product.id, count=1,
+                                              amount=Decimal(10)))
+        db_session.commit()
+        return transaction
+
+    def test_history_is_paged_newest_first_with_products_once_per_page(self):
+        member = self.db.create_member()
+        other = self.db.create_member()
+        self.db.create_category()
+        p1 = self.db.create_product(name="tape", unit="st")
+        p2 = self.db.create_product(name="wood", unit="m")
+        transactions = [self.create_transaction(member, [p1, p2]) for _ in range(3)]
+        self.create_transaction(other, [p1])
+
+        page = member_history(member.member_id, limit=2)
+
+        self.assertEqual([transactions[2].id, transactions[1].id], [t['id'] for t in page['transactions']])
+        self.assertEqual(transactions[1].id, page['next_before'])
+        self.assertEqual([(p1.id, 1), (p2.id, 1)],
+                         [(c['product_id'], c['count']) for c in page['transactions'][0]['contents']])
+        self.assertEqual({p1.id: {'id': p1.id, 'name': 'tape', 'unit': 'st'},
+                          p2.id: {'id': p2.id, 'name': 'wood', 'unit': 'm'}},
+                         page['products'])
+
+        page = member_history(member.member_id, before=page['next_before'], limit=2)
+
+        self.assertEqual([transactions[0].id], [t['id'] for t in page['transactions']])
+        self.assertIsNone(page['next_before'])
+
+    def test_member_without_transactions_has_empty_history(self):
+        member = self.db.create_member()
+
+        self.assertEqual(dict(transactions=[], products={}, next_before=None), member_history(member.member_id))
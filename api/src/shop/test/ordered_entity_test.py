@@ -0,0 +1,76 @@
+import membership
+import shop
+from service.db import db_session
+from service.error import UnprocessableEntity
+from shop.catalog_version import get_catalog_version
+from shop.entities import category_entity
+from shop.models import ProductCategory
+from shop.ordered_entity import ORDER_GAP
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    def display_orders(self, ids):
+        db_session.expire_all()
+        return [db_session.query(ProductCategory).get(i).display_order for i in ids]
+
+    def test_created_entities_are_placed_last_with_gap(self):
+        first = category_entity.create(dict(name="first"))
+        second = category_entity.create(dict(name="second"))
+
+        self.assertEqual(first['display_order'] + ORDER_GAP, second['display_order'])
+
+    def test_reorder_rewrites_positions_in_given_order(self):
+        ids = [category_entity.create(dict(name=f"category {i}"))['id'] for i in range(4)]
+        positions = self.display_orders(ids)
+
+        category_entity.reorder(ids=[ids[2], ids[0], ids[1]])
+        db_session.commit()
+
+        self.assertEqual([positions[1], positions[2], positions[0]], self.display_orders(ids[:3]))
+        self.assertEqual(positions[3:], self.display_orders(ids[3:]))
+
+    def test_reorder_of_subset_keeps_place_among_other_entities(self):
+        ids = [category_entity.create(dict(name=f"category {i}"))['id'] for i in range(5)]
+        subset = [ids[4], ids[2], ids[0]]
+
+        category_entity.reorder(ids=subset)
+        db_session.commit()
+
+        db_session.expire_all()
+        order = [c.id for c in db_session.query(ProductCategory).filter(ProductCategory.id.in_(ids))
+                 .order_by(ProductCategory.display_order, ProductCategory.id)]
+        self.assertEqual([ids[4], ids[1], ids[2], ids[3], ids[0]], order)
+
+    def test_reorder_of_entities_sharing_display_order_keeps_given_order(self):
+        ids = [category_entity.create(dict(name=f"category {i}", display_order=ORDER_GAP))['id'] for i in range(3)]
+
+        category_entity.reorder(ids=list(reversed(ids)))
+        db_session.commit()
+
+        self.assertEqual([ORDER_GAP + 2, ORDER_GAP + 1, ORDER_GAP], self.display_orders(ids))
+
+    def test_reorder_with_missing_id_fails(self):
+        category_id = category_entity.create(dict(name="category"))['id']
+
+        with self.assertRaises(UnprocessableEntity):
+            category_entity.reorder(ids=[category_id, 999999])
+
+    def test_reorder_bumps_catalog_version(self):
+        ids = [category_entity.create(dict(name=f"category {i}"))['id'] for i in range(2)]
+        db_session.commit()
+        version = get_catalog_version()
+
+        category_entity.reorder(ids=list(reversed(ids)))
+        db_session.commit()
+
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_reorder_with_duplicate_ids_fails(self):
+        category_id = category_entity.create(dict(name="category"))['id']
+
+        with self.assertRaises(UnprocessableEntity):
+            category_entity.reorder(ids=[category_id, category_id])
@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import membership
+import shop
+from membership.models import Span
+from service.db import db_session
+from service.error import NotFound, BadRequest
+from shop.transactions import process_cart
+from test_aid.test_base import FlaskTestBase
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    @contextmanager
+    def count_queries(self):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    def setUp(self):
+        self.db.create_category()
+        self.products = [self.db.create_product(price=10 * (i + 1)) for i in range(5)]
+        self.start_package = self.db.create_product(price=100, filter="start_package")
+        db_session.commit()
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        member_id = self.db.create_member().member_id
+        small_cart = [dict(id=self.start_package.id, count=1)]
+        cart = [dict(id=p.id, count=2) for p in self.products] + [dict(id=self.start_package.id, count=1)] * 2
+
+        with self.count_queries() as small:
+            process_cart(member_id, small_cart)
+
+        with self.count_queries() as large:
+            total_amount, contents = process_cart(member_id, cart)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(2 * (10 + 20 + 30 + 40 + 50) + 2 * 100, total_amount)
+        self.assertEqual(len(cart), len(contents))
+
+    def test_filter_uses_member_labaccess(self):
+        member = self.db.create_member()
+        self.db.create_span(type=Span.LABACCESS, startdate=self.date(-10), enddate=self.date(10))
+
+        with self.assertRaises(BadRequest):
+            process_cart(member.member_id, [dict(id=self.start_package.id, count=1)])
+
+    def test_missing_product_is_not_found(self):
+        member = self.db.create_member()
+
+        with self.assertRaises(NotFound):
+            process_cart(member.member_id, [dict(id=self.products[0].id, count=1), dict(id=999999, count=1)])
@@ -0,0 +1,86 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import core
+import messages
+import shop
+from membership import membership
+from membership.membership import get_membership_summary
+from membership.models import Span
+from messages.models import Message, MessageTemplate
+from service.db import db_session
+from shop.models import ProductAction, Transaction, TransactionAction
+from shop.transactions import create_transaction, ship_orders
+from test_aid.test_base import FlaskTestBase, ShopTestMixin
+
+
+class Test(ShopTestMixin, FlaskTestBase):
+
+    models = [membership.models, messages.models, shop.models, core.models]
+    products = [
+        dict(price=100.0, action=dict(action_type=ProductAction.ADD_LABACCESS_DAYS, value=30)),
+        dict(price=200.0, action=dict(action_type=ProductAction.ADD_MEMBERSHIP_DAYS, value=365)),
+    ]
+
+    def buy(self, member, cart):
+        expected_sum = sum(getattr(self, f"p{i}_price") * count for i, count in cart)
+        transaction = create_transaction(
+            member_id=member.member_id,
+            purchase=dict(cart=[dict(id=getattr(self, f"p{i}_id"), count=count) for i, count in cart],
+                          expected_sum=expected_sum),
+            stripe_reference_id="not_used",
+        )
+        transaction.status = Transaction.COMPLETED
+        db_session.commit()
+        return transaction
+
+    def messages(self, member):
+        return db_session.query(Message).filter_by(member_id=member.member_id).all()
+
+    @patch("shop.transactions.ensure_accessy_labaccess")
+    def test_actions_of_member_are_shipped_together_with_one_email(self, ensure_accessy_labaccess):
+        member = self.db.create_member(labaccess_agreement_at=datetime.utcnow())
+        self.buy(member, [(0, 2), (1, 1)])
+        self.buy(member, [(0, 1)])
+
+        ship_orders()
+        db_session.commit()
+
+        summary = get_membership_summary(member.member_id)
+        self.assertEqual(self.date(90), summary.labaccess_end)
+        self.assertEqual(self.date(365), summary.membership_end)
+        self.assertEqual(
+            [(self.date(0), self.date(60)), (self.date(60), self.date(90))],
+            sorted((s.startdate, s.enddate) for s in
+                   db_session.query(Span).filter_by(member_id=member.member_id, type=Span.LABACCESS)),
+        )
+
+        message, = self.messages(member)
+        self.assertEqual(MessageTemplate.ADD_MEMBERSHIP_AND_LABACCESS_TIME.value, message.template)
+        self.assertIn("90 dagar", message.body)
+
+        ensure_accessy_labaccess.assert_called_once_with(member_id=member.member_id)
+
+        ship_orders()
+        db_session.commit()
+        self.assertEqual(1, len(self.messages(member)))
+
+    @patch("shop.transactions.ensure_accessy_labaccess")
+    def test_labaccess_stays_pending_if_requirements_are_not_met(self, ensure_accessy_labaccess):
+        member = self.db.create_member(labaccess_agreement_at=None)
+        transaction = self.buy(member, [(0, 1), (1, 1)])
+
+        ship_orders()
+        db_session.commit()
+
+        summary = get_membership_summary(member.member_id)
+        self.assertIsNone(summary.labaccess_end)
+        self.assertEqual(self.date(365), summary.membership_end)
+        self.assertEqual(
+            {ProductAction.ADD_LABACCESS_DAYS: TransactionAction.PENDING,
+             ProductAction.ADD_MEMBERSHIP_DAYS: TransactionAction.COMPLETED},
+            {a.action_type: a.status for c in transaction.contents for a in c.actions},
+        )
+        message, = self.messages(member)
+        self.assertEqual(MessageTemplate.ADD_MEMBERSHIP_TIME.value, message.template)
+        ensure_accessy_labaccess.assert_not_called()
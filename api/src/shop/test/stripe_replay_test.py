@@ -0,0 +1,122 @@
+from threading import Lock
+from unittest.mock import patch
+
+import membership
+import shop
+from service.db import db_session
+from shop.models import StripeReplayCheckpoint
+from shop.stripe_event import process_stripe_events, get_replay_checkpoint
+from test_aid.stripe_stand_in import RecordedStripeEvents
+from test_aid.test_base import FlaskTestBase
+
+
+def recorded_event(number, payment=None, type="charge.succeeded"):
+    if type.startswith("source."):
+        obj = dict(id=payment or f"src_{number:04d}", object="source")
+    else:
+        obj = dict(id=f"ch_{number:04d}", object="charge", payment_method=payment or f"src_{number:04d}")
+    return dict(
+        id=f"evt_{number:04d}",
+        object="event",
+        type=type,
+        created=1_600_000_000 + number,
+        data=dict(object=obj),
+    )
+
+
+@patch("shop.stripe_event.REPLAY_PAGE_SIZE", 10)
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    def setUp(self):
+        db_session.query(StripeReplayCheckpoint).delete()
+        db_session.commit()
+        self.processed = []
+        self.lock = Lock()
+
+    def process(self, event):
+        with self.lock:
+            self.processed.append(event.id)
+
+    def replay(self, **kwargs):
+        with patch("shop.stripe_event.stripe_event", side_effect=self.process):
+            return process_stripe_events(**kwargs)
+
+    def test_events_are_streamed_page_by_page(self):
+        with RecordedStripeEvents(recorded_event(i) for i in range(25)) as stripe_api:
+            self.assertEqual(25, self.replay())
+
+        self.assertEqual([recorded_event(i)['id'] for i in reversed(range(25))], self.processed)
+        self.assertEqual(3, len(stripe_api.requests))
+
+    def test_source_id_and_type_filter(self):
+        events = [recorded_event(1), recorded_event(2), recorded_event(3, type="source.chargeable")]
+        with RecordedStripeEvents(events):
+            self.assertEqual(1, self.replay(source_id="ch_0002"))
+            self.assertEqual(1, self.replay(type="source.*"))
+
+        self.assertEqual(["evt_0002", "evt_0003"], self.processed)
+
+    def test_replay_resumes_after_checkpoint(self):
+        with RecordedStripeEvents(recorded_event(i) for i in range(15)) as stripe_api:
+            self.assertEqual(15, self.replay(checkpoint="replay"))
+            self.assertEqual("evt_0014", get_replay_checkpoint("replay"))
+
+            self.processed.clear()
+            self.assertEqual(0, self.replay(checkpoint="replay"))
+
+            stripe_api.add(*(recorded_event(i) for i in range(15, 40)))
+            self.assertEqual(25, self.replay(checkpoint="replay"))
+
+        self.assertEqual([recorded_event(i)['id'] for i in range(15, 40)], self.processed)
+        self.assertEqual("evt_0039", get_replay_checkpoint("replay"))
+
+    def test_failed_replay_resumes_at_failed_event(self):
+        def fail_on_event_7(event):
+            if event.id == "evt_0007":
+                raise RuntimeError("stripe is down")
+            self.process(event)
+
+        with RecordedStripeEvents([recorded_event(0)]) as stripe_api:
+            self.replay(checkpoint="replay")
+            stripe_api.add(*(recorded_event(i) for i in range(1, 20)))
+
+            with patch("shop.stripe_event.stripe_event", side_effect=fail_on_event_7):
+                with self.assertRaises(RuntimeError):
+                    process_stripe_events(checkpoint="replay")
+            self.assertEqual("evt_0006", get_replay_checkpoint("replay"))
+
+            self.processed.clear()
+            self.assertEqual(13, self.replay(checkpoint="replay"))
+
+        self.assertEqual([recorded_event(i)['id'] for i in range(7, 20)], self.processed)
+
+    def test_concurrent_replay_keeps_order_of_events_about_same_payment(self):
+        events = [recorded_event(i, payment=f"src_{i % 5}") for i in range(60)]
+        with RecordedStripeEvents(events[:1]) as stripe_api:
+            self.replay(checkpoint="replay")
+            stripe_api.add(*events[1:])
+            self.processed.clear()
+            self.assertEqual(59, self.replay(checkpoint="replay", workers=3))
+
+        self.assertCountEqual([e['id'] for e in events[1:]], self.processed)
+        for payment in range(5):
+            ids = [e['id'] for e in events[1:] if e['data']['object']['payment_method'] == f"src_{payment}"]
+            self.assertEqual(ids, [i for i in self.processed if i in ids])
+        self.assertEqual("evt_0059", get_replay_checkpoint("replay"))
+
+    def test_concurrent_replay_keeps_order_of_source_and_charge_events_about_same_source(self):
+        types = ["source.chargeable", "charge.pending", "charge.succeeded"]
+        events = [recorded_event(i, payment=f"src_{i // 3 % 4}", type=types[i % 3]) for i in range(48)]
+        with RecordedStripeEvents(events[:1]) as stripe_api:
+            self.replay(checkpoint="replay")
+            stripe_api.add(*events[1:])
+            self.processed.clear()
+            self.assertEqual(47, self.replay(checkpoint="replay", workers=3))
+
+        self.assertCountEqual([e['id'] for e in events[1:]], self.processed)
+        for source in range(4):
+            ids = [e['id'] for e in events[1:]
+                   if f"src_{source}" in (e['data']['object']['id'], e['data']['object'].get('payment_method'))]
+            self.assertEqual(ids, [i for i in self.processed if i in ids])
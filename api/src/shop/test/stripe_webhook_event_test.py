@@ -0,0 +1,66 @@
+import json
+from unittest.mock import patch
+
+import membership
+import shop
+from service.db import db_session
+from shop.models import StripeWebhookEvent
+from shop.stripe_event import record_stripe_event, process_recorded_stripe_events, claim_stripe_event, MAX_ATTEMPTS
+from test_aid.test_base import FlaskTestBase
+from test_aid.test_util import random_str
+
+
+class Test(FlaskTestBase):
+
+    models = [membership.models, shop.models]
+
+    def setUp(self):
+        for event in db_session.query(StripeWebhookEvent):
+            db_session.delete(event)
+        db_session.commit()
+
+    def record(self):
+        event_id = f"evt_{random_str()}"
+        payload = json.dumps(dict(id=event_id, object="event", type="charge.succeeded", data=dict(object={})))
+        self.assertTrue(record_stripe_event(event_id, "charge.succeeded", payload))
+        db_session.commit()
+        return event_id
+
+    def test_duplicate_event_is_not_recorded_again(self):
+        event_id = self.record()
+
+        self.assertFalse(record_stripe_event(event_id, "charge.succeeded", "{}"))
+        self.assertEqual(1, db_session.query(StripeWebhookEvent).count())
+
+    @patch("shop.stripe_event.stripe_event")
+    def test_recorded_events_are_processed_once(self, stripe_event):
+        event_ids = [self.record(), self.record()]
+
+        self.assertEqual(2, process_recorded_stripe_events())
+        self.assertEqual(0, process_recorded_stripe_events())
+
+        self.assertEqual(event_ids, [call.args[0].id for call in stripe_event.call_args_list])
+        for event in db_session.query(StripeWebhookEvent):
+            self.assertEqual(StripeWebhookEvent.PROCESSED, event.status)
+            self.assertIsNotNone(event.processed_at)
+
+    @patch("shop.stripe_event.stripe_event", side_effect=RuntimeError("stripe is down"))
+    def test_failing_event_is_retried_later_and_then_given_up(self, stripe_event):
+        event_id = self.record()
+
+        process_recorded_stripe_events()
+
+        event = db_session.query(StripeWebhookEvent).get(event_id)
+        self.assertEqual(StripeWebhookEvent.PENDING, event.status)
+        self.assertEqual("stripe is down", event.error)
+        self.assertIsNone(claim_stripe_event(), "retry should wait for the retry delay")
+
+        event.attempts = MAX_ATTEMPTS - 1
+        event.claimed_at = None
+        db_session.commit()
+
+        process_recorded_stripe_events()
+
+        event = db_session.query(StripeWebhookEvent).get(event_id)
+        self.assertEqual(StripeWebhookEvent.FAILED, event.status)
+        self.assertEqual(MAX_ATTEMPTS, event.attempts)
@@ -1,20 +1,22 @@
+from collections import defaultdict
 from decimal import localcontext, Decimal, Rounded
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from logging import getLogger
 
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 from sqlalchemy.sql import func
 
 
-from membership.membership import add_membership_days
-from membership.models import Key, Span
+from membership.membership import refresh_membership_summaries, log_member_changes, get_membership_summaries
+from membership.models import Key, Span, Member
 from multiaccessy.invite import ensure_accessy_labaccess, AccessyError, check_labaccess_requirements, \
     LabaccessRequirements
-from service.api_definition import NEGATIVE_ITEM_COUNT, INVALID_ITEM_COUNT, EMPTY_CART, NON_MATCHING_SUMS
+from service.api_definition import NEGATIVE_ITEM_COUNT, INVALID_ITEM_COUNT, EMPTY_CART, NON_MATCHING_SUMS, NOT_UNIQUE
 from service.db import db_session, nested_atomic
-from service.error import InternalServerError, BadRequest, NotFound
-from shop.email import send_labaccess_extended_email, send_membership_updated_email, send_new_member_email, send_receipt_email
-from shop.filters import PRODUCT_FILTERS
+from service.error import InternalServerError, BadRequest, NotFound, UnprocessableEntity
+from shop.daily_sales import add_transaction_sales
+from shop.email import send_days_added_email, send_new_member_email, send_receipt_email
+from shop.filters import PRODUCT_FILTERS, FilterData
 from shop.models import TransactionAction, TransactionContent, Transaction, ProductAction, PendingRegistration, \
     StripePending, Product
 from shop.stripe_util import convert_to_stripe_amount
@@ -49,20 +51,28 @@ def commit_transaction_to_db(member_id=None, total_amount=None, contents=None, s
     db_session.add(transaction)
     db_session.flush()
 
-    for content in contents:
-        content.transaction_id = transaction.id
-        db_session.add(content)
-        db_session.flush()
-        
-        db_session.execute(
-            """
-            INSERT INTO webshop_transaction_actions (content_id, action_type, value, status)
-            SELECT :content_id AS content_id, action_type, SUM(:count * value) AS value, :pending AS status
-            FROM webshop_product_actions WHERE product_id=:product_id AND deleted_at IS NULL GROUP BY action_type
-            """,
-            {'content_id': content.id, 'count': content.count, 'pending': TransactionAction.PENDING,
-             'product_id': content.product_id}
-        )
+    # All contents in one multi row insert and all their actions in one insert select, so the number of statements
+    # does not depend on the size of the cart.
+    db_session.execute(
+        TransactionContent.__table__.insert().values([
+            dict(transaction_id=transaction.id, product_id=c.product_id, count=c.count, amount=c.amount)
+            for c in contents
+        ])
+    )
+    
+    db_session.execute(
+        """
+        INSERT INTO webshop_transaction_actions (content_id, action_type, value, status)
+        SELECT c.id AS content_id, a.action_type, SUM(c.count * a.value) AS value, :pending AS status
+        FROM webshop_transaction_contents AS c
+        JOIN webshop_product_actions AS a ON a.product_id = c.product_id AND a.deleted_at IS NULL
+        WHERE c.transaction_id = :transaction_id
+        GROUP BY c.id, a.action_type
+        """,
+        {'transaction_id': transaction.id, 'pending': TransactionAction.PENDING}
+    )
+    
+    db_session.expire(transaction, ['contents'])
     
     if activates_member:
         # Mark this transaction as one that is for registering a member.
@@ -118,51 +128,115 @@ def pending_action_value_sum(member_id, action_type):
     )
 
 
-def complete_pending_action(action):
-    action.status = TransactionAction.COMPLETED
-    action.completed_at = datetime.utcnow()
-    db_session.add(action)
-    db_session.flush()
+SPAN_TYPE_BY_ACTION_TYPE = {
+    ProductAction.ADD_LABACCESS_DAYS: Span.LABACCESS,
+    ProductAction.ADD_MEMBERSHIP_DAYS: Span.MEMBERSHIP,
+}
 
 
-def ship_add_labaccess_action(action, transaction, skip_ensure_accessy=False):
-    days_to_add = action.value
+def action_creation_reason(action, transaction):
+    return f"transaction_action_id: {action.id}, transaction_id: {transaction.id}"
 
-    state = check_labaccess_requirements(transaction.member_id)
-    if state != LabaccessRequirements.OK:
-        logger.info(f"skipping ship_add_labaccess_action because member {transaction.member_id} failed check_labaccess_requirements with {state}")
-        return
 
-    labaccess_end = add_membership_days(
-        transaction.member_id,
-        Span.LABACCESS,
-        days=days_to_add,
-        creation_reason=f"transaction_action_id: {action.id}, transaction_id: {transaction.id}"
-    ).labaccess_end
+def ship_pending_actions(pending, skip_ensure_accessy=False):
+    """
+    Ship pending (action, content, transaction) rows grouped per member: new spans are calculated in one pass and
+    inserted in bulk, each member gets one email and accessy is updated for all members with new labaccess at the end.
+    Labaccess actions for members that does not meet the labaccess requirements stays pending.
+    """
+    
+    if not pending:
+        return
+    
+    member_ids = sorted({transaction.member_id for _, _, transaction in pending})
+    
+    # Load members into the session so requirement checks and emails does not query them one by one, the session
+    # only keeps them while they are referenced.
+    members = db_session.query(Member).filter(Member.member_id.in_(member_ids)).all()
+    
+    requirements = {}
+    shippable = []
+    for action, content, transaction in pending:
+        if action.action_type == ProductAction.ADD_LABACCESS_DAYS:
+            member_id = transaction.member_id
+            if member_id not in requirements:
+                requirements[member_id] = check_labaccess_requirements(member_id)
+            if requirements[member_id] != LabaccessRequirements.OK:
+                logger.info(f"skipping labaccess action {action.id} because member {member_id} failed"
+                            f" check_labaccess_requirements with {requirements[member_id]}")
+                continue
+        shippable.append((action, transaction))
+    
+    if not shippable:
+        return
+    
+    reasons = {action_creation_reason(action, transaction) for action, transaction in shippable}
+    existing = {
+        reason: (type, (enddate - startdate).days)
+        for reason, type, startdate, enddate in
+        db_session.query(Span.creation_reason, Span.type, Span.startdate, Span.enddate)
+        .filter(Span.creation_reason.in_(reasons))
+    }
+    
+    last_ends = {
+        (member_id, type): last_end
+        for member_id, type, last_end in
+        db_session
+        .query(Span.member_id, Span.type, func.max(Span.enddate))
+        .filter(Span.member_id.in_(member_ids), Span.type.in_(SPAN_TYPE_BY_ACTION_TYPE.values()),
+                Span.deleted_at.is_(None))
+        .group_by(Span.member_id, Span.type)
+    }
+    
+    today = date.today()
+    spans = []
+    days_by_member = defaultdict(lambda: defaultdict(int))
+    for action, transaction in shippable:
+        span_type = SPAN_TYPE_BY_ACTION_TYPE[action.action_type]
+        reason = action_creation_reason(action, transaction)
+        
+        if reason in existing:
+            # Duplicate shipping can happen if a previous run failed after the span was created.
+            if existing[reason] != (span_type, action.value):
+                raise UnprocessableEntity(f"Duplicate entry.", fields='creation_reason', what=NOT_UNIQUE)
+        else:
+            default_start_date = transaction.created_at.date() if span_type == Span.MEMBERSHIP else today
+            key = (transaction.member_id, span_type)
+            start = max(last_ends.get(key) or default_start_date, default_start_date)
+            end = start + timedelta(days=action.value)
+            last_ends[key] = end
+            spans.append(dict(member_id=transaction.member_id, startdate=start, enddate=end, type=span_type,
+                              creation_reason=reason))
+        
+        action.status = TransactionAction.COMPLETED
+        action.completed_at = datetime.utcnow()
+        days_by_member[transaction.member_id][span_type] += action.value
+    
+    if spans:
+        # Bulk insert does not flush through the session, so summaries are refreshed and changes logged explicitly.
+        db_session.execute(Span.__table__.insert(), spans)
+        span_member_ids = sorted({s['member_id'] for s in spans})
+        refresh_membership_summaries(span_member_ids)
+        log_member_changes(span_member_ids)
+    db_session.flush()
+    
+    shipped_member_ids = sorted(days_by_member)
+    for member_id, membership in zip(shipped_member_ids, get_membership_summaries(shipped_member_ids)):
+        days = days_by_member[member_id]
+        assert not days.get(Span.LABACCESS) or membership.labaccess_end
+        assert not days.get(Span.MEMBERSHIP) or membership.membership_end
+        send_days_added_email(member_id, days.get(Span.LABACCESS), membership.labaccess_end,
+                              days.get(Span.MEMBERSHIP), membership.membership_end)
     
-    assert labaccess_end
-
-    complete_pending_action(action)
-    send_labaccess_extended_email(transaction.member_id, days_to_add, labaccess_end)
     if not skip_ensure_accessy:
-        ensure_accessy_labaccess(member_id=transaction.member_id)
-
-
-def ship_add_membership_action(action, transaction):
-    days_to_add = action.value
-
-    membership_end = add_membership_days(
-        transaction.member_id,
-        Span.MEMBERSHIP,
-        days=days_to_add,
-        creation_reason=f"transaction_action_id: {action.id}, transaction_id: {transaction.id}",
-        default_start_date=transaction.created_at.date(),
-    ).membership_end
-
-    assert membership_end
-
-    complete_pending_action(action)
-    send_membership_updated_email(transaction.member_id, days_to_add, membership_end)
+        for member_id in shipped_member_ids:
+            if Span.LABACCESS not in days_by_member[member_id]:
+                continue
+            try:
+                ensure_accessy_labaccess(member_id=member_id)
+            except AccessyError as e:
+                logger.warning(f"failed to ensure accessy labacess, skipping, member (id {member_id}) can self"
+                               f" service add later: {e}")
 
 
 def activate_member(member):
@@ -191,6 +265,7 @@ def complete_transaction(transaction):
     transaction.status = Transaction.COMPLETED
     db_session.add(transaction)
     db_session.flush()
+    add_transaction_sales(transaction)
     logger.info(f"completing transaction {transaction.id}, payment confirmed"
                 f", sending email receipt to member {transaction.member_id}")
     send_receipt_email(transaction)
@@ -203,22 +278,26 @@ def ship_orders(ship_add_labaccess=True, transaction=None):
     If transaction is set this is done only for that transaction.
     """
     
-    for action, content, transaction in pending_actions_query(transaction=transaction):
+    action_types = [ProductAction.ADD_MEMBERSHIP_DAYS]
+    if ship_add_labaccess:
+        action_types.append(ProductAction.ADD_LABACCESS_DAYS)
+    
+    ship_pending_actions(pending_actions_to_ship(action_types, transaction=transaction))
 
-        if ship_add_labaccess and action.action_type == ProductAction.ADD_LABACCESS_DAYS:
-            try:
-                ship_add_labaccess_action(action, transaction)
-            except AccessyError as e:
-                logger.warning(f"failed to ensure accessy labacess, skipping, member (id {transaction.member_id}, number {transaction.member.member_number}) can self service add later: {e}")
 
-        if action.action_type == ProductAction.ADD_MEMBERSHIP_DAYS:
-            ship_add_membership_action(action, transaction)
+def ship_labaccess_orders(member_id=None, skip_ensure_accessy=False):
+    ship_pending_actions(pending_actions_to_ship([ProductAction.ADD_LABACCESS_DAYS], member_id=member_id),
+                         skip_ensure_accessy=skip_ensure_accessy)
 
 
-def ship_labaccess_orders(member_id=None, skip_ensure_accessy=False):
-    for action, content, transaction in pending_actions_query(member_id=member_id):
-        if action.action_type == ProductAction.ADD_LABACCESS_DAYS:
-            ship_add_labaccess_action(action, transaction, skip_ensure_accessy=skip_ensure_accessy)
+def pending_actions_to_ship(action_types, member_id=None, transaction=None):
+    """ Pending actions of action_types in the order they were bought. """
+    return (
+        pending_actions_query(member_id=member_id, transaction=transaction)
+        .filter(TransactionAction.action_type.in_(action_types))
+        .order_by(Transaction.id, TransactionAction.id)
+        .all()
+    )
 
 
 @nested_atomic
@@ -231,16 +310,25 @@ def payment_success(transaction):
 
 
 def process_cart(member_id, cart):
+    """ Validate cart and return total amount and unsaved contents, uses a fixed number of queries independent of
+    cart size. """
+    
+    product_ids = {item['id'] for item in cart}
+    products = {
+        p.id: p
+        for p in db_session.query(Product).filter(Product.id.in_(product_ids), Product.deleted_at.is_(None))
+    }
+    filter_data = FilterData(member_id)
+    
     contents = []
     with localcontext() as ctx:
         ctx.clear_flags()
         total_amount = Decimal(0)
 
         for item in cart:
-            try:
-                product_id = item['id']
-                product = db_session.query(Product).filter(Product.id == product_id, Product.deleted_at.is_(None)).one()
-            except NoResultFound:
+            product_id = item['id']
+            product = products.get(product_id)
+            if product is None:
                 raise NotFound(message=f"Could not find product with id {product_id}.")
 
             if product.price < 0:
@@ -256,7 +344,7 @@ def process_cart(member_id, cart):
                                  f"of {product.smallest_multiple}, was {count}.", what=INVALID_ITEM_COUNT)
 
             if product.filter:
-                PRODUCT_FILTERS[product.filter](cart_item=item, member_id=member_id)
+                PRODUCT_FILTERS[product.filter](cart_item=item, data=filter_data)
 
             amount = product.price * count
             total_amount += amount
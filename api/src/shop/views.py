@@ -1,19 +1,20 @@
-from flask import g, request, send_file, make_response
-from sqlalchemy.exc import NoResultFound
+from flask import g, request
 
 from multiaccessy.invite import AccessyInvitePreconditionFailed, ensure_accessy_labaccess
-from service.api_definition import WEBSHOP, WEBSHOP_EDIT, PUBLIC, GET, USER, POST, Arg, WEBSHOP_ADMIN, MEMBER_EDIT
-from service.db import db_session
+from service.api_definition import WEBSHOP, WEBSHOP_EDIT, PUBLIC, GET, USER, POST, Arg, WEBSHOP_ADMIN, MEMBER_EDIT, \
+    natural1, iso_date, Enum
 from service.entity import OrmSingeRelation, OrmSingleSingleRelation
 from service.error import PreconditionFailed
 from shop import service
+from shop.accounting_export import accounting_export, FORMATS, CSV, GZIP
+from shop.catalog import catalog_cache
+from shop.image_cache import image_cache
 from shop.entities import product_image_entity, transaction_content_entity, transaction_entity, \
     transaction_action_entity, product_entity, category_entity, product_action_entity
-from shop.models import TransactionContent, ProductImage
+from shop.models import TransactionContent
 from shop.pay import pay, register
-from shop.shop_data import pending_actions, member_history, receipt, get_product_data, all_product_data, \
-    get_membership_products
-from shop.stripe_event import stripe_callback, process_stripe_events
+from shop.shop_data import pending_actions, member_history, receipt, HISTORY_PAGE_SIZE
+from shop.stripe_event import stripe_callback, process_stripe_events, MAX_REPLAY_WORKERS
 from shop.stripe_payment_intent import confirm_stripe_payment_intent
 from shop.transactions import ship_labaccess_orders
 
@@ -121,8 +122,8 @@ def pending_actions_for_member():
 
 
 @service.route("/member/current/transactions", method=GET, permission=USER)
-def transactions_for_member():
-    return member_history(g.user_id)
+def transactions_for_member(before=Arg(natural1, required=False), limit=Arg(natural1, required=False)):
+    return member_history(g.user_id, before=before, limit=min(limit or HISTORY_PAGE_SIZE, 100))
 
 
 @service.route("/member/current/receipt/<int:transaction_id>", method=GET, permission=USER)
@@ -147,32 +148,24 @@ def ship_labaccess_orders_endpoint(member_id=None):
         raise PreconditionFailed(message=str(e))
 
 
-@service.route("/product_data", method=GET, permission=PUBLIC)
+@service.raw_route("/product_data")
 def shop_data():
-    return all_product_data()
+    return catalog_cache.response('product_data')
 
 
-@service.route("/product_data/<int:product_id>", method=GET, permission=PUBLIC)
+@service.raw_route("/product_data/<int:product_id>")
 def product_data(product_id):
-    return get_product_data(product_id)
+    return catalog_cache.response(product_id)
 
 
 @service.raw_route("/image/<int:image_id>")
 def public_image(image_id):
-    try:
-        image = db_session.query(ProductImage).filter(ProductImage.id == image_id, ProductImage.deleted_at.is_(None)).one()
-    except NoResultFound:
-        return send_file("/work/default-product-image.png", mimetype='image/png')
-
-    response = make_response(image.data)
-    response.headers.set("Content-Type", image.type)
-    response.headers.set("Max-Age", "36000")
-    return response
+    return image_cache.response(image_id)
 
 
-@service.route("/register_page_data", method=GET, permission=PUBLIC)
+@service.raw_route("/register_page_data")
 def register_page_data():
-    return {"membershipProducts": get_membership_products(), "productData": all_product_data()}
+    return catalog_cache.response('register_page_data')
 
 
 @service.route("/pay", method=POST, permission=USER, commit_on_error=True)
@@ -190,14 +183,24 @@ def register_route():
     return register(request.json, request.remote_addr, request.user_agent.string)
 
 
-@service.route("/stripe_callback", method=POST, permission=PUBLIC, commit_on_error=True)
+@service.route("/stripe_callback", method=POST, permission=PUBLIC)
 def stripe_callback_route():
     stripe_callback(request.data, request.headers)
 
 
 @service.route("/process_stripe_events", method=POST, permission=WEBSHOP_ADMIN, commit_on_error=True)
 def process_stripe_events_route(start=Arg(str, required=False), source_id=Arg(str, required=False),
-                                type=Arg(str, required=False)):
-    """ Used to make server fetch stripe events, used for testing since webhook is hard to use. """
-    return process_stripe_events(start, source_id, type)
-
+                                type=Arg(str, required=False), checkpoint=Arg(str, required=False),
+                                workers=Arg(int, required=False)):
+    """ Used to make server fetch stripe events, used for testing since webhook is hard to use and to replay missed
+    events. """
+    return process_stripe_events(start, source_id, type, checkpoint=checkpoint,
+                                 workers=max(1, min(workers or 1, MAX_REPLAY_WORKERS)))
+
+
+@service.stream_route("/accounting_export", method=GET, permission=WEBSHOP_ADMIN)
+def accounting_export_route(start=Arg(iso_date), end=Arg(iso_date), format=Arg(Enum(*FORMATS), required=False),
+                            compress=Arg(Enum(GZIP), required=False)):
+    """ Completed transaction contents with product names between start and end (inclusive) for bookkeeping, streamed
+    in constant memory. """
+    return accounting_export(start, end, format or CSV, compress)
@@ -1,11 +1,12 @@
+from collections import defaultdict
 from datetime import datetime, timedelta, date
 from typing import List, Tuple
 import math
 from membership.membership import get_membership_summaries
+from membership.span_index import get_span_index
 
 from service.db import db_session
-from service.logging import logger
-from shop.models import Product, Transaction, TransactionContent, ProductCategory
+from shop.models import Product, ProductCategory, DailySales
 from shop.entities import product_entity, category_entity
 from membership.models import Member, Span
 from sqlalchemy import func
@@ -16,33 +17,7 @@ def spans_by_date(span_type) -> List[Tuple[str, int]]:
     """Number of active spans of a given type indexed by a date string"""
     # Warning: doesn't accurately add datapoints when the number of members drops to zero
     # But since we know that Stockholm Makerspace will exist forever, this is an edge case that will never happen.
-    query = """
-    SELECT date, count(distinct(member_id)) AS labmembers
-        FROM membership_spans as ms
-        JOIN (
-            (SELECT enddate AS date FROM membership_spans WHERE type = :span_type AND deleted_at IS NULL)
-            UNION DISTINCT
-            (SELECT DATE_ADD(enddate, INTERVAL 1 DAY) as date FROM membership_spans
-               WHERE type = :span_type AND deleted_at IS NULL)
-            UNION DISTINCT
-            (SELECT startdate FROM membership_spans
-                WHERE type = :span_type AND deleted_at IS NULL)
-            UNION DISTINCT
-            (SELECT DATE_SUB(startdate, INTERVAL 1 DAY) FROM membership_spans
-               WHERE type = :span_type AND deleted_at IS NULL)
-        ) AS dates
-        ON (
-            ms.startdate <= dates.date AND
-            dates.date <= ms.enddate
-        )
-        WHERE (
-            ms.type = :span_type AND
-            ms.deleted_at IS NULL
-        )
-        GROUP BY date
-        ORDER BY date;"""
-
-    dates = db_session.execute(query, {"span_type": span_type})
+    dates = get_span_index().counts_by_date(span_type)
 
     dates_str = [(date.strftime("%Y-%m-%d"), count) for (date, count) in dates]
 
@@ -55,30 +30,14 @@ def membership_number_months(
     """Of all members who became members before startdate, how many months have they had active lab membership between startdate and enddate. Returns a mapping of month count to member counts."""
     total_months = math.ceil((enddate - startdate).days / 30)
 
-    spans = (
-        db_session.query(Member.member_id, Span.startdate, Span.enddate)
-        .join(Member.spans)
-        .filter(
-            Member.created_at <= startdate,
-            Span.startdate < enddate,
-            Span.enddate > startdate,
-            Span.type == membership_type,
-        )
-        .all()
-    )
     valid_members = (
         db_session.query(Member.member_id).filter(Member.created_at <= startdate).all()
     )
+    span_days = get_span_index().span_days(membership_type, startdate, enddate)
     amount_by_member = {}
 
     for (member_id,) in valid_members:
-        amount_by_member[member_id] = timedelta(days=0)
-
-    for (member_id, span_startdate, span_enddate) in spans:
-        span_startdate: datetime = max(span_startdate, startdate)
-        span_enddate: datetime = min(span_enddate, enddate)
-        length = span_enddate - span_startdate
-        amount_by_member[member_id] += length
+        amount_by_member[member_id] = timedelta(days=span_days.get(member_id, 0))
 
     # Number of members active for exactly N months during this period
     members_active_for_months = [0] * (total_months + 1)
@@ -100,27 +59,12 @@ def membership_number_months2(
     """Of all members who became members before startdate, how many months have they had active lab membership between startdate and enddate. Returns a mapping of month count to member counts."""
     total_months = math.ceil((enddate - startdate).days / 30)
 
-    spans = (
-        db_session.query(Member.member_id, Span.startdate, Span.enddate)
-        .join(Member.spans)
-        .filter(
-            Span.startdate < enddate,
-            Span.enddate > startdate,
-            Span.type == membership_type,
-        )
-        .all()
-    )
     valid_members = db_session.query(Member.member_id).all()
+    span_days = get_span_index().span_days(membership_type, startdate, enddate)
     amount_by_member = {}
 
     for (member_id,) in valid_members:
-        amount_by_member[member_id] = timedelta(days=0)
-
-    for (member_id, span_startdate, span_enddate) in spans:
-        span_startdate: datetime = max(span_startdate, startdate)
-        span_enddate: datetime = min(span_enddate, enddate)
-        length = span_enddate - span_startdate
-        amount_by_member[member_id] += length
+        amount_by_member[member_id] = timedelta(days=span_days.get(member_id, 0))
 
     # Number of members active for exactly N months during this period
     members_active_for_months = [0] * (total_months + 1)
@@ -169,45 +113,45 @@ def membership_by_date_statistics():
     }
 
 
-def lasertime():
-    query = db_session.execute(
-        """
-            SELECT DATE_FORMAT(webshop_transactions.created_at, "%Y-%m"), sum(webshop_transaction_contents.count)
-            FROM webshop_transaction_contents
-            INNER JOIN webshop_transactions
-            ON webshop_transactions.id = webshop_transaction_contents.transaction_id
-            WHERE webshop_transaction_contents.product_id=7 AND webshop_transactions.status='completed'
-            GROUP BY DATE_FORMAT(webshop_transactions.created_at, "%Y-%m")
-            """
+# Product for laser cutter time, shown by default in the lasertime statistics.
+LASERTIME_PRODUCT_ID = 7
+
+
+def lasertime(product_id=LASERTIME_PRODUCT_ID):
+    """ Number of product_id sold per month, from the daily sales rollup. """
+    query = (
+        db_session.query(DailySales.date, DailySales.count)
+        .filter(DailySales.product_id == product_id)
+        .order_by(DailySales.date)
     )
 
-    results = [(date, int(count)) for (date, count) in query]
-    logger.info(results)
-    return results
+    results = defaultdict(int)
+    for day, count in query:
+        results[day.strftime("%Y-%m")] += count
+    return list(results.items())
 
 
-def shop_statistics():
+def shop_statistics(product_id=None):
+    """ Revenue per product and category the last 12 months from the daily sales rollup, for one product if
+    product_id is set. Revenue is counted for the current category of each product. """
     # Converts a list of rows of IDs and values to a map from id to value
     def mapify(rows):
         return {r[0]: r[1] for r in rows}
 
-    date_lower_limit = datetime.now() - timedelta(days=365)
+    conditions = [DailySales.date > (datetime.now() - timedelta(days=365)).date()]
+    if product_id:
+        conditions.append(DailySales.product_id == product_id)
+
     sales_by_product = mapify(
-        db_session.query(
-            TransactionContent.product_id, func.sum(TransactionContent.amount)
-        )
-        .join(TransactionContent.transaction)
-        .filter(Transaction.created_at > date_lower_limit)
-        .filter(Transaction.status == Transaction.COMPLETED)
-        .group_by(TransactionContent.product_id)
+        db_session.query(DailySales.product_id, func.sum(DailySales.amount))
+        .filter(*conditions)
+        .group_by(DailySales.product_id)
         .all()
     )
     sales_by_category = mapify(
-        db_session.query(Product.category_id, func.sum(TransactionContent.amount))
-        .join(TransactionContent.product)
-        .join(TransactionContent.transaction)
-        .filter(Transaction.created_at > date_lower_limit)
-        .filter(Transaction.status == Transaction.COMPLETED)
+        db_session.query(Product.category_id, func.sum(DailySales.amount))
+        .join(Product, Product.id == DailySales.product_id)
+        .filter(*conditions)
         .group_by(Product.category_id)
         .all()
     )
@@ -246,6 +190,8 @@ def shop_statistics():
 
 
 def retention_graph(startdate: date, enddate: date):
+    # Not read from the span index, the graph walks each labaccess span of a member in order (months per span and
+    # pauses between spans), which the merged intervals of the index do not keep.
     lab_spans = (
         db_session.query(Member.member_id, Span.startdate, Span.enddate)
         .join(Member.spans)
@@ -1,7 +1,8 @@
 from datetime import date
-from service.api_definition import GET, PUBLIC
+from service.api_definition import GET, PUBLIC, Arg, natural1
 from statistics import service
-from statistics.maker_statistics import membership_by_date_statistics, lasertime, retention_graph, shop_statistics, membership_number_months_default, membership_number_months2_default
+from statistics.maker_statistics import membership_by_date_statistics, lasertime, retention_graph, shop_statistics, membership_number_months_default, membership_number_months2_default, \
+    LASERTIME_PRODUCT_ID
 
 
 @service.route("/membership/distribution_by_month2", method=GET, permission=PUBLIC)
@@ -18,13 +19,13 @@ def membership_by_date_statistics_route():
 
 
 @service.route("/lasertime/by_month", method=GET, permission=PUBLIC)
-def lasertime_route():
-    return lasertime()
+def lasertime_route(product_id=Arg(natural1, required=False)):
+    return lasertime(product_id or LASERTIME_PRODUCT_ID)
 
 
 @service.route("/shop/statistics", method=GET, permission=PUBLIC)
-def shop_route():
-    return shop_statistics()
+def shop_route(product_id=Arg(natural1, required=False)):
+    return shop_statistics(product_id)
 
 @service.route("/retention_graph", method=GET, permission=PUBLIC)
 def retention_graph_route():
@@ -0,0 +1,39 @@
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from time import sleep
+
+from rocky.process import log_exception, stoppable
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import sessionmaker
+
+from service.config import get_mysql_config
+from service.db import create_mysql_engine, db_session
+from service.logging import logger
+from shop.stripe_event import process_recorded_stripe_events
+
+
+if __name__ == '__main__':
+
+    with log_exception(status=1), stoppable():
+        parser = ArgumentParser(description="Process stripe events recorded by the stripe webhook.",
+                                formatter_class=ArgumentDefaultsHelpFormatter)
+
+        parser.add_argument('--sleep', default=1, type=float, help='Sleep time (in seconds) between checking for events.')
+        parser.add_argument('--limit', default=100, type=int, help='Max events to process every time checking for events.')
+
+        args = parser.parse_args()
+
+        engine = create_mysql_engine(**get_mysql_config())
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        logger.info(f'checking for stripe events to process every {args.sleep} seconds, limit is {args.limit}')
+
+        while True:
+            sleep(args.sleep)
+            try:
+                count = process_recorded_stripe_events(args.limit)
+                if count:
+                    logger.info(f"processed {count} stripe events")
+            except DatabaseError as e:
+                logger.warning(f"failed to do db query. ignoring: {e}")
+            finally:
+                db_session.remove()
@@ -0,0 +1,50 @@
+from threading import Thread
+from time import sleep
+
+from sqlalchemy.orm import Session
+
+from membership.models import Span, MembershipSummary
+from service.db import db_session
+from test_aid.systest_base import SystestBase
+from test_aid.test_util import random_str
+
+
+class Test(SystestBase):
+
+    def setUp(self):
+        super().setUp()
+        engine = db_session.get_bind().execution_options(isolation_level="REPEATABLE READ")
+        self.session1 = Session(bind=engine)
+        self.session2 = Session(bind=engine)
+
+    def tearDown(self):
+        self.session1.close()
+        self.session2.close()
+        super().tearDown()
+
+    def test_concurrent_span_writes_for_same_member_do_not_write_stale_summary(self):
+        member = self.db.create_member()
+        span = self.db.create_span(type=Span.LABACCESS, startdate=self.date(-10), enddate=self.date(10))
+
+        # Session 2 takes its snapshot before session 1 adds a span.
+        edited = self.session2.query(Span).get(span.span_id)
+
+        self.session1.add(Span(member_id=member.member_id, type=Span.LABACCESS, startdate=self.date(11),
+                               enddate=self.date(100), creation_reason=random_str()))
+        self.session1.flush()
+
+        def edit_span():
+            edited.enddate = self.date(20)
+            self.session2.commit()
+
+        thread = Thread(target=edit_span)
+        thread.start()
+        # Let session 2 block on the locks of session 1.
+        sleep(0.5)
+        self.session1.commit()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+
+        db_session.close()
+        summary = db_session.query(MembershipSummary).get(member.member_id)
+        self.assertEqual(self.date(100), summary.labaccess_end)
@@ -1,3 +1,7 @@
+import csv
+import json
+from io import StringIO
+
 from test_aid.systest_base import ApiTest
 from test_aid.test_util import random_str
 
@@ -290,3 +294,48 @@ class Test(ApiTest):
                     data__labaccess_active=False,
                     data__labaccess_end=self.date(days=40).isoformat(),
                     )
+
+    def test_export_all_with_membership_as_ndjson_and_csv(self):
+        member_id = self.api.create_member()['member_id']
+        self.post(f"/membership/member/{member_id}/addMembershipDays",
+                  {
+                      "type": "labaccess",
+                      "days": 10,
+                      "default_start_date": self.date().isoformat(),
+                      "creation_reason": random_str(),
+                  }).expect(200)
+
+        response = self.get("/membership/member/all_with_membership/export", params={"format": "ndjson"}).response
+        self.assertEqual(200, response.status_code)
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        row, = [r for r in rows if r['member_id'] == member_id]
+        self.assertTrue(row['membership']['labaccess_active'])
+        self.assertEqual(self.date(10).isoformat(), row['membership']['labaccess_end'])
+
+        response = self.get("/membership/member/all_with_membership/export", params={"format": "csv"}).response
+        self.assertEqual(200, response.status_code)
+        rows = list(csv.DictReader(StringIO(response.text)))
+        row, = [r for r in rows if r['member_id'] == str(member_id)]
+        self.assertEqual('True', row['labaccess_active'])
+        self.assertEqual(self.date(10).isoformat(), row['labaccess_end'])
+
+    def test_bulk_add_membership_days(self):
+        member_ids = [self.api.create_member()['member_id'] for _ in range(2)]
+
+        self.post("/membership/member/addMembershipDays",
+                  {
+                      "member_ids": member_ids,
+                      "type": "labaccess",
+                      "days": 5,
+                      "default_start_date": self.date().isoformat(),
+                      "creation_reason": random_str(),
+                  }).expect(code=200, status="ok", data__added=2, data__skipped=0,
+                            data__max_enddate=self.date(5).isoformat())
+
+        for member_id in member_ids:
+            self.get(f"/membership/member/{member_id}/membership")\
+                .expect(code=200, data__labaccess_active=True, data__labaccess_end=self.date(5).isoformat())
+
+    def test_bulk_add_membership_days_requires_members_or_group(self):
+        self.post("/membership/member/addMembershipDays",
+                  {"type": "labaccess", "days": 5, "creation_reason": random_str()}).expect(code=400)
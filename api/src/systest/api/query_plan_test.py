@@ -0,0 +1,115 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from core.models import Login
+from dispatch_emails import labaccess_reminder, already_sent_message
+from membership.membership import get_membership_summary, add_membership_days
+from membership.models import Span
+from messages.models import MessageTemplate
+from service.db import db_session
+from shop.models import ProductAction
+from shop.shop_data import member_history
+from shop.transactions import pending_action_value_sum, pending_actions_query
+from test_aid.systest_base import SystestBase
+from test_aid.test_util import random_str
+
+
+# Tables that grows with members and time, a full scan of these without any usable index is a regression.
+WATCHED_TABLES = {'membership_spans', 'membership_summary', 'message', 'login', 'webshop_transactions', 'webshop_transaction_actions'}
+
+
+class Test(SystestBase):
+    """ Run the hot queries and check their query plans. The test db is too small for the optimizer to always pick an
+    index, so a table access is considered a full scan regression if there is no usable index (possible_keys). """
+
+    def setUp(self):
+        super().setUp()
+        self.member = self.db.create_member()
+        self.db.create_span(type=Span.LABACCESS, enddate=self.date(20))
+        self.db.create_span(type=Span.MEMBERSHIP, enddate=self.date(100))
+
+    @contextmanager
+    def capture_selects(self):
+        statements = []
+        engine = db_session.get_bind()
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((statement, parameters))
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+            db_session.rollback()
+
+    def explain(self, statement, parameters):
+        return [dict(row) for row in db_session.connection().exec_driver_sql("EXPLAIN " + statement, parameters)
+                .mappings()]
+
+    def assert_no_full_scans(self, func, expected_keys=None):
+        """ Run func and assert that no select it did makes a full scan of a watched table, expected_keys maps table
+        to an index that should be usable by at least one of the selects. """
+        with self.capture_selects() as statements:
+            func()
+
+        self.assertTrue(statements, "no selects captured")
+
+        usable_keys = {}
+        for statement, parameters in statements:
+            for row in self.explain(statement, parameters):
+                table = row['table']
+                possible_keys = set((row['possible_keys'] or '').split(','))
+                usable_keys.setdefault(table, set()).update(possible_keys)
+                if table in WATCHED_TABLES and row['type'] == 'ALL' and not row['possible_keys']:
+                    self.fail(f"full scan of {table} without usable index in: {statement}")
+
+        for table, key in (expected_keys or {}).items():
+            self.assertIn(key, usable_keys.get(table, set()), f"index {key} not usable for {table}")
+
+    def test_membership_summary(self):
+        self.assert_no_full_scans(
+            lambda: get_membership_summary(self.member.member_id),
+            expected_keys={'membership_summary': 'PRIMARY'},
+        )
+
+    def test_add_membership_days(self):
+        self.assert_no_full_scans(
+            lambda: add_membership_days(self.member.member_id, Span.LABACCESS, 10, random_str()),
+            expected_keys={'membership_spans': 'member_type_deleted_enddate_index'},
+        )
+
+    def test_already_sent_message(self):
+        self.assert_no_full_scans(
+            lambda: already_sent_message(MessageTemplate.LABACCESS_REMINDER, self.member, 28),
+            expected_keys={'message': 'member_template_created_index'},
+        )
+
+    def test_labaccess_reminder(self):
+        self.assert_no_full_scans(labaccess_reminder)
+
+    def test_failed_login_count(self):
+        self.assert_no_full_scans(
+            lambda: Login.get_failed_login_count('127.0.0.1'),
+            expected_keys={'login': 'ip_date_index'},
+        )
+
+    def test_pending_action_value_sum(self):
+        self.assert_no_full_scans(
+            lambda: pending_action_value_sum(self.member.member_id, ProductAction.ADD_LABACCESS_DAYS),
+            expected_keys={'webshop_transactions': 'member_id_status_index'},
+        )
+
+    def test_member_history(self):
+        self.assert_no_full_scans(
+            lambda: member_history(self.member.member_id, before=1000000),
+            expected_keys={'webshop_transactions': 'member_id_status_index'},
+        )
+
+    def test_pending_actions(self):
+        self.assert_no_full_scans(
+            lambda: pending_actions_query().all(),
+            expected_keys={'webshop_transaction_actions': 'status_content_index'},
+        )
@@ -0,0 +1,86 @@
+import json
+from fnmatch import fnmatch
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+from urllib.parse import urlparse, parse_qs
+
+import stripe
+
+
+class RecordedStripeEvents:
+    """ Local stand-in for the stripe api serving recorded events at /v1/events, with the same filtering and
+    pagination as stripe. Used as a context manager, the stripe module talks to the stand-in inside it. """
+
+    def __init__(self, events=()):
+        self.events = []
+        self.requests = []
+        self.add(*events)
+        self.server = None
+
+    @classmethod
+    def from_file(cls, filename):
+        """ Events from a file with one json event per line. """
+        with open(filename) as f:
+            return cls(json.loads(line) for line in f if line.strip())
+
+    def add(self, *events):
+        # Stripe lists newest first.
+        self.events = sorted(self.events + list(events), key=lambda e: e['created'], reverse=True)
+
+    def list(self, params):
+        self.requests.append(params)
+
+        events = self.events
+        if 'type' in params:
+            events = [e for e in events if fnmatch(e['type'], params['type'])]
+        if 'created[gte]' in params:
+            events = [e for e in events if e['created'] >= int(params['created[gte]'])]
+
+        ids = [e['id'] for e in events]
+        limit = int(params.get('limit', 10))
+        if 'starting_after' in params:
+            begin = ids.index(params['starting_after']) + 1
+            page = events[begin:begin + limit]
+            has_more = begin + limit < len(events)
+        elif 'ending_before' in params:
+            end = ids.index(params['ending_before'])
+            page = events[max(0, end - limit):end]
+            has_more = end - limit > 0
+        else:
+            page = events[:limit]
+            has_more = limit < len(events)
+
+        return dict(object="list", url="/v1/events", has_more=has_more, data=page)
+
+    def __enter__(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/v1/events":
+                    self.send_error(404)
+                    return
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                body = json.dumps(stand_in.list(params)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.saved = stripe.api_base, stripe.api_key
+        stripe.api_base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        stripe.api_key = stripe.api_key or "sk_test_stand_in"
+        return self
+
+    def __exit__(self, *args):
+        stripe.api_base, stripe.api_key = self.saved
+        self.server.shutdown()
+        self.server.server_close()
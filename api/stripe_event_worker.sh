@@ -0,0 +1,5 @@
+#!/bin/bash
+set -e
+
+echo "starting stripe event worker"
+python3 ./stripe_event_worker.py
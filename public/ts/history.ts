@@ -18,20 +18,30 @@ common.documentLoaded().then(() => {
         return "Okänd status";
     }
 
-    const future1 = common.ajax("GET", apiBasePath + "/webshop/member/current/transactions", null);
+    function fetch_transactions(before: number | null) {
+        const query = before ? `?before=${before}` : "";
+        return common.ajax("GET", apiBasePath + "/webshop/member/current/transactions" + query, null);
+    }
+
+    const future1 = fetch_transactions(null);
     const future2 = common.ajax("GET", apiBasePath + "/member/current", null);
 
     const rootElement = <HTMLElement>document.querySelector("#history-contents");
     rootElement.innerHTML = "";
 
-    Promise.all([future1, future2]).then(([transactionJson, memberJson]) => {
+    const moreButton = document.createElement("button");
+    moreButton.type = "button";
+    moreButton.className = "uk-button uk-button-default";
+    moreButton.textContent = "Visa fler";
 
-        for (const transaction of transactionJson.data) {
+    function render_page(page: any) {
+        for (const transaction of page.transactions) {
             let cartItems = "";
             for (const item of transaction.contents) {
+                const product = page.products[item.product_id];
                 cartItems += `<div class="receipt-item">
-                            <a class="product-title" href="/shop/product/${item.product.id}">${item.product.name}</a>
-                            <span class="receipt-item-count">${item.count} ${item.product.unit}</span>
+                            <a class="product-title" href="/shop/product/${item.product_id}">${product.name}</a>
+                            <span class="receipt-item-count">${item.count} ${product.unit}</span>
                             <span class="receipt-item-amount">${Cart.formatCurrency(Number(item.amount))}</span>
                         </div>`;
             }
@@ -54,6 +64,27 @@ common.documentLoaded().then(() => {
             rootElement.appendChild(elem.firstChild!);
         }
 
+        moreButton.remove();
+        if (page.next_before) {
+            moreButton.onclick = () => {
+                moreButton.disabled = true;
+                fetch_transactions(page.next_before)
+                    .then(json => {
+                        moreButton.disabled = false;
+                        render_page(json.data);
+                    })
+                    .catch(json => {
+                        moreButton.disabled = false;
+                        UIkit.modal.alert("<h2>Misslyckades med att hämta köphistorik</h2>" + common.get_error(json));
+                    });
+            };
+            rootElement.appendChild(moreButton);
+        }
+    }
+
+    Promise.all([future1, future2]).then(([transactionJson, memberJson]) => {
+        render_page(transactionJson.data);
+
         const member = memberJson.data;
         document.querySelector("#member-header")!.textContent = `#${member.member_number} ${member.firstname} ${member.lastname}`;
     })
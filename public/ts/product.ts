@@ -67,6 +67,6 @@ common.onGetAndDocumentLoaded("/webshop/product_data/" + window.productId, (valu
 	});
 
 	const apiBasePath = window.apiBasePath;
-	const image_url = `${apiBasePath}/webshop/image/${product.image_id || 0}`;
+	const image_url = `${apiBasePath}/webshop/image/${product.image_id || 0}${product.image_hash ? "?v=" + product.image_hash : ""}`;
 	document.querySelector("#images")!.innerHTML = `<img src="${image_url}" alt="${product.name}">`;
 });
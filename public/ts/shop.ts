@@ -66,11 +66,12 @@ common.onGetAndDocumentLoaded("/webshop/product_data", (productData: any) => {
 
       const li = document.createElement("div");
       li.className = "product-container"
-      const image_url = `${apiBasePath}/webshop/image/${item.image_id || 0}`;
+      const image_url = `${apiBasePath}/webshop/image/${item.image_id || 0}?w=250${item.image_hash ? "&v=" + item.image_hash : ""}`;
+      const image_url_2x = `${apiBasePath}/webshop/image/${item.image_id || 0}?w=500${item.image_hash ? "&v=" + item.image_hash : ""}`;
       li.innerHTML = `
         <div class="product-image-container">
           <a href="product/${item.id}">
-            <img src="${image_url}" alt="${item.name}">
+            <img src="${image_url}" srcset="${image_url_2x} 2x" alt="${item.name}">
           </a>
         </div>
         <div id="product-${item.id}" class="product">